@@ -1,8 +1,9 @@
 from functools import lru_cache
 from backend.app.domain.interfaces import IImageProcessor
 from backend.app.infrastructure.image_processor import ImageProcessor
+from backend.app.core.shared_store import get_shared_store
 
 @lru_cache()
 def get_image_processor() -> IImageProcessor:
     """Dependency provider for ImageProcessor"""
-    return ImageProcessor()
+    return ImageProcessor(store=get_shared_store())
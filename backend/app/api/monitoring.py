@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse, PlainTextResponse
+from backend.app.core.admission import AdmissionController, get_admission_controller
+from backend.app.core.metrics import MetricsRegistry, get_metrics_registry
+from backend.app.core.profiling import MemoryStats, get_memory_stats, get_profiling_config
+from backend.app.core.shared_store import get_shared_store
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint(
+    registry: MetricsRegistry = Depends(get_metrics_registry),
+    admission: AdmissionController = Depends(get_admission_controller)
+):
+    """
+    Latency histograms per endpoint and per pipeline stage, plus admission
+    load, in Prometheus text format.
+    """
+    return PlainTextResponse(
+        registry.render_prometheus() + admission.render_prometheus(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+@router.get("/ready")
+async def readiness_endpoint(admission: AdmissionController = Depends(get_admission_controller)):
+    """
+    Readiness probe: 200 while there is admission budget left, 503 with
+    Retry-After once requests have to queue. The body reports current load.
+    """
+    load = admission.snapshot()
+    if load["saturated"]:
+        return JSONResponse(
+            {"status": "saturated", **load},
+            status_code=503,
+            headers={"Retry-After": str(admission.retry_after())}
+        )
+    return {"status": "ready", **load}
+
+@router.get("/debug/memory")
+async def memory_endpoint(stats: MemoryStats = Depends(get_memory_stats)):
+    """
+    Aggregated peak memory per endpoint, per pipeline stage and per buffer,
+    plus the largest recent requests. Requires IMAGEFLOW_PROFILE_MEMORY=1.
+    """
+    config = get_profiling_config()
+    if not config.enabled:
+        return {"enabled": False, "hint": "Set IMAGEFLOW_PROFILE_MEMORY=1 to record memory profiles"}
+    return {
+        "enabled": True,
+        "slow_threshold_ms": config.slow_seconds * 1000,
+        "large_threshold_mb": config.large_bytes / (1024 * 1024),
+        **stats.as_dict()
+    }
+
+@router.get("/debug/store")
+async def shared_store_endpoint():
+    """
+    Occupancy of the host-wide shared image store, plus this worker's hit,
+    miss and eviction counters.
+    """
+    store = get_shared_store()
+    if store is None:
+        return {"enabled": False, "hint": "Off by default: set IMAGEFLOW_SHARED_STORE=1 (IMAGEFLOW_SHM_DIR must be writable)"}
+    return {"enabled": True, **store.stats()}
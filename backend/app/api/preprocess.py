@@ -1,16 +1,171 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import base64
 import io
+import json
 import time
-from typing import Optional
-from backend.app.domain.interfaces import IImageProcessor
-from backend.app.domain.models import ImageProcessingParams
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from backend.app.domain.interfaces import IImageProcessor, ImageBytes
+from backend.app.domain.models import (
+    BatchImage, BatchImages, HistogramImages, ImageProcessingParams, PipelineImages, PipelineSpec, PresetInfo,
+    PresetRequest
+)
 from backend.app.api.dependencies import get_image_processor
+from backend.app.api.responses import image_response
+from backend.app.infrastructure.pipeline import ExecutionPlan, compile_pipeline
+from backend.app.infrastructure.presets import PresetRegistry, get_preset_registry
+from backend.app.core.admission import (
+    AdmissionController, AdmissionRejected, RequestCost, estimate_cost, get_admission_controller
+)
+from backend.app.core.local_transport import HANDLE_MEDIA_TYPE, get_handoff_area, is_local_request
+from backend.app.core.metrics import timed_stage
+from backend.app.core.profiling import note_buffer
+from backend.app.core.raw_format import COMPRESSION_HEADER, RAW_MEDIA_TYPE, negotiate
+from backend.app.core.scheduler import CLIENT_HEADER, PRIORITY_HEADER
 
 router = APIRouter()
 
+
+def _estimate(processor: IImageProcessor, contents: bytes, operations: List[str]) -> RequestCost:
+    """Cost of a request from the image header (no pixel decode) and the operations it runs"""
+    try:
+        width, height, channels = processor.probe_image(contents)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return estimate_cost(width, height, channels, operations)
+
+
+def _client_id(request: Request) -> str:
+    """Fair-share key: the caller's X-Client-Id, else its address"""
+    client_id = request.headers.get(CLIENT_HEADER)
+    if client_id:
+        return client_id[:64]
+    return request.client.host if request.client else "anonymous"
+
+
+def _is_image_upload(file: UploadFile) -> bool:
+    return file.content_type.startswith('image/') or file.content_type in (RAW_MEDIA_TYPE, HANDLE_MEDIA_TYPE)
+
+
+def _is_handle(file: UploadFile) -> bool:
+    return file.content_type == HANDLE_MEDIA_TYPE
+
+
+async def _read_upload(request: Request, file: UploadFile) -> ImageBytes:
+    """Uploaded image bytes, or a mapping of the shared-memory file a local client handed over"""
+    with timed_stage("read"):
+        contents = await file.read()
+        if _is_handle(file):
+            handoff = get_handoff_area()
+            if handoff is None or not is_local_request(request.scope):
+                raise HTTPException(status_code=400, detail="Shared-memory handles are only accepted on the Unix socket")
+            try:
+                contents = handoff.open(contents)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+    note_buffer("upload", len(contents))
+    return contents
+
+
+def _output_format(request: Request) -> Tuple[Optional[str], str, str]:
+    """(raw compression or None, media type, encode stage) negotiated from Accept and X-Raw-Compression"""
+    raw_compression = negotiate(request.headers.get("Accept"), request.headers.get(COMPRESSION_HEADER))
+    if raw_compression is None:
+        return None, "image/png", "encode"
+    return raw_compression, RAW_MEDIA_TYPE, "encode_raw"
+
+
+def _negotiated_headers(headers: Dict[str, str], raw_compression: Optional[str]) -> Dict[str, str]:
+    headers = {**headers, "Vary": f"Accept, {COMPRESSION_HEADER}"}
+    if raw_compression is not None:
+        headers[COMPRESSION_HEADER] = raw_compression
+    return headers
+
+
+# /preprocess form fields and their defaults (also the keys of a /pipeline step)
+PREPROCESS_FIELDS = {
+    "grayscale": "false", "resize_width": "0", "resize_height": "0", "equalize": "false",
+    "stretch": "false", "normalize": "false", "threshold": "", "threshold_type": "binary",
+    "blur_type": "", "blur_kernel": "5", "edge_detection": "", "rotate_angle": "", "flip": "",
+    "brightness": "", "contrast": "", "saturation": "", "sharpness": "", "gamma": "",
+}
+
+
+def _params_from_form(form: Dict[str, str]) -> ImageProcessingParams:
+    """ImageProcessingParams from /preprocess form fields (strings; missing fields keep their defaults)"""
+    unknown = [name for name in form if name not in PREPROCESS_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown parameter(s): {', '.join(unknown)}")
+    fields = {name: str(form.get(name, default)) for name, default in PREPROCESS_FIELDS.items()}
+    params = ImageProcessingParams()
+    
+    # Boolean parameters
+    if fields["grayscale"].lower() == 'true': params.grayscale = True
+    if fields["equalize"].lower() == 'true': params.equalize = True
+    if fields["stretch"].lower() == 'true': params.stretch = True
+    if fields["normalize"].lower() == 'true': params.normalize = True
+    
+    # Resize
+    if fields["resize_width"] != "0": params.resize_width = int(fields["resize_width"])
+    if fields["resize_height"] != "0": params.resize_height = int(fields["resize_height"])
+    
+    # Threshold
+    if fields["threshold"]:
+        params.threshold = int(fields["threshold"])
+        params.threshold_type = fields["threshold_type"]
+    
+    # Blur
+    if fields["blur_type"]:
+        params.blur_type = fields["blur_type"]
+        params.blur_kernel = int(fields["blur_kernel"])
+    
+    # Edge detection
+    if fields["edge_detection"]:
+        params.edge_detection = fields["edge_detection"]
+    
+    # Transformations
+    if fields["rotate_angle"]: params.rotate_angle = float(fields["rotate_angle"])
+    if fields["flip"]: params.flip = fields["flip"]
+    
+    # Adjustments
+    if fields["brightness"]: params.brightness = float(fields["brightness"])
+    if fields["contrast"]: params.contrast = float(fields["contrast"])
+    if fields["saturation"]: params.saturation = float(fields["saturation"])
+    if fields["sharpness"]: params.sharpness = float(fields["sharpness"])
+    if fields["gamma"]: params.gamma = float(fields["gamma"])
+    return params
+
+
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+
+async def _read_image_upload(request: Request, file: UploadFile) -> ImageBytes:
+    """Read an image upload: 413 above 10MB (handed-over buffers never cross the socket), 400 if not an image"""
+    contents = await _read_upload(request, file)
+    if len(contents) > MAX_UPLOAD_BYTES and not _is_handle(file):
+        raise HTTPException(status_code=413, detail="File too large (max 10MB)")
+    if not _is_image_upload(file):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    return contents
+
+
+@asynccontextmanager
+async def _admitted(admission: AdmissionController, cost: RequestCost, request: Request) -> AsyncIterator[None]:
+    """Hold an admission slot for the block, or fail fast with 503 + Retry-After"""
+    lane = admission.classify(cost, request.headers.get(PRIORITY_HEADER))
+    try:
+        async with admission.admit(cost, _client_id(request), lane):
+            yield
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+
 @router.post("/preprocess")
 async def preprocess_image_endpoint(
+    request: Request,
     file: UploadFile = File(..., description="Image file to process"),
     grayscale: str = Form("false", description="Convert to grayscale"),
     resize_width: str = Form("0", description="Resize width (0 to keep original)"),
@@ -30,77 +185,42 @@ async def preprocess_image_endpoint(
     saturation: str = Form("", description="Saturation adjustment"),
     sharpness: str = Form("", description="Sharpness adjustment"),
     gamma: str = Form("", description="Gamma correction"),
-    processor: IImageProcessor = Depends(get_image_processor)
+    processor: IImageProcessor = Depends(get_image_processor),
+    admission: AdmissionController = Depends(get_admission_controller)
 ):
     """
     Process an image with various transformations.
     """
     try:
-        # Read file
-        contents = await file.read()
+        # Read the file and check its size and type
+        contents = await _read_image_upload(request, file)
         
-        # Validate file size (max 10MB)
-        if len(contents) > 10 * 1024 * 1024:
-            raise HTTPException(status_code=413, detail="File too large (max 10MB)")
+        params = _params_from_form({
+            "grayscale": grayscale, "resize_width": resize_width, "resize_height": resize_height,
+            "equalize": equalize, "stretch": stretch, "normalize": normalize,
+            "threshold": threshold, "threshold_type": threshold_type,
+            "blur_type": blur_type, "blur_kernel": blur_kernel, "edge_detection": edge_detection,
+            "rotate_angle": rotate_angle, "flip": flip, "brightness": brightness, "contrast": contrast,
+            "saturation": saturation, "sharpness": sharpness, "gamma": gamma
+        })
         
-        # Validate file type
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Build params object
-        params = ImageProcessingParams()
-        
-        # Boolean parameters
-        if grayscale.lower() == 'true': params.grayscale = True
-        if equalize.lower() == 'true': params.equalize = True
-        if stretch.lower() == 'true': params.stretch = True
-        if normalize.lower() == 'true': params.normalize = True
-        
-        # Resize
-        if resize_width != "0": params.resize_width = int(resize_width)
-        if resize_height != "0": params.resize_height = int(resize_height)
-        
-        # Threshold
-        if threshold and threshold != "":
-            params.threshold = int(threshold)
-            params.threshold_type = threshold_type
-        
-        # Blur
-        if blur_type and blur_type != "":
-            params.blur_type = blur_type
-            params.blur_kernel = int(blur_kernel)
-        
-        # Edge detection
-        if edge_detection and edge_detection != "":
-            params.edge_detection = edge_detection
-        
-        # Transformations
-        if rotate_angle and rotate_angle != "":
-            params.rotate_angle = float(rotate_angle)
-        
-        if flip and flip != "":
-            params.flip = flip
-        
-        # Adjustments
-        if brightness and brightness != "": params.brightness = float(brightness)
-        if contrast and contrast != "": params.contrast = float(contrast)
-        if saturation and saturation != "": params.saturation = float(saturation)
-        if sharpness and sharpness != "": params.sharpness = float(sharpness)
-        if gamma and gamma != "": params.gamma = float(gamma)
-        
-        # Process image
-        start_time = time.time()
-        result_bytes = processor.process_image(contents, params)
-        processing_time = time.time() - start_time
+        # Process image off the event loop, once the server has budget for it
+        raw_compression, media_type, encode_stage = _output_format(request)
+        cost = _estimate(processor, contents, params.enabled_operations() + [encode_stage])
+        async with _admitted(admission, cost, request):
+            start_time = time.time()
+            result_bytes = await run_in_threadpool(processor.process_image, contents, params, raw_compression)
+            processing_time = time.time() - start_time
         
-        return StreamingResponse(
-            io.BytesIO(result_bytes),
-            media_type="image/png",
-            headers={
+        return image_response(
+            result_bytes,
+            media_type=media_type,
+            headers=_negotiated_headers({
                 "X-Processing-Time": f"{processing_time:.3f}s",
                 "X-Original-Filename": file.filename,
                 "Content-Disposition": f"attachment; filename=processed_{file.filename}"
-            }
+            }, raw_compression),
+            request=request
         )
     
     except HTTPException:
@@ -110,12 +230,135 @@ async def preprocess_image_endpoint(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
 
+MAX_PIPELINE_STEPS = 32
+
+
+def _parse_spec(spec: str) -> PipelineSpec:
+    """PipelineSpec from its JSON form, compiled once to validate it (400 on any error)"""
+    try:
+        pipeline = PipelineSpec.model_validate_json(spec)
+        if len(pipeline.ops) > MAX_PIPELINE_STEPS:
+            raise ValueError(f"Too many operations (max {MAX_PIPELINE_STEPS})")
+        compile_pipeline(pipeline.ops, pipeline.optimize)
+    except (ValidationError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid pipeline spec: {str(e)}")
+    return pipeline
+
+
+async def _run_spec(request: Request, file: UploadFile, pipeline: PipelineSpec, plan: ExecutionPlan,
+                    processor: IImageProcessor, admission: AdmissionController, headers: Dict[str, str]):
+    contents = await _read_image_upload(request, file)
+
+    raw_compression, media_type, encode_stage = _output_format(request)
+    async with _admitted(admission, _estimate(processor, contents, plan.operations + [encode_stage]), request):
+        start_time = time.time()
+        result = await run_in_threadpool(processor.run_pipeline, contents, pipeline, raw_compression, plan)
+        processing_time = time.time() - start_time
+
+    return image_response(
+        result,
+        media_type=media_type,
+        headers=_negotiated_headers({
+            **headers,
+            "X-Processing-Time": f"{processing_time:.3f}s",
+            "X-Pipeline-Plan": ",".join(plan.describe()),
+            "Content-Disposition": f"attachment; filename=processed_{file.filename}"
+        }, raw_compression),
+        request=request
+    )
+
+
+@router.post("/pipeline")
+async def pipeline_endpoint(
+    request: Request,
+    file: UploadFile = File(..., description="Image file to process"),
+    steps: str = Form("", description="JSON list of steps, each an object of /preprocess form fields"),
+    spec: str = Form("", description="JSON pipeline spec: {ops: [{op, params}], optimize} (instead of steps)"),
+    intermediates: str = Form("false", description="Return every step's image (JSON) instead of the final one"),
+    processor: IImageProcessor = Depends(get_image_processor),
+    admission: AdmissionController = Depends(get_admission_controller)
+):
+    """
+    Run several operations in order, in one request.
+
+    The image is uploaded and decoded once. Either:
+    - steps: /preprocess steps, each run on the previous step's pixels with
+      the same result as chaining /preprocess calls. With
+      intermediates=true, every step's image is returned base64-encoded in
+      a JSON body, in the negotiated format;
+    - spec: a PipelineSpec, operations in any order and repeated at will,
+      compiled into an optimized execution plan (fused lookup tables,
+      early grayscale conversion...). Only the final image is returned.
+
+    By default the final image is returned like /preprocess returns its own.
+    """
+    try:
+        return_all = intermediates.lower() == 'true'
+        if bool(steps) == bool(spec):
+            raise HTTPException(status_code=400, detail="Provide either steps or spec")
+        if spec:
+            if return_all:
+                raise HTTPException(status_code=400, detail="Intermediates are not available for specs (operations are fused)")
+            pipeline = _parse_spec(spec)
+            plan = compile_pipeline(pipeline.ops, pipeline.optimize)
+            return await _run_spec(request, file, pipeline, plan, processor, admission, {})
+        try:
+            specs = json.loads(steps)
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Steps must be a JSON list: {str(e)}")
+        if not isinstance(specs, list) or not specs or not all(isinstance(step, dict) for step in specs):
+            raise HTTPException(status_code=400, detail="Steps must be a non-empty JSON list of objects")
+        if len(specs) > MAX_PIPELINE_STEPS:
+            raise HTTPException(status_code=400, detail=f"Too many steps (max {MAX_PIPELINE_STEPS})")
+        pipeline = [_params_from_form(step) for step in specs]
+
+        contents = await _read_image_upload(request, file)
+
+        raw_compression, media_type, encode_stage = _output_format(request)
+        operations = [op for params in pipeline for op in params.enabled_operations()]
+        operations += [encode_stage] * (len(pipeline) if return_all else 1)
+        async with _admitted(admission, _estimate(processor, contents, operations), request):
+            start_time = time.time()
+            results = await run_in_threadpool(
+                processor.process_pipeline, contents, pipeline, raw_compression, return_all
+            )
+            processing_time = time.time() - start_time
+
+        headers = {"X-Processing-Time": f"{processing_time:.3f}s", "X-Pipeline-Steps": str(len(pipeline))}
+        if return_all:
+            return JSONResponse(
+                PipelineImages(
+                    media_type=media_type,
+                    compression=raw_compression,
+                    images=[base64.b64encode(data).decode("ascii") for data in results]
+                ).model_dump(),
+                headers=headers
+            )
+        return image_response(
+            results[-1],
+            media_type=media_type,
+            headers=_negotiated_headers({
+                **headers,
+                "Content-Disposition": f"attachment; filename=processed_{file.filename}"
+            }, raw_compression),
+            request=request
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid parameter: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Pipeline error: {str(e)}")
+
 @router.post("/histogram")
 async def histogram_endpoint(
+    request: Request,
     file: UploadFile = File(..., description="Image file"),
     channel: str = Form("all", description="Channel to analyze (all, red, green, blue, gray)"),
     download: str = Form("false", description="Download histogram as image (true/false)"),
-    processor: IImageProcessor = Depends(get_image_processor)
+    processor: IImageProcessor = Depends(get_image_processor),
+    admission: AdmissionController = Depends(get_admission_controller)
 ):
     """
     Calculate and return histogram data for an image.
@@ -125,59 +368,113 @@ async def histogram_endpoint(
     - download: Set to 'true' to download as PNG image instead of JSON data
     """
     try:
-        contents = await file.read()
+        contents = await _read_upload(request, file)
         
         if download.lower() == 'true':
             # Return histogram as image
-            result_bytes = processor.generate_histogram_image(contents, channel)
-            return StreamingResponse(
-                io.BytesIO(result_bytes),
+            async with _admitted(admission, _estimate(processor, contents, ["histogram_png"]), request):
+                result_bytes = await run_in_threadpool(processor.generate_histogram_image, contents, channel)
+            return image_response(
+                result_bytes,
                 media_type="image/png",
                 headers={
                     "Content-Disposition": f"attachment; filename=histogram_{channel}.png"
-                }
+                },
+                request=request
             )
         else:
             # Return histogram data as JSON
-            histogram_data = processor.get_histogram(contents, channel)
+            async with _admitted(admission, _estimate(processor, contents, ["histogram"]), request):
+                histogram_data = await run_in_threadpool(processor.get_histogram, contents, channel)
             return histogram_data
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Histogram error: {str(e)}")
+
+HISTOGRAM_CHANNELS = ("all", "red", "green", "blue", "gray")
+
+@router.post("/histograms", response_model=HistogramImages)
+async def histograms_endpoint(
+    request: Request,
+    file: UploadFile = File(..., description="Image file"),
+    channels: str = Form("all,red,green,blue", description="Comma-separated channels to render"),
+    processor: IImageProcessor = Depends(get_image_processor),
+    admission: AdmissionController = Depends(get_admission_controller)
+):
+    """
+    Render histogram PNGs for several channels in one request.
+
+    The image is uploaded and decoded once for all channels; each PNG is
+    returned base64-encoded, keyed by channel.
+    """
+    try:
+        requested = list(dict.fromkeys(c.strip() for c in channels.split(",") if c.strip()))
+        unknown = [c for c in requested if c not in HISTOGRAM_CHANNELS]
+        if not requested or unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Channels must be among {', '.join(HISTOGRAM_CHANNELS)} (got {channels!r})"
+            )
+        contents = await _read_upload(request, file)
+        cost = _estimate(processor, contents, ["histogram_png"] * len(requested))
+        async with _admitted(admission, cost, request):
+            images = await run_in_threadpool(processor.generate_histogram_images, contents, requested)
+        return HistogramImages(images={
+            channel: base64.b64encode(data).decode("ascii") for channel, data in images.items()
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Histogram error: {str(e)}")
 
 @router.post("/segment")
 async def segment_endpoint(
+    request: Request,
     file: UploadFile = File(..., description="Image file"),
-    processor: IImageProcessor = Depends(get_image_processor)
+    processor: IImageProcessor = Depends(get_image_processor),
+    admission: AdmissionController = Depends(get_admission_controller)
 ):
     """
     Separate RGB channels of an image.
     """
     try:
-        contents = await file.read()
-        channels = processor.segment_image(contents)
+        contents = await _read_upload(request, file)
+        async with _admitted(admission, _estimate(processor, contents, ["segment"]), request):
+            channels = await run_in_threadpool(processor.segment_image, contents)
         return channels
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Segmentation error: {str(e)}")
 
 @router.post("/detect_faces")
 async def detect_faces_endpoint(
+    request: Request,
     file: UploadFile = File(..., description="Image file"),
-    processor: IImageProcessor = Depends(get_image_processor)
+    processor: IImageProcessor = Depends(get_image_processor),
+    admission: AdmissionController = Depends(get_admission_controller)
 ):
     """
     Detect faces in an image and return image with bounding boxes.
     """
     try:
-        contents = await file.read()
-        result_bytes = processor.detect_faces(contents)
+        contents = await _read_upload(request, file)
+        raw_compression, media_type, encode_stage = _output_format(request)
+        cost = _estimate(processor, contents, ["grayscale", "detect_faces", encode_stage])
+        async with _admitted(admission, cost, request):
+            result_bytes = await run_in_threadpool(processor.detect_faces, contents, raw_compression)
         
-        return StreamingResponse(
-            io.BytesIO(result_bytes),
-            media_type="image/png",
-            headers={
+        return image_response(
+            result_bytes,
+            media_type=media_type,
+            headers=_negotiated_headers({
                 "Content-Disposition": "attachment; filename=faces_detected.png"
-            }
+            }, raw_compression),
+            request=request
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Face detection error: {str(e)}")
 
@@ -189,7 +486,9 @@ async def test_endpoint(
     Simple test endpoint to verify API is working.
     """
     try:
-        contents = await file.read()
+        with timed_stage("read"):
+            contents = await file.read()
+        note_buffer("upload", len(contents))
         
         # Just return image info without processing
         from PIL import Image
@@ -216,12 +515,14 @@ async def test_endpoint(
 
 @router.post("/crop")
 async def crop_image_endpoint(
+    request: Request,
     file: UploadFile = File(..., description="Image file to crop"),
     x: str = Form("0", description="Left coordinate (pixels)"),
     y: str = Form("0", description="Top coordinate (pixels)"),
     width: str = Form("100", description="Crop width (pixels)"),
     height: str = Form("100", description="Crop height (pixels)"),
-    processor: IImageProcessor = Depends(get_image_processor)
+    processor: IImageProcessor = Depends(get_image_processor),
+    admission: AdmissionController = Depends(get_admission_controller)
 ):
     """
     Crop an image to a specified rectangular region.
@@ -233,16 +534,8 @@ async def crop_image_endpoint(
     - height: Height of the crop region (pixels)
     """
     try:
-        # Read file
-        contents = await file.read()
-        
-        # Validate file size (max 10MB)
-        if len(contents) > 10 * 1024 * 1024:
-            raise HTTPException(status_code=413, detail="File too large (max 10MB)")
-        
-        # Validate file type
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
+        # Read the file and check its size and type
+        contents = await _read_image_upload(request, file)
         
         # Parse parameters
         try:
@@ -258,16 +551,239 @@ async def crop_image_endpoint(
             raise HTTPException(status_code=400, detail="Width and height must be positive")
         
         # Perform crop
-        result = processor.crop_image(contents, x_coord, y_coord, crop_width, crop_height)
+        raw_compression, media_type, encode_stage = _output_format(request)
+        async with _admitted(admission, _estimate(processor, contents, ["crop", encode_stage]), request):
+            result = await run_in_threadpool(
+                processor.crop_image, contents, x_coord, y_coord, crop_width, crop_height, raw_compression
+            )
         
         # Return as image
-        return StreamingResponse(
-            io.BytesIO(result),
-            media_type="image/png",
-            headers={"Content-Disposition": "inline; filename=cropped_image.png"}
+        return image_response(
+            result,
+            media_type=media_type,
+            headers=_negotiated_headers(
+                {"Content-Disposition": "inline; filename=cropped_image.png"}, raw_compression
+            ),
+            request=request
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Crop failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Crop failed: {str(e)}")
+
+MAX_THUMBNAIL_SIZE = 1024
+
+@router.post("/thumbnail")
+async def thumbnail_endpoint(
+    request: Request,
+    file: UploadFile = File(..., description="Image file"),
+    size: str = Form("150", description="Longest side of the thumbnail (pixels)"),
+    processor: IImageProcessor = Depends(get_image_processor),
+    admission: AdmissionController = Depends(get_admission_controller)
+):
+    """
+    Generate a thumbnail that fits in a size x size box (aspect ratio preserved).
+
+    Parameters:
+    - size: Longest side of the thumbnail, 1 to 1024 pixels
+    """
+    try:
+        contents = await _read_image_upload(request, file)
+
+        try:
+            thumb_size = int(size)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Size must be an integer")
+        if not 1 <= thumb_size <= MAX_THUMBNAIL_SIZE:
+            raise HTTPException(status_code=400, detail=f"Size must be between 1 and {MAX_THUMBNAIL_SIZE}")
+
+        raw_compression, media_type, _ = _output_format(request)
+        async with _admitted(admission, _estimate(processor, contents, ["thumbnail"]), request):
+            result = await run_in_threadpool(processor.generate_thumbnail, contents, thumb_size, raw_compression)
+
+        return image_response(
+            result,
+            media_type=media_type,
+            headers=_negotiated_headers(
+                {"Content-Disposition": f"inline; filename=thumbnail_{thumb_size}.png"}, raw_compression
+            ),
+            request=request
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Thumbnail generation failed: {str(e)}")
+
+
+@router.post("/export")
+async def export_endpoint(
+    request: Request,
+    file: UploadFile = File(..., description="Image file to export"),
+    processor: IImageProcessor = Depends(get_image_processor),
+    admission: AdmissionController = Depends(get_admission_controller)
+):
+    """
+    Encode an image as a size-optimized PNG for download.
+
+    The image mode is preserved (alpha included). Lets a frontend hand the
+    expensive optimized encode to the backend, e.g. with raw or
+    shared-memory uploads.
+    """
+    try:
+        contents = await _read_image_upload(request, file)
+
+        async with _admitted(admission, _estimate(processor, contents, ["encode"]), request):
+            result = await run_in_threadpool(processor.export_png, contents)
+
+        return image_response(
+            result,
+            media_type="image/png",
+            headers={"Content-Disposition": "attachment; filename=image.png"},
+            request=request
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+
+
+# --- Presets ---
+
+MAX_BATCH_FILES = 32
+# Files of a batch processed at once (admission still applies to each)
+BATCH_CONCURRENCY = 4
+
+
+def _spec_from_steps(steps: List[Dict[str, Any]]) -> PipelineSpec:
+    """PipelineSpec running /preprocess steps in order, with the same result as chaining them"""
+    if len(steps) > MAX_PIPELINE_STEPS:
+        raise ValueError(f"Too many steps (max {MAX_PIPELINE_STEPS})")
+    return PipelineSpec(ops=[op for step in steps for op in _params_from_form(step).to_ops()])
+
+
+def _preset(registry: PresetRegistry, name: str):
+    preset = registry.get(name)
+    if preset is None:
+        raise HTTPException(status_code=404, detail=f"Unknown preset '{name}'")
+    return preset
+
+
+@router.get("/presets", response_model=List[PresetInfo])
+async def list_presets_endpoint(registry: PresetRegistry = Depends(get_preset_registry)):
+    """Registered presets, by name"""
+    presets = await run_in_threadpool(registry.list)
+    return [preset.info() for preset in presets]
+
+
+@router.post("/presets", response_model=PresetInfo)
+async def register_preset_endpoint(
+    preset: PresetRequest,
+    registry: PresetRegistry = Depends(get_preset_registry)
+):
+    """
+    Register a named pipeline (replacing any preset of the same name).
+
+    Give either `spec` (a PipelineSpec) or `steps` (/preprocess form fields
+    per step, as for /pipeline). The pipeline is compiled now, so applying
+    the preset later only runs its plan.
+    """
+    try:
+        if (preset.spec is None) == (preset.steps is None):
+            raise HTTPException(status_code=400, detail="Provide either spec or steps")
+        spec = preset.spec if preset.spec is not None else _spec_from_steps(preset.steps)
+        if len(spec.ops) > MAX_PIPELINE_STEPS:
+            raise ValueError(f"Too many operations (max {MAX_PIPELINE_STEPS})")
+        registered = await run_in_threadpool(registry.register, preset.name, spec, preset.description)
+        return registered.info()
+
+    except HTTPException:
+        raise
+    except (ValidationError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid preset: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Preset registration failed: {str(e)}")
+
+
+@router.get("/presets/{name}", response_model=PresetInfo)
+async def get_preset_endpoint(name: str, registry: PresetRegistry = Depends(get_preset_registry)):
+    return _preset(registry, name).info()
+
+
+@router.delete("/presets/{name}")
+async def delete_preset_endpoint(name: str, registry: PresetRegistry = Depends(get_preset_registry)):
+    if not await run_in_threadpool(registry.delete, name):
+        raise HTTPException(status_code=404, detail=f"Unknown preset '{name}'")
+    return {"deleted": name}
+
+
+@router.post("/presets/{name}/apply")
+async def apply_preset_endpoint(
+    request: Request,
+    name: str,
+    file: UploadFile = File(..., description="Image file (or shared-memory handle) to process"),
+    processor: IImageProcessor = Depends(get_image_processor),
+    admission: AdmissionController = Depends(get_admission_controller),
+    registry: PresetRegistry = Depends(get_preset_registry)
+):
+    """Run a preset's precompiled plan on one image; returned like /preprocess returns its own"""
+    try:
+        preset = _preset(registry, name)
+        return await _run_spec(request, file, preset.spec, preset.plan, processor, admission,
+                               {"X-Preset": preset.name})
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid parameter: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Preset error: {str(e)}")
+
+
+@router.post("/presets/{name}/batch", response_model=BatchImages)
+async def batch_preset_endpoint(
+    request: Request,
+    name: str,
+    files: List[UploadFile] = File(..., description="Image files to process"),
+    processor: IImageProcessor = Depends(get_image_processor),
+    admission: AdmissionController = Depends(get_admission_controller),
+    registry: PresetRegistry = Depends(get_preset_registry)
+):
+    """
+    Run a preset on several images in one request.
+
+    Each file is admitted and processed on its own, a few at a time; a file
+    that fails gets an error in its entry instead of failing the batch.
+    Results come back base64-encoded in the negotiated format, in upload
+    order.
+    """
+    preset = _preset(registry, name)
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files (max {MAX_BATCH_FILES})")
+    raw_compression, media_type, encode_stage = _output_format(request)
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def process(file: UploadFile) -> BatchImage:
+        async with slots:
+            try:
+                contents = await _read_image_upload(request, file)
+                cost = _estimate(processor, contents, preset.plan.operations + [encode_stage])
+                async with _admitted(admission, cost, request):
+                    result = await run_in_threadpool(
+                        processor.run_pipeline, contents, preset.spec, raw_compression, preset.plan
+                    )
+                return BatchImage(filename=file.filename, image=base64.b64encode(result).decode("ascii"))
+            except HTTPException as e:
+                return BatchImage(filename=file.filename, error=str(e.detail))
+            except Exception as e:
+                return BatchImage(filename=file.filename, error=f"Preset error: {str(e)}")
+
+    start_time = time.time()
+    images = await asyncio.gather(*(process(file) for file in files))
+    processing_time = time.time() - start_time
+    return JSONResponse(
+        BatchImages(media_type=media_type, compression=raw_compression, images=images).model_dump(),
+        headers={"X-Processing-Time": f"{processing_time:.3f}s", "X-Preset": preset.name}
+    )
@@ -0,0 +1,39 @@
+from typing import AsyncIterator, Dict, Optional
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from backend.app.core.local_transport import (
+    HANDLE_MEDIA_TYPE, accepts_handle, get_handoff_area, is_local_request
+)
+from backend.app.domain.interfaces import ImageBytes
+
+# Below this size the whole body goes out in one send; above it, the body is
+# sent in slices so the transport never buffers a second full copy of it.
+STREAM_THRESHOLD = 4 * 1024 * 1024
+STREAM_CHUNK = 1024 * 1024
+
+
+async def _iter_slices(body: memoryview) -> AsyncIterator[memoryview]:
+    for start in range(0, body.nbytes, STREAM_CHUNK):
+        yield body[start:start + STREAM_CHUNK]
+
+
+def image_response(data: ImageBytes, media_type: str = "image/png",
+                   headers: Optional[Dict[str, str]] = None, request: Optional[Request] = None) -> Response:
+    """
+    Response for an already-encoded image, without copying it.
+
+    The processor's memoryview (a pooled encode buffer or a shared-store
+    mapping) becomes the body directly, with an exact Content-Length; large
+    bodies are streamed slice by slice under transport backpressure. Given
+    the request, a client on the Unix socket that accepts shared-memory
+    handles gets a handle to the image instead of its bytes.
+    """
+    body = memoryview(data).cast("B")
+    if request is not None and is_local_request(request.scope) and accepts_handle(request.headers):
+        handoff = get_handoff_area()
+        if handoff is not None:
+            return Response(content=handoff.publish(body, media_type), media_type=HANDLE_MEDIA_TYPE, headers=headers)
+    if body.nbytes < STREAM_THRESHOLD:
+        return Response(content=body, media_type=media_type, headers=headers)
+    headers = {**(headers or {}), "Content-Length": str(body.nbytes)}
+    return StreamingResponse(_iter_slices(body), media_type=media_type, headers=headers)
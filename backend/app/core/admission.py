@@ -0,0 +1,277 @@
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+from .metrics import timed_stage
+from .scheduler import BULK, INTERACTIVE, FairShareQueue, Ticket, classify_lane
+
+# Relative CPU work per megapixel for each stage. Calibrated against
+# benchmarks/bench_image_processor.py: PNG encode with optimize=True and the
+# bilateral filter dominate, point operations are cheap.
+OPERATION_CPU_COST: Dict[str, float] = {
+    "decode": 1.0,
+    "encode": 6.0,
+    "encode_raw": 0.2,  # header plus a memcpy (or a fast LZ4/zstd pass)
+    "brightness": 0.5,
+    "contrast": 0.5,
+    "saturation": 0.5,
+    "sharpness": 1.5,
+    "gamma": 1.0,
+    "grayscale": 0.2,
+    "resize": 1.5,
+    "rotate": 0.5,
+    "flip": 0.1,
+    "blur_gaussian": 0.5,
+    "blur_median": 2.0,
+    "blur_bilateral": 12.0,
+    "equalize": 0.3,
+    "stretch": 1.5,
+    "threshold": 0.2,
+    "threshold_adaptive": 0.6,
+    "edges": 0.6,
+    "normalize": 0.2,
+    "histogram": 0.2,
+    "histogram_png": 1.0,
+    "segment": 40.0,  # channel split plus seven full-size PNG encodes
+    "detect_faces": 4.0,
+    "crop": 0.3,
+    "thumbnail": 0.3,  # block reduce, then a filter pass over a small image
+}
+
+# Full-size working copies each stage keeps alive on top of the decoded image
+OPERATION_MEMORY_COPIES: Dict[str, float] = {
+    "decode": 2.0,
+    "encode": 1.0,
+    "encode_raw": 1.0,
+    "gamma": 4.0,  # float32 intermediate
+    "stretch": 4.0,
+    "edges": 8.0,  # float64 Sobel/Laplacian
+    "segment": 6.0,
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted before its queue deadline"""
+
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class RequestCost:
+    """Estimated CPU work units and peak bytes of one request"""
+
+    def __init__(self, cpu: float, memory_bytes: int, pixels: int = 0):
+        self.cpu = cpu
+        self.memory_bytes = memory_bytes
+        self.pixels = pixels
+
+    def __repr__(self) -> str:
+        return f"RequestCost(cpu={self.cpu:.1f}, memory={self.memory_bytes / (1024 * 1024):.0f}MB)"
+
+
+def estimate_cost(width: int, height: int, channels: int, operations: Iterable[str]) -> RequestCost:
+    """Cost of decoding a width x height x channels image and running `operations` on it
+
+    Include "encode" in `operations` when the full-size result is re-encoded.
+    """
+    megapixels = width * height / 1_000_000
+    stages = ["decode", *operations]
+    cpu = megapixels * sum(OPERATION_CPU_COST.get(op, 1.0) for op in stages)
+    copies = max(OPERATION_MEMORY_COPIES.get(op, 1.0) for op in stages) + 1
+    memory = int(width * height * max(1, channels) * copies)
+    return RequestCost(cpu, memory, width * height)
+
+
+class AdmissionConfig:
+    """Admission budgets, read from the environment"""
+
+    def __init__(self):
+        cpus = os.cpu_count() or 1
+        self.cpu_budget = float(os.environ.get("IMAGEFLOW_CPU_BUDGET", 40 * cpus))
+        self.memory_budget = int(float(os.environ.get("IMAGEFLOW_MEMORY_BUDGET_MB", "1024")) * 1024 * 1024)
+        self.queue_timeout = float(os.environ.get("IMAGEFLOW_QUEUE_TIMEOUT", "2.0"))
+        # Bulk work is expected to wait; rejecting it quickly only causes retries
+        self.bulk_queue_timeout = float(os.environ.get("IMAGEFLOW_BULK_QUEUE_TIMEOUT", "30.0"))
+        self.max_queue = int(os.environ.get("IMAGEFLOW_MAX_QUEUE", "32"))
+        self.max_queue_per_client = int(os.environ.get("IMAGEFLOW_MAX_QUEUE_PER_CLIENT", "8"))
+        self.interactive_max_pixels = int(float(os.environ.get("IMAGEFLOW_INTERACTIVE_MAX_MP", "4")) * 1_000_000)
+
+
+class AdmissionController:
+    """Admits work against a CPU/memory budget, queueing briefly when it is used up
+
+    Waiting requests are granted in weighted fair-share order across clients,
+    with preview-sized requests in a higher-weight interactive lane (see
+    core/scheduler.py). The chosen request is never overtaken by smaller ones
+    that happen to fit, so large requests make progress too. A request whose
+    cost alone exceeds the budget is clamped to the whole budget: it still
+    runs, but only when nothing else does.
+    """
+
+    def __init__(self, cpu_budget: float, memory_budget: int, queue_timeout: float, max_queue: int,
+                 bulk_queue_timeout: Optional[float] = None, max_queue_per_client: Optional[int] = None,
+                 interactive_max_pixels: int = 4_000_000):
+        self.cpu_budget = cpu_budget
+        self.memory_budget = memory_budget
+        self.queue_timeout = queue_timeout
+        self.bulk_queue_timeout = queue_timeout if bulk_queue_timeout is None else bulk_queue_timeout
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue if max_queue_per_client is None else max_queue_per_client
+        self.interactive_max_pixels = interactive_max_pixels
+
+        self.cpu_in_use = 0.0
+        self.memory_in_use = 0
+        self.in_flight = 0
+        self._waiters = FairShareQueue()
+
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self._avg_hold = 0.5  # EWMA of seconds a slot is held, seeds Retry-After
+
+    def _clamp(self, cost: RequestCost) -> RequestCost:
+        return RequestCost(min(cost.cpu, self.cpu_budget), min(cost.memory_bytes, self.memory_budget))
+
+    def _fits(self, cost: RequestCost) -> bool:
+        return (self.cpu_in_use + cost.cpu <= self.cpu_budget
+                and self.memory_in_use + cost.memory_bytes <= self.memory_budget)
+
+    def _take(self, cost: RequestCost) -> None:
+        self.cpu_in_use += cost.cpu
+        self.memory_in_use += cost.memory_bytes
+        self.in_flight += 1
+        self.admitted_total += 1
+
+    def _release(self, cost: RequestCost, held: float) -> None:
+        self.cpu_in_use = max(0.0, self.cpu_in_use - cost.cpu)
+        self.memory_in_use = max(0, self.memory_in_use - cost.memory_bytes)
+        self.in_flight -= 1
+        self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        while self._waiters:
+            head = self._waiters.peek()
+            if not self._fits(head.cost):
+                break
+            self._waiters.pop()
+            self._take(head.cost)
+            head.future.set_result(None)
+
+    def classify(self, cost: RequestCost, hint: Optional[str] = None) -> str:
+        """Scheduling lane of a request: interactive for previews, bulk otherwise"""
+        return classify_lane(cost.pixels, hint, self.interactive_max_pixels)
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait, from queue depth and recent hold times"""
+        parallelism = max(1, self.in_flight)
+        return max(1, math.ceil(self._avg_hold * (len(self._waiters) + 1) / parallelism))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected_total += 1
+        return AdmissionRejected(self.retry_after(), reason)
+
+    async def acquire(self, cost: RequestCost, client: str = "anonymous", lane: str = INTERACTIVE) -> RequestCost:
+        """Wait for budget; returns the (clamped) cost that must be released"""
+        cost = self._clamp(cost)
+        if not self._waiters and self._fits(cost):
+            self._take(cost)
+            return cost
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("Server saturated: admission queue is full")
+        if self._waiters.count(client=client) >= self.max_queue_per_client:
+            raise self._reject("Too many queued requests for this client")
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = Ticket(client, lane, cost, future)
+        self._waiters.push(waiter)
+        timeout = self.bulk_queue_timeout if lane == BULK else self.queue_timeout
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            if future.done():
+                return cost  # Granted just as the deadline hit
+            self._abandon(waiter)
+            raise self._reject("Server saturated: no capacity within the queue timeout")
+        except asyncio.CancelledError:
+            if future.done():
+                self._release(cost, 0.0)  # Client went away after being granted
+            else:
+                self._abandon(waiter)
+            raise
+        return cost
+
+    def _abandon(self, waiter: Ticket) -> None:
+        waiter.future.cancel()
+        self._waiters.remove(waiter)
+        # The abandoned waiter may have been the head blocking smaller requests
+        self._wake_waiters()
+
+    @asynccontextmanager
+    async def admit(self, cost: RequestCost, client: str = "anonymous", lane: str = INTERACTIVE) -> AsyncIterator[None]:
+        """Hold budget for the duration of the block; time spent waiting is the "queue" stage"""
+        with timed_stage("queue"):
+            granted = await self.acquire(cost, client, lane)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(granted, time.perf_counter() - start)
+
+    @property
+    def saturated(self) -> bool:
+        return bool(self._waiters) or self.cpu_in_use >= self.cpu_budget or self.memory_in_use >= self.memory_budget
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "saturated": self.saturated,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            **self._waiters.snapshot(),
+            "cpu_in_use": round(self.cpu_in_use, 2),
+            "cpu_budget": self.cpu_budget,
+            "cpu_utilization": round(self.cpu_in_use / self.cpu_budget, 3) if self.cpu_budget else 0.0,
+            "memory_in_use_mb": round(self.memory_in_use / (1024 * 1024), 1),
+            "memory_budget_mb": round(self.memory_budget / (1024 * 1024), 1),
+            "admitted_total": self.admitted_total,
+            "rejected_total": self.rejected_total,
+        }
+
+    def render_prometheus(self) -> str:
+        """Admission gauges and counters in the Prometheus text exposition format"""
+        lines = [
+            "# HELP imageflow_admission_in_flight Requests currently holding admission budget.",
+            "# TYPE imageflow_admission_in_flight gauge",
+            f"imageflow_admission_in_flight {self.in_flight}",
+            "# HELP imageflow_admission_queued Requests waiting for admission budget, per scheduling lane.",
+            "# TYPE imageflow_admission_queued gauge",
+            *(f'imageflow_admission_queued{{lane="{lane}"}} {count}'
+              for lane, count in self._waiters.snapshot()["queued_by_lane"].items()),
+            "# HELP imageflow_admission_cpu_utilization Share of the CPU work budget in use.",
+            "# TYPE imageflow_admission_cpu_utilization gauge",
+            f"imageflow_admission_cpu_utilization {self.cpu_in_use / self.cpu_budget if self.cpu_budget else 0.0}",
+            "# HELP imageflow_admission_memory_bytes Estimated bytes held by admitted requests.",
+            "# TYPE imageflow_admission_memory_bytes gauge",
+            f"imageflow_admission_memory_bytes {self.memory_in_use}",
+            "# HELP imageflow_admission_rejected_total Requests rejected with 503.",
+            "# TYPE imageflow_admission_rejected_total counter",
+            f"imageflow_admission_rejected_total {self.rejected_total}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+@lru_cache()
+def get_admission_controller() -> AdmissionController:
+    """Process-wide AdmissionController (shared by processing routes and /ready)"""
+    config = AdmissionConfig()
+    return AdmissionController(
+        config.cpu_budget, config.memory_budget, config.queue_timeout, config.max_queue,
+        bulk_queue_timeout=config.bulk_queue_timeout,
+        max_queue_per_client=config.max_queue_per_client,
+        interactive_max_pixels=config.interactive_max_pixels,
+    )
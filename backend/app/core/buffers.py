@@ -0,0 +1,109 @@
+import threading
+from functools import lru_cache
+from typing import List, Optional
+
+MB = 1024 * 1024
+
+
+class PooledBuffer:
+    """Growable write buffer whose storage is recycled through a BufferPool
+
+    Encoders write into it like a file; getbuffer() then hands out a
+    memoryview of exactly the written bytes without copying them. The
+    storage goes back to the pool automatically once every view derived
+    from it has been released (PEP 688 buffer protocol), so a response body
+    can keep it alive until the last byte has been sent.
+    """
+
+    def __init__(self, pool: Optional["BufferPool"], data: bytearray):
+        self._pool = pool
+        self._data = data
+        self._size = 0
+        self._exports = 0
+        self._handed_off = False
+
+    # File-like interface used by PIL and matplotlib encoders
+    def write(self, data) -> int:
+        view = memoryview(data).cast("B")
+        end = self._size + view.nbytes
+        if end > len(self._data):
+            # Amortized doubling; only possible while no view is exported
+            self._data.extend(bytes(max(end, 2 * len(self._data)) - len(self._data)))
+        self._data[self._size:end] = view
+        self._size = end
+        return view.nbytes
+
+    def tell(self) -> int:
+        return self._size
+
+    def flush(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return self._size
+
+    def getbuffer(self) -> memoryview:
+        """Zero-copy view of the written bytes; the buffer is recycled when it is released"""
+        self._handed_off = True
+        return memoryview(self)
+
+    def __buffer__(self, flags: int) -> memoryview:
+        self._exports += 1
+        return memoryview(self._data)[:self._size]
+
+    def __release_buffer__(self, view: memoryview) -> None:
+        view.release()
+        self._exports -= 1
+        if self._exports == 0 and self._handed_off and self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool._give_back(self._data)
+
+
+class BufferPool:
+    """Thread-safe free list of encode buffers
+
+    Keeps up to `max_buffers` bytearrays of at most `max_buffer_bytes` each,
+    so steady traffic reuses the same allocations instead of growing and
+    freeing a fresh BytesIO (plus a getvalue() copy) for every response.
+    """
+
+    def __init__(self, max_buffers: int = 8, max_buffer_bytes: int = 64 * MB, initial_bytes: int = 256 * 1024):
+        self.max_buffers = max_buffers
+        self.max_buffer_bytes = max_buffer_bytes
+        self.initial_bytes = initial_bytes
+        self._free: List[bytearray] = []
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.allocated = 0
+
+    def acquire(self, size_hint: int = 0) -> PooledBuffer:
+        with self._lock:
+            # Largest free buffer first: it is the least likely to need growing
+            if self._free:
+                self._free.sort(key=len)
+                self.reused += 1
+                return PooledBuffer(self, self._free.pop())
+            self.allocated += 1
+        return PooledBuffer(self, bytearray(max(size_hint, self.initial_bytes)))
+
+    def _give_back(self, data: bytearray) -> None:
+        if len(data) > self.max_buffer_bytes:
+            return
+        with self._lock:
+            if len(self._free) < self.max_buffers:
+                self._free.append(data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "free_buffers": len(self._free),
+                "free_mb": round(sum(len(data) for data in self._free) / MB, 1),
+                "reused": self.reused,
+                "allocated": self.allocated,
+            }
+
+
+@lru_cache()
+def get_buffer_pool() -> BufferPool:
+    """Process-wide BufferPool shared by all encoders"""
+    return BufferPool()
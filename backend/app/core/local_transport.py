@@ -0,0 +1,114 @@
+import json
+import logging
+import mmap
+import os
+import re
+import tempfile
+import time
+import uuid
+from functools import lru_cache
+from typing import Any, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# A request part or response body of this type carries a JSON handle
+# {"name", "size", "media_type"} naming a file in the handoff directory
+# instead of the image bytes themselves.
+HANDLE_MEDIA_TYPE = "application/x-imageflow-shm"
+
+HANDOFF_DIR_ENV = "IMAGEFLOW_HANDOFF_DIR"
+
+# Unclaimed handoff files (a client that died mid-request) are removed after this
+HANDOFF_TTL = 60.0
+
+_NAME = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9._-]{0,127}$")
+
+
+def _default_directory() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "imageflow-handoff")
+
+
+def is_local_request(scope: Mapping[str, Any]) -> bool:
+    """True when the request arrived on the Unix domain socket
+
+    uvicorn reports a UDS listener as (path, None); TCP listeners always
+    have a port.
+    """
+    server = scope.get("server")
+    return bool(server) and server[1] is None
+
+
+def accepts_handle(headers: Mapping[str, str]) -> bool:
+    return HANDLE_MEDIA_TYPE in headers.get("accept", "")
+
+
+class HandoffArea:
+    """Directory on a memory-backed filesystem used to pass images by handle
+
+    Only clients on the Unix socket may use it: they share the host, so a
+    file written by one side is mapped by the other with no serialization
+    and no socket copy. Whoever reads a handle owns the file and unlinks it;
+    the frontend removes its uploads once the response is in.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._last_sweep = 0.0
+
+    def _path(self, name: str) -> str:
+        if not _NAME.match(name):
+            raise ValueError(f"Invalid handoff name: {name!r}")
+        return os.path.join(self.directory, name)
+
+    def open(self, handle: bytes) -> memoryview:
+        """Map the file a handle points to; the mapping outlives the file"""
+        try:
+            spec = json.loads(handle)
+            name, size = spec["name"], int(spec["size"])
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"Malformed shared-memory handle: {e}")
+        try:
+            with open(self._path(name), "rb") as f:
+                if os.fstat(f.fileno()).st_size < size or size <= 0:
+                    raise ValueError("Shared-memory handle size does not match its file")
+                mapping = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            raise ValueError(f"Shared-memory handle {name!r} not found (expired?)")
+        return memoryview(mapping)
+
+    def publish(self, data: Any, media_type: str) -> bytes:
+        """Write `data` to a new handoff file and return the handle the client should map"""
+        self._sweep()
+        view = memoryview(data).cast("B")
+        name = f"out-{os.getpid()}-{uuid.uuid4().hex}"
+        path = self._path(name)
+        tmp_path = os.path.join(self.directory, f".tmp-{name}")
+        with open(tmp_path, "wb") as f:
+            f.write(view)
+        os.replace(tmp_path, path)
+        return json.dumps({"name": name, "size": view.nbytes, "media_type": media_type}).encode()
+
+    def _sweep(self) -> None:
+        now = time.time()
+        if now - self._last_sweep < HANDOFF_TTL / 4:
+            return
+        self._last_sweep = now
+        for entry in os.scandir(self.directory):
+            try:
+                if now - entry.stat().st_mtime > HANDOFF_TTL:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                continue
+
+
+@lru_cache()
+def get_handoff_area() -> Optional[HandoffArea]:
+    """Process-wide HandoffArea, or None when its directory cannot be created"""
+    directory = os.environ.get(HANDOFF_DIR_ENV) or _default_directory()
+    try:
+        return HandoffArea(directory)
+    except OSError as e:
+        logger.warning("⚠️ Shared-memory handoff disabled (%s): %s", directory, e)
+        return None
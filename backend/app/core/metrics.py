@@ -0,0 +1,164 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets (seconds) shared by request and stage histograms
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+class StageTimer:
+    """Collects the duration of every pipeline stage of a single request
+
+    An optional memory profile (see core.profiling) is driven by the same
+    stages so that timing and allocation figures line up one-to-one.
+    """
+
+    def __init__(self, memory=None):
+        self.stages: List[Tuple[str, float]] = []
+        self.memory = memory
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages.append((name, seconds))
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            if self.memory is None:
+                yield
+            else:
+                with self.memory.stage(name):
+                    yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def server_timing_header(self, total: Optional[float] = None) -> str:
+        """Format the collected stages as a Server-Timing header value"""
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages]
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+_current_timer: ContextVar[Optional[StageTimer]] = ContextVar("stage_timer", default=None)
+
+
+def current_timer() -> Optional[StageTimer]:
+    """StageTimer of the request being served, if any"""
+    return _current_timer.get()
+
+
+@contextmanager
+def request_timer(memory=None) -> Iterator[StageTimer]:
+    """Install a fresh StageTimer for the duration of a request"""
+    timer = StageTimer(memory)
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+@contextmanager
+def timed_stage(name: str) -> Iterator[None]:
+    """Time a block as a named stage of the current request (no-op outside a request)"""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus sense (counts per upper bound)"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRegistry:
+    """Thread-safe store of request and stage latency histograms"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, str], Histogram] = {}
+        self._responses: Dict[Tuple[str, str, str], int] = {}
+        self._stages: Dict[str, Histogram] = {}
+
+    def observe_request(self, method: str, endpoint: str, status_code: int, seconds: float) -> None:
+        with self._lock:
+            hist = self._requests.get((method, endpoint))
+            if hist is None:
+                hist = self._requests[(method, endpoint)] = Histogram(self._buckets)
+            hist.observe(seconds)
+            key = (method, endpoint, str(status_code))
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def observe_stages(self, timer: StageTimer) -> None:
+        with self._lock:
+            for name, seconds in timer.stages:
+                hist = self._stages.get(name)
+                if hist is None:
+                    hist = self._stages[name] = Histogram(self._buckets)
+                hist.observe(seconds)
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            lines.append("# HELP imageflow_request_duration_seconds End-to-end request latency per endpoint.")
+            lines.append("# TYPE imageflow_request_duration_seconds histogram")
+            for (method, endpoint), hist in sorted(self._requests.items()):
+                labels = f'method="{method}",endpoint="{_escape(endpoint)}"'
+                lines.extend(_render_histogram("imageflow_request_duration_seconds", labels, hist))
+
+            lines.append("# HELP imageflow_requests_total Responses per endpoint and status code.")
+            lines.append("# TYPE imageflow_requests_total counter")
+            for (method, endpoint, status), count in sorted(self._responses.items()):
+                labels = f'method="{method}",endpoint="{_escape(endpoint)}",status="{status}"'
+                lines.append(f"imageflow_requests_total{{{labels}}} {count}")
+
+            lines.append("# HELP imageflow_stage_duration_seconds Latency of each pipeline stage (read, decode, operations, encode).")
+            lines.append("# TYPE imageflow_stage_duration_seconds histogram")
+            for stage, hist in sorted(self._stages.items()):
+                labels = f'stage="{_escape(stage)}"'
+                lines.extend(_render_histogram("imageflow_stage_duration_seconds", labels, hist))
+        return "\n".join(lines) + "\n"
+
+
+@lru_cache()
+def get_metrics_registry() -> MetricsRegistry:
+    """Process-wide MetricsRegistry (shared by the middleware and /metrics)"""
+    return MetricsRegistry()
+
+
+def _render_histogram(name: str, labels: str, hist: Histogram) -> List[str]:
+    lines = [
+        f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+        for bound, count in zip(hist.buckets, hist.counts)
+    ]
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+    lines.append(f"{name}_sum{{{labels}}} {hist.sum:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {hist.count}")
+    return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
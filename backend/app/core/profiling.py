@@ -0,0 +1,207 @@
+import logging
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .metrics import current_timer
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: tracing every allocation costs CPU, so it is off unless asked for
+PROFILE_ENV = "IMAGEFLOW_PROFILE_MEMORY"
+SLOW_MS_ENV = "IMAGEFLOW_PROFILE_SLOW_MS"
+LARGE_MB_ENV = "IMAGEFLOW_PROFILE_LARGE_MB"
+TOP_N_ENV = "IMAGEFLOW_PROFILE_TOP"
+
+MB = 1024 * 1024
+
+
+class ProfilingConfig:
+    """Memory profiling settings, read from the environment"""
+
+    def __init__(self):
+        self.enabled = os.environ.get(PROFILE_ENV, "false").lower() in ("1", "true", "yes")
+        self.slow_seconds = float(os.environ.get(SLOW_MS_ENV, "2000")) / 1000
+        self.large_bytes = int(float(os.environ.get(LARGE_MB_ENV, "200")) * MB)
+        self.top_n = int(os.environ.get(TOP_N_ENV, "10"))
+
+
+@lru_cache()
+def get_profiling_config() -> ProfilingConfig:
+    return ProfilingConfig()
+
+
+def start_memory_tracing(frames: int = 10) -> bool:
+    """Start tracemalloc if profiling is enabled; returns whether it is active"""
+    if not get_profiling_config().enabled:
+        return False
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        logger.info("🧠 Memory profiling enabled (tracemalloc, %d frames)", frames)
+    return True
+
+
+class MemoryProfile:
+    """Peak traced allocation of one request and of each of its stages
+
+    tracemalloc's peak counter is process-wide: a concurrent request would
+    reset it (figures too low) and add its own allocations (figures too
+    high), so figures are only meaningful with one request in flight. The
+    API serializes requests while profiling is on for that reason. NumPy
+    arrays (OpenCV results included) are traced, but the pixel memory PIL
+    allocates for its own images is not, which is why call sites also
+    report their buffer sizes through note_buffer().
+
+    Stages may nest: each stage resets the peak counter, so the peak reached
+    before an inner stage, and the inner stage's own peak, are carried over
+    to the enclosing stage.
+    """
+
+    def __init__(self, large_bytes: int):
+        self.large_bytes = large_bytes
+        tracemalloc.reset_peak()
+        self.start_bytes, _ = tracemalloc.get_traced_memory()
+        self.peak_bytes = 0
+        self.stages: List[Tuple[str, int]] = []
+        self.buffers: List[Tuple[str, int]] = []
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self._heaviest_stage = 0
+        # Peak of each open stage that reset_peak() in a nested stage has wiped
+        self._open_peaks: List[int] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        before, peak_so_far = tracemalloc.get_traced_memory()
+        self.peak_bytes = max(self.peak_bytes, peak_so_far - self.start_bytes)
+        if self._open_peaks:
+            self._open_peaks[-1] = max(self._open_peaks[-1], peak_so_far)
+        self._open_peaks.append(0)
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self._open_peaks.pop())
+            if self._open_peaks:
+                self._open_peaks[-1] = max(self._open_peaks[-1], peak)
+            growth = max(0, peak - before)
+            self.stages.append((name, growth))
+            self.peak_bytes = max(self.peak_bytes, peak - self.start_bytes)
+            # Snapshot right after the heaviest stage: its outputs are still alive
+            if growth >= self.large_bytes and growth > self._heaviest_stage:
+                self._heaviest_stage = growth
+                self.snapshot = tracemalloc.take_snapshot()
+
+    def finish(self) -> None:
+        _, peak = tracemalloc.get_traced_memory()
+        self.peak_bytes = max(self.peak_bytes, peak - self.start_bytes)
+
+    def note_buffer(self, name: str, nbytes: int) -> None:
+        self.buffers.append((name, int(nbytes)))
+
+    def top_allocators(self, limit: int) -> List[str]:
+        snapshot = self.snapshot or tracemalloc.take_snapshot()
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        return [str(stat) for stat in snapshot.statistics("lineno")[:limit]]
+
+
+def start_memory_profile() -> Optional[MemoryProfile]:
+    """New MemoryProfile for a request, or None when profiling is off"""
+    config = get_profiling_config()
+    if not config.enabled or not tracemalloc.is_tracing():
+        return None
+    return MemoryProfile(config.large_bytes)
+
+
+def note_buffer(name: str, nbytes: int) -> None:
+    """Record the size of a pixel/byte buffer held by the current request (no-op when off)"""
+    timer = current_timer()
+    if timer is not None and timer.memory is not None:
+        timer.memory.note_buffer(name, nbytes)
+
+
+class _Aggregate:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value: int) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_mb": round(self.total / self.count / MB, 3) if self.count else 0.0,
+            "max_mb": round(self.max / MB, 3),
+        }
+
+
+class MemoryStats:
+    """Thread-safe aggregation of request and stage memory profiles"""
+
+    def __init__(self, keep_largest: int = 10):
+        self._lock = threading.Lock()
+        self._keep_largest = keep_largest
+        self._endpoints: Dict[str, _Aggregate] = {}
+        self._stages: Dict[str, _Aggregate] = {}
+        self._buffers: Dict[str, _Aggregate] = {}
+        self._largest: List[Dict[str, Any]] = []
+
+    def record(self, endpoint: str, profile: MemoryProfile, seconds: float) -> None:
+        with self._lock:
+            self._endpoints.setdefault(endpoint, _Aggregate()).add(profile.peak_bytes)
+            for name, growth in profile.stages:
+                self._stages.setdefault(name, _Aggregate()).add(growth)
+            for name, nbytes in profile.buffers:
+                self._buffers.setdefault(name, _Aggregate()).add(nbytes)
+
+            self._largest.append({
+                "endpoint": endpoint,
+                "peak_mb": round(profile.peak_bytes / MB, 3),
+                "duration_ms": round(seconds * 1000, 1),
+                "stages_mb": {name: round(growth / MB, 3) for name, growth in profile.stages},
+                "buffers_mb": {name: round(nbytes / MB, 3) for name, nbytes in profile.buffers},
+            })
+            self._largest.sort(key=lambda entry: entry["peak_mb"], reverse=True)
+            del self._largest[self._keep_largest:]
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "endpoints": {name: agg.as_dict() for name, agg in sorted(self._endpoints.items())},
+                "stages": {name: agg.as_dict() for name, agg in sorted(self._stages.items())},
+                "buffers": {name: agg.as_dict() for name, agg in sorted(self._buffers.items())},
+                "largest_requests": list(self._largest),
+            }
+
+
+@lru_cache()
+def get_memory_stats() -> MemoryStats:
+    """Process-wide MemoryStats (shared by the middleware and /debug/memory)"""
+    return MemoryStats()
+
+
+def finish_memory_profile(endpoint: str, profile: MemoryProfile, seconds: float) -> None:
+    """Aggregate a finished request and log its top allocators if it was slow or large"""
+    config = get_profiling_config()
+    profile.finish()
+    get_memory_stats().record(endpoint, profile, seconds)
+
+    if seconds < config.slow_seconds and profile.peak_bytes < config.large_bytes:
+        return
+    stages = ", ".join(f"{name}=+{growth / MB:.1f}MB" for name, growth in profile.stages)
+    buffers = ", ".join(f"{name}={nbytes / MB:.1f}MB" for name, nbytes in profile.buffers)
+    logger.warning(
+        "🧠 %s took %.0f ms, traced peak %.1f MB | stages: %s | buffers: %s\n  top allocators:\n    %s",
+        endpoint, seconds * 1000, profile.peak_bytes / MB, stages or "-", buffers or "-",
+        "\n    ".join(profile.top_allocators(config.top_n)),
+    )
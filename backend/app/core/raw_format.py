@@ -0,0 +1,176 @@
+import struct
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+# Optional, faster codecs: used when installed, negotiated away otherwise
+try:
+    import lz4.frame as _lz4
+except ImportError:
+    _lz4 = None
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+
+# Raw pixel wire format shared with frontend/utils/raw_format.py (keep in sync).
+#
+#   magic "IFRW" | version u8 | dtype u8 | channels u8 | compression u8 |
+#   channel order 4s | width u32 | height u32 | payload length u64 | 4 pad
+#
+# followed by the (optionally compressed) row-major, interleaved pixels.
+RAW_MEDIA_TYPE = "application/x-imageflow-raw"
+COMPRESSION_HEADER = "X-Raw-Compression"
+
+MAGIC = b"IFRW"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBBB4sIIQ4x")
+
+DTYPE_UINT8 = 1
+
+# Channel order -> (PIL mode, PIL raw mode, channels)
+ORDERS: Dict[str, Tuple[str, str, int]] = {
+    "L": ("L", "L", 1),
+    "RGB": ("RGB", "RGB", 3),
+    "RGBA": ("RGBA", "RGBA", 4),
+    "BGR": ("RGB", "BGR", 3),
+    "BGRA": ("RGBA", "BGRA", 4),
+}
+
+_COMPRESSION_CODES = {"none": 0, "zlib": 1, "lz4": 2, "zstd": 3}
+_COMPRESSION_NAMES = {code: name for name, code in _COMPRESSION_CODES.items()}
+
+
+def available_compressions() -> List[str]:
+    """Compressions this process can encode and decode, fastest first"""
+    names = ["none"]
+    if _lz4 is not None:
+        names.append("lz4")
+    if _zstd is not None:
+        names.append("zstd")
+    names.append("zlib")
+    return names
+
+
+def _compress(name: str, data) -> bytes:
+    if name == "zlib":
+        return zlib.compress(data, 1)
+    if name == "lz4":
+        return _lz4.compress(data)
+    if name == "zstd":
+        return _zstd.ZstdCompressor(level=1).compress(data)
+    raise ValueError(f"Unsupported raw compression: {name}")
+
+
+def _decompress(name: str, data, expected: int) -> bytes:
+    """Inflate a payload that must hold exactly `expected` bytes
+
+    Output is capped just past `expected`, so a small, hostile payload
+    cannot expand into an arbitrarily large buffer.
+    """
+    try:
+        if name == "zlib":
+            decompressor = zlib.decompressobj()
+            pixels = decompressor.decompress(data, expected + 1)
+            complete = decompressor.eof
+        elif name == "lz4" and _lz4 is not None:
+            decompressor = _lz4.LZ4FrameDecompressor()
+            pixels = decompressor.decompress(data, max_length=expected + 1)
+            complete = decompressor.eof
+        elif name == "zstd" and _zstd is not None:
+            # A frame that declares its size is allocated up front: check it first
+            if _zstd.frame_content_size(data) not in (-1, expected):
+                raise ValueError("Raw payload size does not match its header")
+            pixels = _zstd.ZstdDecompressor().decompress(data, max_output_size=expected)
+            complete = True
+        else:
+            raise ValueError(f"Unsupported raw compression: {name}")
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Corrupt {name} raw payload: {e}")
+    if not complete or len(pixels) != expected:
+        raise ValueError("Raw payload size does not match its header")
+    return pixels
+
+
+class RawHeader:
+    """Decoded header of a raw pixel payload"""
+
+    def __init__(self, width: int, height: int, channels: int, order: str, compression: str, payload_len: int):
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.order = order
+        self.compression = compression
+        self.payload_len = payload_len
+
+
+def is_raw(data) -> bool:
+    return bytes(data[:4]) == MAGIC
+
+
+def read_header(data) -> RawHeader:
+    if len(data) < _HEADER.size:
+        raise ValueError("Truncated raw image header")
+    magic, version, dtype, channels, compression, order, width, height, payload_len = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a raw image payload (bad magic or version)")
+    if dtype != DTYPE_UINT8:
+        raise ValueError(f"Unsupported raw dtype code {dtype}")
+    # Same decompression bomb limit as PIL applies to encoded images
+    if Image.MAX_IMAGE_PIXELS is not None and width * height > Image.MAX_IMAGE_PIXELS:
+        raise ValueError(f"Raw image of {width}x{height} pixels exceeds the {Image.MAX_IMAGE_PIXELS} pixel limit")
+    order = order.rstrip(b"\x00").decode("ascii")
+    if order not in ORDERS or ORDERS[order][2] != channels:
+        raise ValueError(f"Unsupported channel order {order!r} for {channels} channels")
+    if compression not in _COMPRESSION_NAMES:
+        raise ValueError(f"Unknown raw compression code {compression}")
+    if len(data) < _HEADER.size + payload_len:
+        raise ValueError("Truncated raw image payload")
+    return RawHeader(width, height, channels, order, _COMPRESSION_NAMES[compression], payload_len)
+
+
+def write_raw(out, pixels, width: int, height: int, order: str, compression: str = "none") -> None:
+    """Write header and pixels (any C-contiguous uint8 buffer) to the file-like `out`"""
+    channels = ORDERS[order][2]
+    pixels = memoryview(pixels).cast("B")
+    if pixels.nbytes != width * height * channels:
+        raise ValueError("Pixel buffer size does not match width x height x channels")
+    payload = pixels if compression == "none" else _compress(compression, pixels)
+    out.write(_HEADER.pack(MAGIC, VERSION, DTYPE_UINT8, channels, _COMPRESSION_CODES[compression],
+                           order.encode("ascii"), width, height, len(payload)))
+    out.write(payload)
+
+
+def to_pil(data) -> Image.Image:
+    """PIL image from a raw payload; uncompressed L/RGBA pixels are mapped, not copied"""
+    header = read_header(data)
+    payload = memoryview(data)[_HEADER.size:_HEADER.size + header.payload_len]
+    expected = header.width * header.height * header.channels
+    if header.compression != "none":
+        payload = _decompress(header.compression, payload, expected)
+    if len(payload) != expected:
+        raise ValueError("Raw payload size does not match its header")
+    mode, rawmode, _ = ORDERS[header.order]
+    return Image.frombuffer(mode, (header.width, header.height), payload, "raw", rawmode, 0, 1)
+
+
+def negotiate(accept: Optional[str], compression_header: Optional[str]) -> Optional[str]:
+    """
+    Raw compression to answer with, or None for PNG.
+
+    Raw is used only when the client lists RAW_MEDIA_TYPE in Accept; the
+    compression is the first entry of its X-Raw-Compression preference list
+    that this process supports ("none" when it sent no list).
+    """
+    if not accept or RAW_MEDIA_TYPE not in accept:
+        return None
+    supported = available_compressions()
+    if not compression_header:
+        return "none"
+    for name in (part.strip().lower() for part in compression_header.split(",")):
+        if name in supported:
+            return name
+    return "none"
@@ -0,0 +1,131 @@
+import heapq
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Clients identify themselves with X-Client-Id (the Streamlit frontend sends
+# one id per browser session); X-Priority: bulk lets batch callers opt out of
+# the interactive lane.
+CLIENT_HEADER = "X-Client-Id"
+PRIORITY_HEADER = "X-Priority"
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+# Share of the CPU each lane gets while both are backlogged
+LANE_WEIGHTS: Dict[str, float] = {INTERACTIVE: 8.0, BULK: 1.0}
+
+
+def classify_lane(pixels: int, hint: Optional[str], interactive_max_pixels: int) -> str:
+    """Preview-sized requests are interactive unless the caller asked for the bulk lane"""
+    if hint is not None and hint.lower() == BULK:
+        return BULK
+    return INTERACTIVE if pixels <= interactive_max_pixels else BULK
+
+
+class Ticket:
+    """One queued request: who sent it, its lane, its cost and the future that grants it"""
+
+    def __init__(self, client: str, lane: str, cost: Any, future: Any):
+        self.client = client
+        self.lane = lane
+        self.cost = cost
+        self.future = future
+        self.start_tag = 0.0
+
+    @property
+    def flow(self) -> Tuple[str, str]:
+        return (self.lane, self.client)
+
+
+class FairShareQueue:
+    """Start-time fair queueing across (lane, client) flows
+
+    Each flow gets a share of the CPU proportional to its lane weight, so a
+    client with a deep backlog of bulk work advances its own virtual clock
+    and cannot push other clients' requests behind all of it. Within a flow,
+    order is FIFO.
+
+    Flow ids come from a client header, so per-flow state is bounded: an
+    idle flow's clock is kept only until virtual time catches up with it,
+    and all of it is dropped whenever the queue empties.
+    """
+
+    def __init__(self, lane_weights: Optional[Dict[str, float]] = None):
+        self.lane_weights = dict(lane_weights or LANE_WEIGHTS)
+        self._flows: Dict[Tuple[str, str], Deque[Ticket]] = {}
+        self._last_finish: Dict[Tuple[str, str], float] = {}
+        # (finish tag, flow) of idle flows still ahead of virtual time, soonest first
+        self._idle: List[Tuple[float, Tuple[str, str]]] = []
+        self._virtual_time = 0.0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, ticket: Ticket) -> None:
+        flow = ticket.flow
+        weight = self.lane_weights.get(ticket.lane, 1.0)
+        ticket.start_tag = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+        # Tiny requests still advance the flow's clock so they cannot flood it
+        self._last_finish[flow] = ticket.start_tag + max(ticket.cost.cpu, 0.01) / weight
+        self._flows.setdefault(flow, deque()).append(ticket)
+        self._size += 1
+
+    def peek(self) -> Optional[Ticket]:
+        """The ticket that should be granted next: smallest start tag among flow heads"""
+        heads = [queue[0] for queue in self._flows.values()]
+        return min(heads, key=lambda ticket: ticket.start_tag) if heads else None
+
+    def pop(self) -> Ticket:
+        ticket = self.peek()
+        if ticket is None:
+            raise IndexError("pop from an empty FairShareQueue")
+        self._virtual_time = max(self._virtual_time, ticket.start_tag)
+        self._discard(ticket)
+        self._expire_idle()
+        return ticket
+
+    def remove(self, ticket: Ticket) -> None:
+        """Drop a ticket that gave up waiting (timeout or client disconnect)"""
+        queue = self._flows.get(ticket.flow)
+        if queue is not None and ticket in queue:
+            self._discard(ticket)
+
+    def _discard(self, ticket: Ticket) -> None:
+        flow = ticket.flow
+        queue = self._flows[flow]
+        queue.remove(ticket)
+        self._size -= 1
+        if not queue:
+            del self._flows[flow]
+            if not self._flows:
+                # Nothing left to share: no flow needs its clock kept
+                self._last_finish.clear()
+                self._idle.clear()
+                return
+            finish = self._last_finish.get(flow, 0.0)
+            if finish <= self._virtual_time:
+                # Idle flows whose clock is behind carry no credit worth keeping
+                self._last_finish.pop(flow, None)
+            else:
+                heapq.heappush(self._idle, (finish, flow))
+
+    def _expire_idle(self) -> None:
+        """Forget idle flows whose clock virtual time has caught up with"""
+        while self._idle and self._idle[0][0] <= self._virtual_time:
+            finish, flow = heapq.heappop(self._idle)
+            # Skip flows that became active again, or were pushed since with a new clock
+            if flow not in self._flows and self._last_finish.get(flow) == finish:
+                del self._last_finish[flow]
+
+    def count(self, client: Optional[str] = None, lane: Optional[str] = None) -> int:
+        return sum(
+            len(queue) for (flow_lane, flow_client), queue in self._flows.items()
+            if (client is None or flow_client == client) and (lane is None or flow_lane == lane)
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "queued_by_lane": {lane: self.count(lane=lane) for lane in self.lane_weights},
+            "backlogged_clients": len({client for _, client in self._flows}),
+        }
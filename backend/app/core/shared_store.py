@@ -0,0 +1,269 @@
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+STORE_ENV = "IMAGEFLOW_SHARED_STORE"
+DIR_ENV = "IMAGEFLOW_SHM_DIR"
+CAPACITY_ENV = "IMAGEFLOW_SHM_CAPACITY_MB"
+
+MB = 1024 * 1024
+
+# Entry layout: magic, metadata length, JSON metadata, padding to a 64-byte
+# boundary, payload. Entries are immutable once renamed into place.
+_MAGIC = b"IFS1"
+_HEADER = struct.Struct("<4sI")
+_ALIGN = 64
+# Bytes held by all entries, kept at the start of the lock file
+_USAGE = struct.Struct("<Q")
+
+
+def _default_directory() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "imageflow")
+
+
+class SharedEntry:
+    """Read-only view of a stored entry, mapped straight from shared memory
+
+    While the entry (or any view derived from `data`) is alive, the mapping
+    holds a shared lock on the file, which is what pins it against eviction
+    in every worker. The lock is released when the mapping is garbage
+    collected, or earlier via release() once no views remain.
+    """
+
+    def __init__(self, meta: Dict[str, Any], mapping: mmap.mmap, offset: int):
+        self.meta = meta
+        self._mapping = mapping
+        self.data = memoryview(mapping)[offset:]
+
+    def release(self) -> None:
+        self.data.release()
+        self._mapping.close()
+
+
+class SharedImageStore:
+    """Host-wide store for decoded images and cached results
+
+    Entries are files on a memory-backed filesystem, so every uvicorn worker
+    maps the same pages instead of holding its own copy. Reference counting
+    is delegated to the kernel: readers take a shared flock for as long as
+    their mapping lives, and eviction only removes entries it can lock
+    exclusively. Least recently used entries (by mtime, refreshed on each
+    hit) are evicted first once `capacity_bytes` would be exceeded.
+
+    Writers keep a running total of the bytes stored in the lock file, so the
+    directory is only listed when a write would go over capacity; that scan
+    also recomputes the total, which corrects any drift (entries removed by
+    hand, a worker that died between publishing and counting).
+    """
+
+    def __init__(self, directory: str, capacity_bytes: int):
+        self.directory = directory
+        self.capacity_bytes = capacity_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock_path = os.path.join(directory, ".lock")
+        self._counters_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        self.evictions = 0
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        """Content hash of an uploaded image, the basis of every key derived from it"""
+        return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+    @staticmethod
+    def key(namespace: str, *parts: str) -> str:
+        """Entry name for `parts` (e.g. image digest and serialized params) within a namespace"""
+        suffix = hashlib.blake2b("\x00".join(parts).encode(), digest_size=20).hexdigest()
+        return f"{namespace}-{suffix}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _count(self, counter: str) -> None:
+        with self._counters_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: str) -> Optional[SharedEntry]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                # mmap dups the descriptor, so the shared lock lives as long as the mapping
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        try:
+            os.utime(path)  # Refresh LRU position
+        except FileNotFoundError:
+            pass  # Evicted meanwhile; our mapping stays valid
+
+        magic, meta_len = _HEADER.unpack_from(mapping, 0)
+        if magic != _MAGIC:
+            mapping.close()
+            self._count("misses")
+            return None
+        meta = json.loads(mapping[_HEADER.size:_HEADER.size + meta_len])
+        self._count("hits")
+        return SharedEntry(meta, mapping, self._payload_offset(meta_len))
+
+    def put(self, key: str, payload: Any, meta: Optional[Dict[str, Any]] = None) -> bool:
+        """Store a bytes-like payload; returns False when it cannot fit"""
+        path = self._path(key)
+        try:
+            os.utime(path)
+            return True  # Already stored by this or another worker
+        except FileNotFoundError:
+            pass
+
+        payload = memoryview(payload).cast("B")
+        meta_bytes = json.dumps(meta or {}).encode()
+        offset = self._payload_offset(len(meta_bytes))
+        size = offset + payload.nbytes
+        if size > self.capacity_bytes:
+            return False
+
+        tmp_path = self._path(f".tmp-{os.getpid()}-{uuid.uuid4().hex}")
+        try:
+            with os.fdopen(os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644), "r+b") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                if os.path.exists(path):
+                    return True  # Published by another worker while we waited for the lock
+                used = self._read_usage(lock)
+                if used is None or used + size > self.capacity_bytes:
+                    used = self._evict(size)
+                with open(tmp_path, "wb") as f:
+                    f.write(_HEADER.pack(_MAGIC, len(meta_bytes)))
+                    f.write(meta_bytes)
+                    f.write(b"\x00" * (offset - _HEADER.size - len(meta_bytes)))
+                    f.write(payload)
+                # Atomic publish: readers never see a partially written entry
+                os.replace(tmp_path, path)
+                self._write_usage(lock, used + size)
+        except OSError as e:
+            # A full or missing tmpfs only costs us the cache entry
+            logger.warning("⚠️ Shared store write failed for %s: %s", key, e)
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            return False
+        self._count("puts")
+        return True
+
+    @staticmethod
+    def _read_usage(lock) -> Optional[int]:
+        """Running byte total from the lock file, or None before the first write"""
+        lock.seek(0)
+        raw = lock.read(_USAGE.size)
+        return _USAGE.unpack(raw)[0] if len(raw) == _USAGE.size else None
+
+    @staticmethod
+    def _write_usage(lock, used: int) -> None:
+        lock.seek(0)
+        lock.write(_USAGE.pack(max(0, used)))
+        lock.flush()
+
+    def _evict(self, incoming: int) -> int:
+        """Drop least recently used, unpinned entries until `incoming` bytes fit (lock held)
+
+        Returns the bytes still held by entries afterwards.
+        """
+        entries = []
+        used = 0
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(".tmp-"):
+                self._remove_stale_tmp(entry.path, now)
+                continue
+            if entry.name.startswith("."):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            used += stat.st_size
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        entries.sort()
+        for _, size, path in entries:
+            if used + incoming <= self.capacity_bytes:
+                break
+            try:
+                with open(path, "rb") as f:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    os.unlink(path)
+            except (BlockingIOError, FileNotFoundError):
+                continue  # Mapped by a request right now, or already gone
+            used -= size
+            self._count("evictions")
+        return used
+
+    @staticmethod
+    def _remove_stale_tmp(path: str, now: float) -> None:
+        # Left behind by a worker that died mid-write
+        try:
+            if now - os.stat(path).st_mtime > 60:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _payload_offset(meta_len: int) -> int:
+        end = _HEADER.size + meta_len
+        return (end + _ALIGN - 1) // _ALIGN * _ALIGN
+
+    def stats(self) -> Dict[str, Any]:
+        entries = 0
+        used = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith("."):
+                continue
+            try:
+                used += entry.stat().st_size
+            except FileNotFoundError:
+                continue
+            entries += 1
+        with self._counters_lock:
+            return {
+                "directory": self.directory,
+                "entries": entries,
+                "used_mb": round(used / MB, 1),
+                "capacity_mb": round(self.capacity_bytes / MB, 1),
+                # Counters below are for this worker only
+                "hits": self.hits,
+                "misses": self.misses,
+                "puts": self.puts,
+                "evictions": self.evictions,
+            }
+
+
+@lru_cache()
+def get_shared_store() -> Optional[SharedImageStore]:
+    """Process-wide SharedImageStore, or None when disabled or unavailable"""
+    if os.environ.get(STORE_ENV, "false").lower() not in ("1", "true", "yes"):
+        return None
+    directory = os.environ.get(DIR_ENV) or _default_directory()
+    capacity = int(float(os.environ.get(CAPACITY_ENV, "512")) * MB)
+    try:
+        store = SharedImageStore(directory, capacity)
+    except OSError as e:
+        logger.warning("⚠️ Shared image store disabled (%s): %s", directory, e)
+        return None
+    logger.info("🗄️ Shared image store at %s (%d MB)", directory, capacity // MB)
+    return store
@@ -1,13 +1,34 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict
-from .models import ImageProcessingParams, HistogramData, SegmentationResult
+from typing import Any, Dict, List, Optional, Tuple, Union
+from .models import ImageProcessingParams, HistogramData, SegmentationResult, PipelineSpec
+
+# Encoded image payload: implementations may return a zero-copy memoryview
+ImageBytes = Union[bytes, memoryview]
 
 class IImageProcessor(ABC):
     """Interface for image processing operations"""
     
     @abstractmethod
-    def process_image(self, image_bytes: bytes, params: ImageProcessingParams) -> bytes:
-        """Process an image with given parameters"""
+    def probe_image(self, image_bytes: bytes) -> Tuple[int, int, int]:
+        """Read (width, height, channels) from the image header without decoding pixels"""
+        pass
+
+    @abstractmethod
+    def process_image(self, image_bytes: bytes, params: ImageProcessingParams,
+                      raw_compression: Optional[str] = None) -> ImageBytes:
+        """Process an image with given parameters (PNG, or raw pixels when raw_compression is set)"""
+        pass
+
+    @abstractmethod
+    def process_pipeline(self, image_bytes: bytes, steps: List[ImageProcessingParams],
+                         raw_compression: Optional[str] = None, intermediates: bool = False) -> List[ImageBytes]:
+        """Run processing steps in order on one decoded image; the final image, or every step's if intermediates"""
+        pass
+
+    @abstractmethod
+    def run_pipeline(self, image_bytes: bytes, spec: PipelineSpec,
+                     raw_compression: Optional[str] = None, plan: Optional[Any] = None) -> ImageBytes:
+        """Run an ordered pipeline spec, compiled into an optimized execution plan (or `plan`, precompiled)"""
         pass
 
     @abstractmethod
@@ -16,16 +37,32 @@ class IImageProcessor(ABC):
         pass
 
     @abstractmethod
-    def generate_histogram_image(self, image_bytes: bytes, channel: str) -> bytes:
+    def generate_histogram_image(self, image_bytes: bytes, channel: str) -> ImageBytes:
         """Generate a histogram visualization as a PNG image"""
         pass
 
+    @abstractmethod
+    def generate_histogram_images(self, image_bytes: bytes, channels: List[str]) -> Dict[str, ImageBytes]:
+        """Generate histogram PNGs for several channels from one decode"""
+        pass
+
     @abstractmethod
     def segment_image(self, image_bytes: bytes) -> SegmentationResult:
         """Segment image into channels"""
         pass
 
     @abstractmethod
-    def detect_faces(self, image_bytes: bytes) -> bytes:
+    def detect_faces(self, image_bytes: bytes, raw_compression: Optional[str] = None) -> ImageBytes:
         """Detect faces in an image"""
         pass
+
+    @abstractmethod
+    def generate_thumbnail(self, image_bytes: bytes, size: int,
+                           raw_compression: Optional[str] = None) -> ImageBytes:
+        """Generate a thumbnail fitting in a size x size box (aspect ratio preserved)"""
+        pass
+
+    @abstractmethod
+    def export_png(self, image_bytes: bytes) -> ImageBytes:
+        """Encode an image as an optimized PNG, keeping its mode (alpha included)"""
+        pass
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Tuple, List, Dict, Any, Union
+from typing import Optional, Tuple, List, Dict, Any, Literal, Union
 
 class ImageProcessingParams(BaseModel):
     """Parameters for image processing operations"""
@@ -22,6 +22,81 @@ class ImageProcessingParams(BaseModel):
     sharpness: Optional[float] = None
     gamma: Optional[float] = None
 
+    def enabled_operations(self) -> List[str]:
+        """Names of the operations these params enable, in processing order"""
+        ops = []
+        if self.brightness is not None and self.brightness != 0: ops.append("brightness")
+        if self.contrast is not None and self.contrast != 1.0: ops.append("contrast")
+        if self.saturation is not None and self.saturation != 1.0: ops.append("saturation")
+        if self.sharpness is not None and self.sharpness != 1.0: ops.append("sharpness")
+        if self.gamma is not None and self.gamma != 1.0: ops.append("gamma")
+        if self.grayscale: ops.append("grayscale")
+        if self.resize_width or self.resize_height: ops.append("resize")
+        if self.rotate_angle is not None and self.rotate_angle != 0: ops.append("rotate")
+        if self.flip: ops.append("flip")
+        if self.blur_type: ops.append(f"blur_{self.blur_type}")
+        if self.equalize: ops.append("equalize")
+        if self.stretch: ops.append("stretch")
+        if self.threshold is not None:
+            ops.append("threshold_adaptive" if self.threshold_type.startswith("adaptive") else "threshold")
+        if self.edge_detection: ops.append("edges")
+        if self.normalize: ops.append("normalize")
+        return ops
+
+    def to_ops(self) -> List["PipelineOp"]:
+        """The same processing as an ordered pipeline (the fixed order of process_image)"""
+        ops = []
+        if self.brightness is not None and self.brightness != 0:
+            ops.append(PipelineOp(op="brightness", params={"value": self.brightness}))
+        if self.contrast is not None and self.contrast != 1.0:
+            ops.append(PipelineOp(op="contrast", params={"factor": self.contrast}))
+        if self.saturation is not None and self.saturation != 1.0:
+            ops.append(PipelineOp(op="saturation", params={"factor": self.saturation}))
+        if self.sharpness is not None and self.sharpness != 1.0:
+            ops.append(PipelineOp(op="sharpness", params={"factor": self.sharpness}))
+        if self.gamma is not None and self.gamma != 1.0:
+            ops.append(PipelineOp(op="gamma", params={"value": self.gamma}))
+        if self.grayscale:
+            ops.append(PipelineOp(op="grayscale"))
+        if self.resize_width or self.resize_height:
+            ops.append(PipelineOp(op="resize", params={"width": self.resize_width, "height": self.resize_height}))
+        if self.rotate_angle is not None and self.rotate_angle != 0:
+            ops.append(PipelineOp(op="rotate", params={"angle": self.rotate_angle}))
+        if self.flip:
+            ops.append(PipelineOp(op="flip", params={"direction": self.flip}))
+        if self.blur_type:
+            ops.append(PipelineOp(op="blur", params={"type": self.blur_type, "kernel": self.blur_kernel}))
+        if self.equalize:
+            ops.append(PipelineOp(op="equalize"))
+        if self.stretch:
+            ops.append(PipelineOp(op="stretch"))
+        if self.threshold is not None:
+            ops.append(PipelineOp(op="threshold", params={"value": self.threshold, "type": self.threshold_type}))
+        if self.edge_detection:
+            ops.append(PipelineOp(op="edges", params={"method": self.edge_detection}))
+        if self.normalize:
+            ops.append(PipelineOp(op="normalize"))
+        return ops
+
+class PipelineOp(BaseModel):
+    """One pipeline operation: its name and its parameters"""
+    op: str
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+class PipelineSpec(BaseModel):
+    """
+    Ordered pipeline: operations run in the given order and may repeat.
+
+    optimize: "exact" (default) only applies rewrites that keep the result
+    bit-identical; "fast" also allows rewrites that may change pixel values
+    (grayscale conversion moved ahead of linear operations that do not
+    clip, gaussian blur moved after a downscaling resize): usually by a
+    level or two, more next to saturated edges of a resized image; "off"
+    runs the operations as written.
+    """
+    ops: List[PipelineOp] = Field(..., min_length=1)
+    optimize: Literal["exact", "fast", "off"] = "exact"
+
 class HistogramStats(BaseModel):
     mean: float
     std: float
@@ -46,3 +121,43 @@ class SegmentationResult(BaseModel):
     grayscale_green: str
     grayscale_blue: str
     gray: Optional[str] = None
+
+class HistogramImages(BaseModel):
+    """Histogram PNGs (base64) keyed by channel, rendered from a single decode"""
+    images: Dict[str, str]
+
+class PipelineImages(BaseModel):
+    """Every step's image of a pipeline (base64), in the negotiated format"""
+    media_type: str
+    compression: Optional[str] = None
+    images: List[str]
+
+class PresetRequest(BaseModel):
+    """
+    A named pipeline to register: either an ordered spec, or /preprocess
+    steps (each an object of /preprocess form fields, run in order).
+    """
+    name: str = Field(..., min_length=1, max_length=64)
+    description: str = Field("", max_length=500)
+    spec: Optional[PipelineSpec] = None
+    steps: Optional[List[Dict[str, Any]]] = None
+
+class PresetInfo(BaseModel):
+    """A registered preset, with the optimized plan it was compiled into"""
+    name: str
+    description: str = ""
+    spec: PipelineSpec
+    plan: List[str]
+    created_at: str
+
+class BatchImage(BaseModel):
+    """One file of a batch: its result (base64), or why it failed"""
+    filename: str
+    image: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchImages(BaseModel):
+    """Results of a batch, in upload order, in the negotiated format"""
+    media_type: str
+    compression: Optional[str] = None
+    images: List[BatchImage]
@@ -1,217 +1,198 @@
-from PIL import Image, ImageOps, ImageEnhance
+from PIL import Image
 import io
 import cv2
 import numpy as np
-from typing import Optional, Tuple, Dict, List
+from typing import Callable, Optional, Tuple, Dict, List
 import base64
+import threading
 import matplotlib
 matplotlib.use('Agg')  # Backend non-interactif
 import matplotlib.pyplot as plt
 import seaborn as sns
-from ..domain.interfaces import IImageProcessor
-from ..domain.models import ImageProcessingParams, HistogramData, SegmentationResult, HistogramStats
+from ..domain.interfaces import IImageProcessor, ImageBytes
+from ..domain.models import ImageProcessingParams, HistogramData, SegmentationResult, HistogramStats, PipelineSpec
+from ..core.metrics import timed_stage
+from ..core.profiling import note_buffer
+from ..core.shared_store import SharedImageStore
+from ..core.buffers import BufferPool, get_buffer_pool
+from ..core import raw_format
+from .pipeline import ExecutionPlan, compile_pipeline, cv2_to_pil, pil_to_cv2
+
+# Modes whose raw pixel layout round-trips exactly through the shared store
+SHAREABLE_MODES = ('L', 'RGB', 'RGBA')
+
+# Processing runs on worker threads, and pyplot's current figure and seaborn's
+# style are process-global: histogram renders must not interleave
+_PLOT_LOCK = threading.Lock()
 
 class ImageProcessor(IImageProcessor):
-    """Implementation of IImageProcessor using PIL and OpenCV"""
+    """Implementation of IImageProcessor using PIL and OpenCV
+
+    With a SharedImageStore, decoded images and finished results are shared
+    by every worker on the host, keyed by a content hash of the upload.
+    Encoded outputs are written into pooled buffers and returned as
+    memoryviews, so they reach the response without being copied. Uploads
+    and image results may also use the raw pixel wire format
+    (core/raw_format.py), which skips image codecs entirely.
+    """
 
-    def process_image(self, image_bytes: bytes, params: ImageProcessingParams) -> bytes:
+    def __init__(self, store: Optional[SharedImageStore] = None, buffers: Optional[BufferPool] = None):
+        self.store = store
+        self.buffers = buffers or get_buffer_pool()
+
+    def probe_image(self, image_bytes: bytes) -> Tuple[int, int, int]:
         try:
-            # Load image
+            if raw_format.is_raw(image_bytes):
+                header = raw_format.read_header(image_bytes)
+                return header.width, header.height, header.channels
+            # Image.open only parses the header; pixels are decoded lazily
             img = Image.open(io.BytesIO(image_bytes))
-            
-            # Convert to standard format if needed
-            if img.mode not in ['RGB', 'L', 'RGBA']:
-                img = img.convert('RGB')
-            
-            # Apply basic adjustments first
-            if params.brightness is not None and params.brightness != 0:
-                enhancer = ImageEnhance.Brightness(img)
-                factor = 1 + (params.brightness / 100) if params.brightness != 0 else 1.0
-                img = enhancer.enhance(max(0.1, min(3.0, factor)))
-            
-            if params.contrast is not None and params.contrast != 1.0:
-                enhancer = ImageEnhance.Contrast(img)
-                img = enhancer.enhance(max(0.1, min(3.0, params.contrast)))
-            
-            if params.saturation is not None and params.saturation != 1.0:
-                if img.mode != 'RGB' and img.mode != 'RGBA':
-                    img = img.convert('RGB')
-                enhancer = ImageEnhance.Color(img)
-                img = enhancer.enhance(max(0.0, min(3.0, params.saturation)))
-            
-            if params.sharpness is not None and params.sharpness != 1.0:
-                enhancer = ImageEnhance.Sharpness(img)
-                img = enhancer.enhance(max(0.0, min(3.0, params.sharpness)))
-            
-            # Apply gamma correction
-            if params.gamma is not None and params.gamma != 1.0:
-                img = self._apply_gamma_correction(img, params.gamma)
-            
-            # Convert to grayscale if requested
-            if params.grayscale:
-                if img.mode != 'L':
-                    img = ImageOps.grayscale(img)
-            
-            # Resize if requested
-            if params.resize_width or params.resize_height:
-                original_width, original_height = img.size
-                new_width = params.resize_width
-                new_height = params.resize_height
-                
-                # Calculate new dimensions while maintaining aspect ratio if only one dimension is given
-                if new_width and new_width > 0 and (not new_height or new_height == 0):
-                    ratio = new_width / original_width
-                    new_height = int(original_height * ratio)
-                elif new_height and new_height > 0 and (not new_width or new_width == 0):
-                    ratio = new_height / original_height
-                    new_width = int(original_width * ratio)
-                else:
-                    new_width = new_width or original_width
-                    new_height = new_height or original_height
-                
-                # Ensure minimum size
-                new_width = max(1, new_width)
-                new_height = max(1, new_height)
+            return img.width, img.height, len(img.getbands())
+        except Exception as e:
+            raise ValueError(f"Unreadable image: {str(e)}")
+
+    def process_image(self, image_bytes: bytes, params: ImageProcessingParams,
+                      raw_compression: Optional[str] = None) -> ImageBytes:
+        digest = self._digest(image_bytes)
+        return self._cached_result(
+            digest, "preprocess", params.model_dump_json(), self._format_key(raw_compression),
+            compute=lambda: self._process_image(image_bytes, params, digest, raw_compression)
+        )
+
+    def _process_image(self, image_bytes: bytes, params: ImageProcessingParams, digest: Optional[str],
+                       raw_compression: Optional[str] = None) -> ImageBytes:
+        try:
+            # Load image (force the decode here so it is timed as its own stage)
+            with timed_stage("decode"):
+                img = self._load_image(image_bytes, digest)
                 
-                img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+                # Convert to standard format if needed
+                if img.mode not in ['RGB', 'L', 'RGBA']:
+                    img = img.convert('RGB')
+            note_buffer("decoded", self._pixel_nbytes(img))
             
-            # Convert to OpenCV for advanced operations
-            cv_img = self._pil_to_cv2(img)
+            cv_img = self._apply_params(img, params)
             
-            # Apply geometric transformations
-            if params.rotate_angle is not None and params.rotate_angle != 0:
-                height, width = cv_img.shape[:2]
-                center = (width // 2, height // 2)
-                rotation_matrix = cv2.getRotationMatrix2D(center, params.rotate_angle, 1.0)
-                cv_img = cv2.warpAffine(
-                    cv_img, rotation_matrix, (width, height),
-                    borderMode=cv2.BORDER_CONSTANT,
-                    borderValue=(255, 255, 255)
-                )
-            
-            if params.flip:
-                flip_code = {
-                    "horizontal": 1,
-                    "vertical": 0,
-                    "both": -1
-                }.get(params.flip)
-                if flip_code is not None:
-                    cv_img = cv2.flip(cv_img, flip_code)
-            
-            # Apply blur filters
-            if params.blur_type:
-                kernel_size = max(3, params.blur_kernel if params.blur_kernel % 2 == 1 else params.blur_kernel + 1)
-                
-                if params.blur_type == "gaussian":
-                    cv_img = cv2.GaussianBlur(cv_img, (kernel_size, kernel_size), 0)
-                elif params.blur_type == "median":
-                    cv_img = cv2.medianBlur(cv_img, kernel_size)
-                elif params.blur_type == "bilateral":
-                    cv_img = cv2.bilateralFilter(cv_img, kernel_size, 75, 75)
-            
-            # Apply histogram equalization
-            if params.equalize:
-                if len(cv_img.shape) == 2:  # Grayscale
-                    cv_img = cv2.equalizeHist(cv_img)
-                else:  # Color - equalize Y channel in YUV
-                    yuv = cv2.cvtColor(cv_img, cv2.COLOR_BGR2YUV)
-                    yuv[:, :, 0] = cv2.equalizeHist(yuv[:, :, 0])
-                    cv_img = cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR)
-            
-            # Apply histogram stretching
-            if params.stretch:
-                if len(cv_img.shape) == 2:  # Grayscale
-                    p2, p98 = np.percentile(cv_img, (2, 98))
-                    cv_img = np.clip((cv_img - p2) / (p98 - p2) * 255, 0, 255).astype(np.uint8)
-                else:  # Color - stretch each channel
-                    for i in range(3):
-                        p2, p98 = np.percentile(cv_img[:,:,i], (2, 98))
-                        if p98 > p2:
-                            cv_img[:,:,i] = np.clip((cv_img[:,:,i] - p2) / (p98 - p2) * 255, 0, 255).astype(np.uint8)
-            
-            # Apply thresholding
-            if params.threshold is not None:
-                # Convert to grayscale if needed
-                if len(cv_img.shape) == 3:
-                    cv_img = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
-                
-                if params.threshold_type == "binary":
-                    _, cv_img = cv2.threshold(cv_img, params.threshold, 255, cv2.THRESH_BINARY)
-                elif params.threshold_type == "binary_inv":
-                    _, cv_img = cv2.threshold(cv_img, params.threshold, 255, cv2.THRESH_BINARY_INV)
-                elif params.threshold_type == "adaptive_mean":
-                    cv_img = cv2.adaptiveThreshold(
-                        cv_img, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
-                        cv2.THRESH_BINARY, 11, 2
-                    )
-                elif params.threshold_type == "adaptive_gaussian":
-                    cv_img = cv2.adaptiveThreshold(
-                        cv_img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                        cv2.THRESH_BINARY, 11, 2
-                    )
-                elif params.threshold_type == "otsu":
-                    _, cv_img = cv2.threshold(cv_img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            
-            # Apply edge detection
-            if params.edge_detection:
-                # Convert to grayscale if needed
-                if len(cv_img.shape) == 3:
-                    cv_img = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
-                
-                if params.edge_detection == "canny":
-                    cv_img = cv2.Canny(cv_img, 50, 150)
-                elif params.edge_detection == "sobel":
-                    sobel_x = cv2.Sobel(cv_img, cv2.CV_64F, 1, 0, ksize=3)
-                    sobel_y = cv2.Sobel(cv_img, cv2.CV_64F, 0, 1, ksize=3)
-                    cv_img = np.sqrt(sobel_x**2 + sobel_y**2).astype(np.uint8)
-                elif params.edge_detection == "laplacian":
-                    cv_img = cv2.Laplacian(cv_img, cv2.CV_64F)
-                    cv_img = np.absolute(cv_img).astype(np.uint8)
-                elif params.edge_detection == "sobel_x":
-                    cv_img = cv2.Sobel(cv_img, cv2.CV_64F, 1, 0, ksize=3)
-                    cv_img = np.absolute(cv_img).astype(np.uint8)
-                elif params.edge_detection == "sobel_y":
-                    cv_img = cv2.Sobel(cv_img, cv2.CV_64F, 0, 1, ksize=3)
-                    cv_img = np.absolute(cv_img).astype(np.uint8)
-            
-            # Apply normalization
-            if params.normalize:
-                cv_img = cv2.normalize(cv_img, None, 0, 255, cv2.NORM_MINMAX)
-            
-            # Convert back to PIL
-            result_img = self._cv2_to_pil(cv_img)
-            
-            # Return bytes
-            buf = io.BytesIO()
-            result_img.save(buf, format="PNG", optimize=True)
-            buf.seek(0)
-            return buf.getvalue()
+            with timed_stage("encode"):
+                # Return a view of the encoded bytes (no getvalue() copy)
+                result = self._encode_cv2(cv_img, raw_compression, optimize=True)
+                note_buffer("encoded", result.nbytes)
+                return result
         
         except Exception as e:
             raise RuntimeError(f"Image processing failed: {str(e)}")
 
+    def _apply_params(self, img: Image.Image, params: ImageProcessingParams) -> np.ndarray:
+        """Run one set of processing params on a decoded image (RGB, L or RGBA), in the fixed order"""
+        # Unknown choices stay no-ops here, as they always were for /preprocess
+        return compile_pipeline(params.to_ops(), "exact", strict=False).run(img)
+
+    def process_pipeline(self, image_bytes: bytes, steps: List[ImageProcessingParams],
+                         raw_compression: Optional[str] = None, intermediates: bool = False) -> List[ImageBytes]:
+        """
+        Run several processing steps in order on a single decoded image.
+
+        Each step behaves exactly like process_image on the previous step's
+        result, without encoding and decoding in between. Returns the final
+        image, or every step's image when `intermediates` is set (encoded
+        with fast PNG settings, all but the last).
+        """
+        digest = self._digest(image_bytes)
+        if intermediates:
+            return self._process_pipeline(image_bytes, steps, digest, raw_compression, True)
+        spec = "[" + ",".join(params.model_dump_json() for params in steps) + "]"
+        return [self._cached_result(
+            digest, "pipeline", spec, self._format_key(raw_compression),
+            compute=lambda: self._process_pipeline(image_bytes, steps, digest, raw_compression, False)[-1]
+        )]
+
+    def _process_pipeline(self, image_bytes: bytes, steps: List[ImageProcessingParams], digest: Optional[str],
+                          raw_compression: Optional[str], intermediates: bool) -> List[ImageBytes]:
+        try:
+            with timed_stage("decode"):
+                img = self._load_image(image_bytes, digest)
+                if img.mode not in ['RGB', 'L', 'RGBA']:
+                    img = img.convert('RGB')
+            note_buffer("decoded", self._pixel_nbytes(img))
+
+            results = []
+            for index, params in enumerate(steps):
+                cv_img = self._apply_params(img, params)
+                last = index == len(steps) - 1
+                if last or intermediates:
+                    with timed_stage("encode"):
+                        # The final image is encoded like process_image's output
+                        png_options = {"optimize": True} if last else {"compress_level": 1}
+                        results.append(self._encode_cv2(cv_img, raw_compression, **png_options))
+                if not last:
+                    with timed_stage("to_pil"):
+                        img = self._cv2_to_pil(cv_img)
+            return results
+
+        except Exception as e:
+            raise RuntimeError(f"Pipeline failed: {str(e)}")
+
+    def run_pipeline(self, image_bytes: bytes, spec: PipelineSpec,
+                     raw_compression: Optional[str] = None,
+                     plan: Optional[ExecutionPlan] = None) -> ImageBytes:
+        """
+        Run an ordered pipeline spec (any order, repeated operations allowed).
+
+        The spec is compiled once into an optimized execution plan
+        (infrastructure/pipeline.py), unless its plan is given (presets are
+        compiled at registration); results are cached per image and spec.
+        """
+        if plan is None:
+            plan = compile_pipeline(spec.ops, spec.optimize)
+        digest = self._digest(image_bytes)
+        return self._cached_result(
+            digest, "pipeline-spec", spec.model_dump_json(), self._format_key(raw_compression),
+            compute=lambda: self._run_plan(image_bytes, plan, digest, raw_compression)
+        )
+
+    def _run_plan(self, image_bytes: bytes, plan: ExecutionPlan, digest: Optional[str],
+                  raw_compression: Optional[str]) -> ImageBytes:
+        try:
+            with timed_stage("decode"):
+                img = self._load_image(image_bytes, digest)
+                if img.mode not in ['RGB', 'L', 'RGBA']:
+                    img = img.convert('RGB')
+            note_buffer("decoded", self._pixel_nbytes(img))
+
+            cv_img = plan.run(img)
+
+            with timed_stage("encode"):
+                result = self._encode_cv2(cv_img, raw_compression, optimize=True)
+                note_buffer("encoded", result.nbytes)
+                return result
+
+        except Exception as e:
+            raise RuntimeError(f"Pipeline failed: {str(e)}")
+
     def get_histogram(self, image_bytes: bytes, channel: str) -> HistogramData:
         try:
-            img = Image.open(io.BytesIO(image_bytes))
-            cv_img = self._pil_to_cv2(img)
+            with timed_stage("decode"):
+                img = self._load_image(image_bytes, self._digest(image_bytes))
+                cv_img = self._pil_to_cv2(img)
             
             histograms = {}
             
-            if channel == "gray" or len(cv_img.shape) == 2:
-                if len(cv_img.shape) == 3:
-                    cv_img = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
-                hist = cv2.calcHist([cv_img], [0], None, [256], [0, 256])
-                histograms["gray"] = hist.flatten().tolist()
-            elif channel == "all":
-                colors = ['blue', 'green', 'red']
-                for i, color in enumerate(colors):
-                    hist = cv2.calcHist([cv_img], [i], None, [256], [0, 256])
-                    histograms[color] = hist.flatten().tolist()
-            else:
-                color_map = {"blue": 0, "green": 1, "red": 2}
-                if channel in color_map:
-                    hist = cv2.calcHist([cv_img], [color_map[channel]], None, [256], [0, 256])
-                    histograms[channel] = hist.flatten().tolist()
+            with timed_stage("histogram"):
+                if channel == "gray" or len(cv_img.shape) == 2:
+                    if len(cv_img.shape) == 3:
+                        cv_img = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
+                    hist = cv2.calcHist([cv_img], [0], None, [256], [0, 256])
+                    histograms["gray"] = hist.flatten().tolist()
+                elif channel == "all":
+                    colors = ['blue', 'green', 'red']
+                    for i, color in enumerate(colors):
+                        hist = cv2.calcHist([cv_img], [i], None, [256], [0, 256])
+                        histograms[color] = hist.flatten().tolist()
+                else:
+                    color_map = {"blue": 0, "green": 1, "red": 2}
+                    if channel in color_map:
+                        hist = cv2.calcHist([cv_img], [color_map[channel]], None, [256], [0, 256])
+                        histograms[channel] = hist.flatten().tolist()
             
             # Create HistogramData object
             data = HistogramData()
@@ -241,115 +222,151 @@ class ImageProcessor(IImageProcessor):
         except Exception as e:
             raise RuntimeError(f"Histogram calculation failed: {str(e)}")
     
-    def generate_histogram_image(self, image_bytes: bytes, channel: str) -> bytes:
+    def generate_histogram_image(self, image_bytes: bytes, channel: str) -> ImageBytes:
         """Generate a histogram visualization as a PNG image using matplotlib and seaborn"""
+        digest = self._digest(image_bytes)
+        return self._cached_result(
+            digest, "histogram_png", channel,
+            compute=lambda: self._generate_histogram_image(image_bytes, channel, digest)
+        )
+
+    def generate_histogram_images(self, image_bytes: bytes, channels: List[str]) -> Dict[str, ImageBytes]:
+        """Histogram PNGs for several channels; the image is decoded at most once, only on a cache miss"""
+        digest = self._digest(image_bytes)
+        decoded = []
+
+        def cv_image() -> np.ndarray:
+            if not decoded:
+                with timed_stage("decode"):
+                    decoded.append(self._pil_to_cv2(self._load_image(image_bytes, digest)))
+            return decoded[0]
+
+        return {
+            channel: self._cached_result(
+                digest, "histogram_png", channel,
+                compute=lambda channel=channel: self._render_histogram(cv_image(), channel)
+            )
+            for channel in channels
+        }
+
+    def _generate_histogram_image(self, image_bytes: bytes, channel: str, digest: Optional[str]) -> ImageBytes:
         try:
-            img = Image.open(io.BytesIO(image_bytes))
-            cv_img = self._pil_to_cv2(img)
-            
-            # Set seaborn style for better aesthetics
-            sns.set_style("whitegrid")
-            sns.set_palette("husl")
-            
-            # Create figure with better size and DPI
-            fig, ax = plt.subplots(figsize=(12, 7), dpi=120)
-            
-            # Process and draw histogram based on channel
-            if channel == "gray" or len(cv_img.shape) == 2:
-                if len(cv_img.shape) == 3:
-                    cv_img = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
-                hist = cv2.calcHist([cv_img], [0], None, [256], [0, 256])
-                hist = hist.flatten()
+            with timed_stage("decode"):
+                img = self._load_image(image_bytes, digest)
+                cv_img = self._pil_to_cv2(img)
+        except Exception as e:
+            raise RuntimeError(f"Histogram image generation failed: {str(e)}")
+        return self._render_histogram(cv_img, channel)
+
+    def _render_histogram(self, cv_img: np.ndarray, channel: str) -> ImageBytes:
+        try:
+            with _PLOT_LOCK:
+                # Set seaborn style for better aesthetics
+                sns.set_style("whitegrid")
+                sns.set_palette("husl")
+            
+                # Create figure with better size and DPI
+                fig, ax = plt.subplots(figsize=(12, 7), dpi=120)
+                try:
+            
+                    # Process and draw histogram based on channel
+                    if channel == "gray" or len(cv_img.shape) == 2:
+                        if len(cv_img.shape) == 3:
+                            cv_img = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
+                        hist = cv2.calcHist([cv_img], [0], None, [256], [0, 256])
+                        hist = hist.flatten()
                 
-                # Limiter l'axe Y au 98ème percentile pour éviter les pics excessifs
-                y_max = np.percentile(hist[hist > 0], 98) * 1.15
+                        # Limiter l'axe Y au 98ème percentile pour éviter les pics excessifs
+                        y_max = np.percentile(hist[hist > 0], 98) * 1.15
                 
-                # Dessiner l'histogramme
-                ax.fill_between(range(256), hist, alpha=0.7, color='gray', edgecolor='black', linewidth=1.5)
-                ax.set_ylim(0, y_max)
-                title = f"Histogramme - Niveaux de gris"
+                        # Dessiner l'histogramme
+                        ax.fill_between(range(256), hist, alpha=0.7, color='gray', edgecolor='black', linewidth=1.5)
+                        ax.set_ylim(0, y_max)
+                        title = f"Histogramme - Niveaux de gris"
                 
-                # Calculer les statistiques
-                mean_val = np.mean(cv_img)
-                std_val = np.std(cv_img)
-                min_val = np.min(cv_img)
-                max_val = np.max(cv_img)
-            
-            elif channel == "all":
-                colors = ['blue', 'green', 'red']
-                color_labels = ['Bleu', 'Vert', 'Rouge']
-                all_hist = []
+                        # Calculer les statistiques
+                        mean_val = np.mean(cv_img)
+                        std_val = np.std(cv_img)
+                        min_val = np.min(cv_img)
+                        max_val = np.max(cv_img)
+            
+                    elif channel == "all":
+                        colors = ['blue', 'green', 'red']
+                        color_labels = ['Bleu', 'Vert', 'Rouge']
+                        all_hist = []
                 
-                for channel_idx, (color, label) in enumerate(zip(colors, color_labels)):
-                    hist = cv2.calcHist([cv_img], [channel_idx], None, [256], [0, 256])
-                    hist = hist.flatten()
-                    all_hist.extend(hist)
-                    ax.plot(range(256), hist, color=color, label=label, linewidth=2, alpha=0.8)
-                    ax.fill_between(range(256), hist, alpha=0.2, color=color)
+                        for channel_idx, (color, label) in enumerate(zip(colors, color_labels)):
+                            hist = cv2.calcHist([cv_img], [channel_idx], None, [256], [0, 256])
+                            hist = hist.flatten()
+                            all_hist.extend(hist)
+                            ax.plot(range(256), hist, color=color, label=label, linewidth=2, alpha=0.8)
+                            ax.fill_between(range(256), hist, alpha=0.2, color=color)
                 
-                # Limiter l'axe Y
-                y_max = np.percentile([h for h in all_hist if h > 0], 98) * 1.15
-                ax.set_ylim(0, y_max)
-                ax.legend(loc='upper right', framealpha=0.9, fontsize=11)
-                title = f"Histogramme - RGB"
+                        # Limiter l'axe Y
+                        y_max = np.percentile([h for h in all_hist if h > 0], 98) * 1.15
+                        ax.set_ylim(0, y_max)
+                        ax.legend(loc='upper right', framealpha=0.9, fontsize=11)
+                        title = f"Histogramme - RGB"
                 
-                mean_val = np.mean(cv_img)
-                std_val = np.std(cv_img)
-                min_val = np.min(cv_img)
-                max_val = np.max(cv_img)
-            
-            else:
-                color_map_idx = {"blue": 0, "green": 1, "red": 2}
-                color_map_color = {"blue": 'blue', "green": 'green', "red": 'red'}
-                color_map_label = {"blue": 'Bleu', "green": 'Vert', "red": 'Rouge'}
+                        mean_val = np.mean(cv_img)
+                        std_val = np.std(cv_img)
+                        min_val = np.min(cv_img)
+                        max_val = np.max(cv_img)
+            
+                    else:
+                        color_map_idx = {"blue": 0, "green": 1, "red": 2}
+                        color_map_color = {"blue": 'blue', "green": 'green', "red": 'red'}
+                        color_map_label = {"blue": 'Bleu', "green": 'Vert', "red": 'Rouge'}
                 
-                if channel in color_map_idx:
-                    hist = cv2.calcHist([cv_img], [color_map_idx[channel]], None, [256], [0, 256])
-                    hist = hist.flatten()
+                        if channel in color_map_idx:
+                            hist = cv2.calcHist([cv_img], [color_map_idx[channel]], None, [256], [0, 256])
+                            hist = hist.flatten()
                     
-                    # Limiter l'axe Y
-                    y_max = np.percentile(hist[hist > 0], 98) * 1.15
+                            # Limiter l'axe Y
+                            y_max = np.percentile(hist[hist > 0], 98) * 1.15
                     
-                    ax.fill_between(range(256), hist, alpha=0.6, color=color_map_color[channel], 
-                                   edgecolor=color_map_color[channel], linewidth=2)
-                    ax.set_ylim(0, y_max)
-                    title = f"Histogramme - Canal {color_map_label[channel]}"
+                            ax.fill_between(range(256), hist, alpha=0.6, color=color_map_color[channel], 
+                                           edgecolor=color_map_color[channel], linewidth=2)
+                            ax.set_ylim(0, y_max)
+                            title = f"Histogramme - Canal {color_map_label[channel]}"
                     
-                    # Statistiques du canal
-                    channel_data = cv_img[:, :, color_map_idx[channel]]
-                    mean_val = np.mean(channel_data)
-                    std_val = np.std(channel_data)
-                    min_val = np.min(channel_data)
-                    max_val = np.max(channel_data)
-            
-            # Configuration des axes et du graphique
-            ax.set_xlabel('Valeur de pixel (0-255)', fontsize=13, fontweight='bold')
-            ax.set_ylabel('Fréquence', fontsize=13, fontweight='bold')
-            ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
-            ax.set_xlim(0, 255)
-            ax.grid(True, alpha=0.3, linestyle='--', linewidth=0.5)
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
-            
-            # Ajouter une boîte de statistiques
-            stats_text = f'Statistiques:\n'
-            stats_text += f'Moyenne: {mean_val:.1f}\n'
-            stats_text += f'Écart-type: {std_val:.1f}\n'
-            stats_text += f'Min: {int(min_val)}\n'
-            stats_text += f'Max: {int(max_val)}'
-            
-            ax.text(0.98, 0.97, stats_text, transform=ax.transAxes,
-                   fontsize=10, verticalalignment='top', horizontalalignment='right',
-                   bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8, edgecolor='black', linewidth=1.5))
-            
-            plt.tight_layout()
-            
-            # Sauvegarder en bytes
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=120, bbox_inches='tight', facecolor='white', edgecolor='none')
-            buf.seek(0)
-            result = buf.getvalue()
-            plt.close(fig)
+                            # Statistiques du canal
+                            channel_data = cv_img[:, :, color_map_idx[channel]]
+                            mean_val = np.mean(channel_data)
+                            std_val = np.std(channel_data)
+                            min_val = np.min(channel_data)
+                            max_val = np.max(channel_data)
+            
+                    # Configuration des axes et du graphique
+                    ax.set_xlabel('Valeur de pixel (0-255)', fontsize=13, fontweight='bold')
+                    ax.set_ylabel('Fréquence', fontsize=13, fontweight='bold')
+                    ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
+                    ax.set_xlim(0, 255)
+                    ax.grid(True, alpha=0.3, linestyle='--', linewidth=0.5)
+                    ax.spines['top'].set_visible(False)
+                    ax.spines['right'].set_visible(False)
+            
+                    # Ajouter une boîte de statistiques
+                    stats_text = f'Statistiques:\n'
+                    stats_text += f'Moyenne: {mean_val:.1f}\n'
+                    stats_text += f'Écart-type: {std_val:.1f}\n'
+                    stats_text += f'Min: {int(min_val)}\n'
+                    stats_text += f'Max: {int(max_val)}'
+            
+                    ax.text(0.98, 0.97, stats_text, transform=ax.transAxes,
+                           fontsize=10, verticalalignment='top', horizontalalignment='right',
+                           bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8, edgecolor='black', linewidth=1.5))
+            
+                    plt.tight_layout()
+            
+                    # Sauvegarder en bytes
+                    with timed_stage("encode"):
+                        buf = self.buffers.acquire()
+                        plt.savefig(buf, format='png', dpi=120, bbox_inches='tight', facecolor='white', edgecolor='none')
+                        result = buf.getbuffer()
+                finally:
+                    # Toujours libérer la figure, même si le tracé échoue
+                    plt.close(fig)
             
             return result
         
@@ -479,9 +496,18 @@ class ImageProcessor(IImageProcessor):
             raise RuntimeError(f"Histogram image generation failed: {str(e)}")
 
     def segment_image(self, image_bytes: bytes) -> SegmentationResult:
+        digest = self._digest(image_bytes)
+        result_json = self._cached_result(
+            digest, "segment",
+            compute=lambda: self._segment_image(image_bytes, digest).model_dump_json().encode()
+        )
+        return SegmentationResult.model_validate_json(bytes(result_json))
+
+    def _segment_image(self, image_bytes: bytes, digest: Optional[str]) -> SegmentationResult:
         try:
-            img = Image.open(io.BytesIO(image_bytes))
-            cv_img = self._pil_to_cv2(img)
+            with timed_stage("decode"):
+                img = self._load_image(image_bytes, digest)
+                cv_img = self._pil_to_cv2(img)
             
             if len(cv_img.shape) == 2:
                 # Grayscale image
@@ -494,99 +520,167 @@ class ImageProcessor(IImageProcessor):
                 )
             
             # Split channels
-            blue_channel, green_channel, red_channel = cv2.split(cv_img)
-            
-            # Create zero arrays for other channels
-            zeros = np.zeros_like(blue_channel)
-            
-            # Create colored versions of each channel
-            red_colored = cv2.merge([zeros, zeros, red_channel])  # Red
-            green_colored = cv2.merge([zeros, green_channel, zeros])  # Green
-            blue_colored = cv2.merge([blue_channel, zeros, zeros])  # Blue
+            with timed_stage("split"):
+                blue_channel, green_channel, red_channel = cv2.split(cv_img)
+                
+                # Create zero arrays for other channels
+                zeros = np.zeros_like(blue_channel)
+                
+                # Create colored versions of each channel
+                red_colored = cv2.merge([zeros, zeros, red_channel])  # Red
+                green_colored = cv2.merge([zeros, green_channel, zeros])  # Green
+                blue_colored = cv2.merge([blue_channel, zeros, zeros])  # Blue
             
             def encode_image(cv_image):
                 _, buffer = cv2.imencode('.png', cv_image)
                 return base64.b64encode(buffer).decode('utf-8')
             
-            return SegmentationResult(
-                red=encode_image(red_colored),
-                green=encode_image(green_colored),
-                blue=encode_image(blue_colored),
-                grayscale_red=encode_image(red_channel),
-                grayscale_green=encode_image(green_channel),
-                grayscale_blue=encode_image(blue_channel)
-            )
+            with timed_stage("encode"):
+                return SegmentationResult(
+                    red=encode_image(red_colored),
+                    green=encode_image(green_colored),
+                    blue=encode_image(blue_colored),
+                    grayscale_red=encode_image(red_channel),
+                    grayscale_green=encode_image(green_channel),
+                    grayscale_blue=encode_image(blue_channel)
+                )
         
         except Exception as e:
             raise RuntimeError(f"Channel segmentation failed: {str(e)}")
 
-    def detect_faces(self, image_bytes: bytes) -> bytes:
+    def detect_faces(self, image_bytes: bytes, raw_compression: Optional[str] = None) -> ImageBytes:
+        digest = self._digest(image_bytes)
+        return self._cached_result(
+            digest, "detect_faces", self._format_key(raw_compression),
+            compute=lambda: self._detect_faces(image_bytes, digest, raw_compression)
+        )
+
+    def _detect_faces(self, image_bytes: bytes, digest: Optional[str],
+                      raw_compression: Optional[str] = None) -> ImageBytes:
         try:
-            img = Image.open(io.BytesIO(image_bytes))
-            cv_img = self._pil_to_cv2(img)
-            
-            # Load face cascade classifier
-            face_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            )
-            
-            # Convert to grayscale for face detection
-            gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
-            
-            # Detect faces
-            faces = face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(30, 30)
-            )
-            
-            # Draw rectangles around faces
-            for (x, y, w, h) in faces:
-                cv2.rectangle(cv_img, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            
-            # Convert back to PIL
-            result_img = self._cv2_to_pil(cv_img)
+            with timed_stage("decode"):
+                img = self._load_image(image_bytes, digest)
+                cv_img = self._pil_to_cv2(img)
+            
+            with timed_stage("detect"):
+                # Load face cascade classifier
+                face_cascade = cv2.CascadeClassifier(
+                    cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+                )
+                
+                # Convert to grayscale for face detection
+                gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
+                
+                # Detect faces
+                faces = face_cascade.detectMultiScale(
+                    gray,
+                    scaleFactor=1.1,
+                    minNeighbors=5,
+                    minSize=(30, 30)
+                )
+                
+                # Draw rectangles around faces
+                for (x, y, w, h) in faces:
+                    cv2.rectangle(cv_img, (x, y), (x + w, y + h), (0, 255, 0), 2)
             
-            buf = io.BytesIO()
-            result_img.save(buf, format="PNG")
-            buf.seek(0)
-            return buf.getvalue()
+            with timed_stage("encode"):
+                return self._encode_cv2(cv_img, raw_compression)
         
         except Exception as e:
             raise RuntimeError(f"Face detection failed: {str(e)}")
 
     # Helper methods
+    def _digest(self, image_bytes: bytes) -> Optional[str]:
+        """Content hash keying shared-store entries (None when there is no store)"""
+        if self.store is None:
+            return None
+        with timed_stage("hash"):
+            return self.store.digest(image_bytes)
+
+    def _load_image(self, image_bytes: bytes, digest: Optional[str]) -> Image.Image:
+        """Decoded image, read from the shared store when another request already decoded it
+
+        A shared hit maps the stored pixels read-only (L and RGBA without any
+        copy, RGB with a single unpack); the mapping stays pinned against
+        eviction for as long as the returned image is alive. Raw uploads are
+        already decoded and are mapped directly.
+        """
+        if raw_format.is_raw(image_bytes):
+            return raw_format.to_pil(image_bytes)
+
+        key = None
+        if digest is not None:
+            key = self.store.key("decoded", digest)
+            entry = self.store.get(key)
+            if entry is not None:
+                mode, size = entry.meta["mode"], tuple(entry.meta["size"])
+                return Image.frombuffer(mode, size, entry.data, "raw", mode, 0, 1)
+
+        img = Image.open(io.BytesIO(image_bytes))
+        img.load()
+        if key is not None and img.mode in SHAREABLE_MODES:
+            self.store.put(key, img.tobytes(), {"mode": img.mode, "size": list(img.size)})
+        return img
+
+    def _cached_result(self, digest: Optional[str], operation: str, *key_parts: str,
+                       compute: Callable[[], ImageBytes]) -> ImageBytes:
+        """Result of `operation` on the image `digest`, computed once per host
+
+        A hit is a view straight into the shared mapping, pinned until the
+        caller (ultimately the response) releases it.
+        """
+        if digest is None:
+            return compute()
+        key = self.store.key(operation, digest, *key_parts)
+        with timed_stage("cache"):
+            cached = self.store.get(key)
+        if cached is not None:
+            return cached.data
+        result = compute()
+        self.store.put(key, result)
+        return result
+
+    @staticmethod
+    def _format_key(raw_compression: Optional[str]) -> str:
+        return f"raw-{raw_compression}" if raw_compression else "png"
+
+    def _encode_pil(self, pil_img: Image.Image, raw_compression: Optional[str] = None, **png_options) -> memoryview:
+        """PNG, or raw pixels in the image's own channel order, written into a pooled buffer"""
+        if raw_compression is None:
+            buf = self.buffers.acquire()
+            pil_img.save(buf, format="PNG", **png_options)
+            return buf.getbuffer()
+        if pil_img.mode not in SHAREABLE_MODES:
+            pil_img = pil_img.convert('RGB')
+        pixels = np.asarray(pil_img)
+        buf = self.buffers.acquire(pixels.nbytes + 64)
+        raw_format.write_raw(buf, pixels, pil_img.width, pil_img.height, pil_img.mode, raw_compression)
+        return buf.getbuffer()
+
+    def _encode_cv2(self, cv2_img: np.ndarray, raw_compression: Optional[str] = None, **png_options) -> memoryview:
+        """Like _encode_pil, but raw output keeps OpenCV's BGR order (no colour conversion)"""
+        if raw_compression is None:
+            return self._encode_pil(self._cv2_to_pil(cv2_img), None, **png_options)
+        channels = 1 if cv2_img.ndim == 2 else cv2_img.shape[2]
+        order = {1: "L", 3: "BGR", 4: "BGRA"}[channels]
+        pixels = np.ascontiguousarray(cv2_img, dtype=np.uint8)
+        height, width = pixels.shape[:2]
+        buf = self.buffers.acquire(pixels.nbytes + 64)
+        raw_format.write_raw(buf, pixels, width, height, order, raw_compression)
+        return buf.getbuffer()
+
     def _pil_to_cv2(self, pil_img: Image.Image) -> np.ndarray:
-        if pil_img.mode == 'L':
-            return np.array(pil_img)
-        elif pil_img.mode == 'RGB':
-            return cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-        elif pil_img.mode == 'RGBA':
-            rgb_img = pil_img.convert('RGB')
-            return cv2.cvtColor(np.array(rgb_img), cv2.COLOR_RGB2BGR)
-        else:
-            rgb_img = pil_img.convert('RGB')
-            return cv2.cvtColor(np.array(rgb_img), cv2.COLOR_RGB2BGR)
+        return pil_to_cv2(pil_img)
 
     def _cv2_to_pil(self, cv2_img: np.ndarray) -> Image.Image:
-        if len(cv2_img.shape) == 2:
-            return Image.fromarray(cv2_img, mode='L')
-        elif cv2_img.shape[2] == 3:
-            return Image.fromarray(cv2.cvtColor(cv2_img, cv2.COLOR_BGR2RGB))
-        elif cv2_img.shape[2] == 4:
-            return Image.fromarray(cv2.cvtColor(cv2_img, cv2.COLOR_BGRA2RGBA))
-        else:
-            rgb_img = cv2.cvtColor(cv2_img, cv2.COLOR_BGR2RGB)
-            return Image.fromarray(rgb_img)
-
-    def _apply_gamma_correction(self, image: Image.Image, gamma: float) -> Image.Image:
-        img_array = np.array(image, dtype=np.float32) / 255.0
-        img_array = np.power(img_array, gamma)
-        img_array = np.uint8(img_array * 255)
-        return Image.fromarray(img_array)
-
-    def crop_image(self, image_bytes: bytes, x: int, y: int, width: int, height: int) -> bytes:
+        return cv2_to_pil(cv2_img)
+
+    def _pixel_nbytes(self, pil_img: Image.Image) -> int:
+        """Size of a decoded PIL image's pixel buffer (not visible to tracemalloc)"""
+        return pil_img.width * pil_img.height * len(pil_img.getbands())
+
+    def crop_image(self, image_bytes: bytes, x: int, y: int, width: int, height: int,
+                   raw_compression: Optional[str] = None) -> ImageBytes:
         """
         Crop an image to the specified region.
         
@@ -596,12 +690,14 @@ class ImageProcessor(IImageProcessor):
             y: Top coordinate (pixels)
             width: Width of the crop region
             height: Height of the crop region
+            raw_compression: Return raw pixels with this compression instead of PNG
             
         Returns:
             Cropped image bytes
         """
         try:
-            img = Image.open(io.BytesIO(image_bytes))
+            with timed_stage("decode"):
+                img = self._load_image(image_bytes, self._digest(image_bytes))
             
             # Ensure coordinates and dimensions are positive integers
             x = max(0, int(x))
@@ -625,13 +721,100 @@ class ImageProcessor(IImageProcessor):
                 raise ValueError("Crop region has invalid dimensions")
             
             # Crop the image (PIL uses (left, top, right, bottom))
-            cropped = img.crop((x, y, x2, y2))
+            with timed_stage("crop"):
+                cropped = img.crop((x, y, x2, y2))
             
             # Convert to bytes
-            buf = io.BytesIO()
-            cropped.save(buf, format="PNG")
-            buf.seek(0)
-            return buf.getvalue()
+            with timed_stage("encode"):
+                return self._encode_pil(cropped, raw_compression)
             
         except Exception as e:
             raise RuntimeError(f"Crop operation failed: {str(e)}")
+
+    def generate_thumbnail(self, image_bytes: bytes, size: int,
+                           raw_compression: Optional[str] = None) -> ImageBytes:
+        """
+        Thumbnail fitting in a size x size box, aspect ratio preserved.
+
+        JPEG sources are decoded in draft mode (the decoder's own 1/2..1/8
+        scaling), other sources are shrunk with Image.reduce, and only the
+        final, small step uses a LANCZOS filter. Results are cached per image,
+        size and output format.
+
+        Args:
+            image_bytes: Original image bytes
+            size: Longest side of the thumbnail (pixels)
+            raw_compression: Return raw pixels with this compression instead of PNG
+
+        Returns:
+            Thumbnail image bytes
+        """
+        digest = self._digest(image_bytes)
+        return self._cached_result(
+            digest, "thumbnail", str(size), self._format_key(raw_compression),
+            compute=lambda: self._render_thumbnail(image_bytes, digest, size, raw_compression)
+        )
+
+    def _render_thumbnail(self, image_bytes: bytes, digest: Optional[str], size: int,
+                          raw_compression: Optional[str]) -> ImageBytes:
+        try:
+            with timed_stage("decode"):
+                img = self._load_thumbnail_source(image_bytes, digest, size)
+            with timed_stage("thumbnail"):
+                thumb = shrink_to_fit(img, size)
+            with timed_stage("encode"):
+                return self._encode_pil(thumb, raw_compression)
+        except Exception as e:
+            raise RuntimeError(f"Thumbnail generation failed: {str(e)}")
+
+    def _load_thumbnail_source(self, image_bytes: bytes, digest: Optional[str], size: int) -> Image.Image:
+        """Decoded source for a thumbnail, at reduced scale when the codec supports it"""
+        if raw_format.is_raw(image_bytes):
+            return raw_format.to_pil(image_bytes)
+        if digest is not None:
+            entry = self.store.get(self.store.key("decoded", digest))
+            if entry is not None:
+                mode, full_size = entry.meta["mode"], tuple(entry.meta["size"])
+                return Image.frombuffer(mode, full_size, entry.data, "raw", mode, 0, 1)
+        img = Image.open(io.BytesIO(image_bytes))
+        if img.format == "JPEG":
+            # Shrink-on-load: the decoder picks the smallest scale still >= size
+            img.draft(img.mode, (size, size))
+        img.load()
+        return img
+
+    def export_png(self, image_bytes: bytes) -> ImageBytes:
+        """
+        Encode an image as a size-optimized PNG for download.
+
+        Unlike process_image, the image mode is kept as is (alpha included),
+        so the file holds exactly the uploaded pixels. Cached per image.
+        """
+        digest = self._digest(image_bytes)
+        return self._cached_result(digest, "export", "png", compute=lambda: self._render_export(image_bytes, digest))
+
+    def _render_export(self, image_bytes: bytes, digest: Optional[str]) -> ImageBytes:
+        try:
+            with timed_stage("decode"):
+                img = self._load_image(image_bytes, digest)
+            with timed_stage("encode"):
+                return self._encode_pil(img, None, optimize=True)
+        except Exception as e:
+            raise RuntimeError(f"Export failed: {str(e)}")
+
+
+def shrink_to_fit(img: Image.Image, size: int) -> Image.Image:
+    """Resize `img` to fit a size x size box: integer box reduction, then a LANCZOS pass
+
+    Image.reduce averages whole pixel blocks (cheap, no filter taps), leaving
+    at most twice the target size for the LANCZOS filter to handle.
+    """
+    width, height = img.size
+    scale = min(size / width, size / height, 1.0)
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+    factor = min(width // (target[0] * 2), height // (target[1] * 2))
+    if factor > 1:
+        img = img.reduce(factor)
+    if img.size != target:
+        img = img.resize(target, Image.LANCZOS)
+    return img
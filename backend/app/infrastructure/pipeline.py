@@ -0,0 +1,535 @@
+"""
+Pipeline specs compiled into optimized execution plans.
+
+A pipeline is an ordered list of operations (PipelineOp); any operation may
+appear any number of times. compile_pipeline turns it into an
+ExecutionPlan: a list of steps that each run on a PIL image, an OpenCV
+array, or either (lookup tables), converting between the two only when
+the next step needs the other one.
+
+The compiler rewrites the plan before running it:
+
+- lookup-table operations (brightness, gamma, binary thresholds) that
+  follow each other are fused into a single table, applied once. Tables
+  are built by running the operation itself on a 0-255 ramp, so fusing
+  never changes a pixel;
+- consecutive flips are folded into one (or none);
+- a grayscale conversion is moved ahead of the steps it commutes with, so
+  they run on one channel instead of three: exactly (flips) in "exact"
+  mode, also approximately (linear operations: resize, rotate, gaussian
+  blur, and brightness, contrast or sharpness with a factor of at most 1)
+  in "fast" mode. Operations that amplify clip saturated channels, so
+  they are never reordered; resize may still differ next to saturated
+  edges, where its Lanczos overshoot is clipped;
+- in "fast" mode, a gaussian blur followed by a downscaling resize runs
+  after it instead, with its kernel scaled down accordingly.
+
+Plans hold everything that does not depend on the image (lookup tables,
+flip codes, kernel sizes); rotation matrices are computed once per image
+size. Compiled plans are cached per spec.
+"""
+import functools
+import json
+from typing import Any, Callable, List, Optional
+
+import cv2
+import numpy as np
+from PIL import Image, ImageEnhance, ImageOps
+
+from ..core.metrics import timed_stage
+from ..domain.models import PipelineOp
+
+OPTIMIZE_LEVELS = ("exact", "fast", "off")
+
+BLUR_TYPES = ("gaussian", "median", "bilateral")
+FLIP_CODES = {"horizontal": 1, "vertical": 0, "both": -1}
+THRESHOLD_TYPES = ("binary", "binary_inv", "adaptive_mean", "adaptive_gaussian", "otsu")
+EDGE_METHODS = ("canny", "sobel", "laplacian", "sobel_x", "sobel_y")
+
+# Grayscale commutation of a step: gray(step(x)) == step(gray(x))
+EXACT = "exact"    # bit for bit
+# Up to rounding, for steps that never clip. Lanczos resampling may still
+# overshoot past 0 or 255 next to saturated edges, where the clipped values differ
+LINEAR = "linear"
+
+
+def pil_to_cv2(pil_img: Image.Image) -> np.ndarray:
+    if pil_img.mode == 'L':
+        return np.array(pil_img)
+    elif pil_img.mode == 'RGB':
+        return cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
+    else:
+        rgb_img = pil_img.convert('RGB')
+        return cv2.cvtColor(np.array(rgb_img), cv2.COLOR_RGB2BGR)
+
+
+def cv2_to_pil(cv2_img: np.ndarray) -> Image.Image:
+    if len(cv2_img.shape) == 2:
+        return Image.fromarray(cv2_img, mode='L')
+    elif cv2_img.shape[2] == 4:
+        return Image.fromarray(cv2.cvtColor(cv2_img, cv2.COLOR_BGRA2RGBA))
+    else:
+        return Image.fromarray(cv2.cvtColor(cv2_img, cv2.COLOR_BGR2RGB))
+
+
+def apply_gamma(image: Image.Image, gamma: float) -> Image.Image:
+    img_array = np.array(image, dtype=np.float32) / 255.0
+    img_array = np.power(img_array, gamma)
+    img_array = np.uint8(img_array * 255)
+    return Image.fromarray(img_array)
+
+
+_RAMP = np.arange(256, dtype=np.uint8)
+
+
+def _ramp_lut(operation: Callable[[Image.Image], Image.Image]) -> np.ndarray:
+    """Lookup table of a per-value operation, read off its result on a 0-255 ramp"""
+    return np.asarray(operation(Image.fromarray(_RAMP.reshape(1, 256), mode='L')), dtype=np.uint8).reshape(256)
+
+
+class Frame:
+    """The image between two plan steps, as a PIL image or an OpenCV array (converted on demand)"""
+
+    __slots__ = ("pil", "cv")
+
+    def __init__(self, pil: Optional[Image.Image] = None, cv: Optional[np.ndarray] = None):
+        self.pil = pil
+        self.cv = cv
+
+    def as_pil(self) -> Image.Image:
+        if self.pil is None:
+            with timed_stage("to_pil"):
+                self.pil = cv2_to_pil(self.cv)
+        return self.pil
+
+    def as_cv(self) -> np.ndarray:
+        if self.cv is None:
+            with timed_stage("to_cv2"):
+                self.cv = pil_to_cv2(self.pil)
+        return self.cv
+
+    def map(self, lut: np.ndarray, alpha_lut: Optional[np.ndarray] = None) -> "Frame":
+        """Same table on every colour channel (alpha: `alpha_lut`, or unchanged), on the form the image is in"""
+        if self.cv is not None:
+            return Frame(cv=cv2.LUT(self.cv, lut))
+        alpha = (_RAMP if alpha_lut is None else alpha_lut).tolist()
+        table = [value for band in self.pil.getbands() for value in (alpha if band == 'A' else lut.tolist())]
+        return Frame(pil=self.pil.point(table))
+
+
+class PlanStep:
+    """One step of an execution plan
+
+    kind: "pil" or "cv" (run takes and returns that form), "lut" (a table
+    applied to any form) or "frame" (run takes and returns a Frame).
+    """
+
+    __slots__ = ("name", "kind", "run", "lut", "alpha_lut", "gray", "commute", "flip", "blur_kernel", "resize")
+
+    def __init__(self, name: str, kind: str, run: Optional[Callable] = None, lut: Optional[np.ndarray] = None,
+                 alpha_lut: Optional[np.ndarray] = None, gray: bool = False, commute: Optional[str] = None):
+        self.name = name
+        self.kind = kind
+        self.run = run
+        self.lut = lut
+        self.alpha_lut = alpha_lut  # table for an alpha channel (None: left unchanged)
+        self.gray = gray          # converts to a single channel
+        self.commute = commute    # EXACT, LINEAR or None
+        self.flip = None          # (horizontal, vertical) for flip steps
+        self.blur_kernel = None   # kernel size of gaussian blur steps
+        self.resize = None        # size -> target size, for resize steps
+
+
+class ExecutionPlan:
+    """Compiled pipeline: the optimized steps, and the admission cost names of the source operations"""
+
+    def __init__(self, steps: List[PlanStep], operations: List[str]):
+        self.steps = steps
+        self.operations = operations
+
+    def describe(self) -> List[str]:
+        return [step.name for step in self.steps]
+
+    def run(self, image: Image.Image) -> np.ndarray:
+        """Run the plan on a decoded image (RGB, L or RGBA); returns an OpenCV array"""
+        frame = Frame(pil=image)
+        for step in self.steps:
+            with timed_stage(step.name):
+                if step.kind == "lut":
+                    frame = frame.map(step.lut, step.alpha_lut)
+                elif step.kind == "pil":
+                    frame = Frame(pil=step.run(frame.as_pil()))
+                elif step.kind == "cv":
+                    frame = Frame(cv=step.run(frame.as_cv()))
+                else:
+                    frame = step.run(frame)
+        return frame.as_cv()
+
+
+# --- Parameters ---
+
+def _param(op: PipelineOp, name: str, cast: Callable, default: Any = None) -> Any:
+    value = op.params.get(name, default)
+    if value is None or value == "":
+        if default is None:
+            raise ValueError(f"'{op.op}' needs a '{name}' parameter")
+        return default
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{op.op}': invalid '{name}' ({value!r})")
+
+
+def _choice(op: PipelineOp, name: str, choices, default: Optional[str], strict: bool) -> Optional[str]:
+    value = op.params.get(name, default)
+    if value not in choices:
+        if strict:
+            raise ValueError(f"'{op.op}': '{name}' must be one of {', '.join(choices)} (got {value!r})")
+        return None
+    return value
+
+
+def _clamped(low: float, high: float, value: float) -> float:
+    return max(low, min(high, value))
+
+
+# --- Operations ---
+
+def _gray_pil_step() -> PlanStep:
+    return PlanStep("grayscale", "pil", lambda img: img if img.mode == 'L' else ImageOps.grayscale(img), gray=True)
+
+
+def _gray_cv_step(name: str) -> PlanStep:
+    def run(cv_img: np.ndarray) -> np.ndarray:
+        return cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY) if len(cv_img.shape) == 3 else cv_img
+    return PlanStep(name, "cv", run, gray=True)
+
+
+def _brightness(op: PipelineOp, strict: bool) -> List[PlanStep]:
+    value = _param(op, "value", float)
+    if value == 0:
+        return []
+    factor = _clamped(0.1, 3.0, 1 + value / 100)
+    # Brightening clips saturated channels at 255: a clipped red and its gray level are not scaled alike
+    return [PlanStep("brightness", "lut", lut=_ramp_lut(lambda img: ImageEnhance.Brightness(img).enhance(factor)),
+                     commute=LINEAR if factor <= 1 else None)]
+
+
+def _enhance(enhancer, low: float, high: float, neutral: float, rgb: bool = False):
+    def build(op: PipelineOp, strict: bool) -> List[PlanStep]:
+        factor = _param(op, "factor", float)
+        if factor == neutral:
+            return []
+        factor = _clamped(low, high, factor)
+        # Saturation turns a grayscale image back into RGB: it must not be run after an early
+        # conversion. Factors above 1 extrapolate and clip, which does not commute with gray either
+        commute = None if rgb or factor > 1 else LINEAR
+
+        def run(img: Image.Image) -> Image.Image:
+            if rgb and img.mode != 'RGB' and img.mode != 'RGBA':
+                img = img.convert('RGB')
+            return enhancer(img).enhance(factor)
+        return [PlanStep(op.op, "pil", run, commute=commute)]
+    return build
+
+
+def _gamma(op: PipelineOp, strict: bool) -> List[PlanStep]:
+    value = _param(op, "value", float)
+    if value == 1.0:
+        return []
+    lut = _ramp_lut(lambda img: apply_gamma(img, value))
+    # Gamma applies to every channel, alpha included (brightness keeps alpha)
+    return [PlanStep("gamma", "lut", lut=lut, alpha_lut=lut)]
+
+
+def _grayscale(op: PipelineOp, strict: bool) -> List[PlanStep]:
+    return [_gray_pil_step()]
+
+
+def _resize(op: PipelineOp, strict: bool) -> List[PlanStep]:
+    width = _param(op, "width", int, 0)
+    height = _param(op, "height", int, 0)
+    if not width and not height:
+        return []
+
+    def target(original_width: int, original_height: int):
+        new_width, new_height = width, height
+        # Keep the aspect ratio when only one dimension is given
+        if new_width and new_width > 0 and (not new_height or new_height == 0):
+            ratio = new_width / original_width
+            new_height = int(original_height * ratio)
+        elif new_height and new_height > 0 and (not new_width or new_width == 0):
+            ratio = new_height / original_height
+            new_width = int(original_width * ratio)
+        else:
+            new_width = new_width or original_width
+            new_height = new_height or original_height
+        return max(1, new_width), max(1, new_height)
+
+    step = PlanStep("resize", "pil", lambda img: img.resize(target(*img.size), Image.Resampling.LANCZOS),
+                    commute=LINEAR)
+    step.resize = target
+    return [step]
+
+
+def _rotate(op: PipelineOp, strict: bool) -> List[PlanStep]:
+    angle = _param(op, "angle", float)
+    if angle == 0:
+        return []
+    matrices = {}  # (width, height) -> rotation matrix
+
+    def run(cv_img: np.ndarray) -> np.ndarray:
+        height, width = cv_img.shape[:2]
+        matrix = matrices.get((width, height))
+        if matrix is None:
+            matrix = matrices[(width, height)] = cv2.getRotationMatrix2D((width // 2, height // 2), angle, 1.0)
+        return cv2.warpAffine(cv_img, matrix, (width, height),
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=(255, 255, 255))
+    return [PlanStep("rotate", "cv", run, commute=LINEAR)]
+
+
+def _flip_step(horizontal: bool, vertical: bool) -> Optional[PlanStep]:
+    code = {(True, False): 1, (False, True): 0, (True, True): -1}.get((horizontal, vertical))
+    if code is None:
+        return None
+    step = PlanStep("flip", "cv", lambda cv_img: cv2.flip(cv_img, code), commute=EXACT)
+    step.flip = (horizontal, vertical)
+    return step
+
+
+def _flip(op: PipelineOp, strict: bool) -> List[PlanStep]:
+    direction = _choice(op, "direction", FLIP_CODES, None, strict)
+    if direction is None:
+        return []
+    code = FLIP_CODES[direction]
+    return [_flip_step(code != 0, code != 1)]
+
+
+def _blur(op: PipelineOp, strict: bool) -> List[PlanStep]:
+    kernel = _param(op, "kernel", int, 5)
+    kernel_size = max(3, kernel if kernel % 2 == 1 else kernel + 1)
+    blur_type = _choice(op, "type", BLUR_TYPES, "gaussian", strict)
+    if blur_type == "gaussian":
+        step = PlanStep("blur_gaussian", "cv", lambda cv_img: cv2.GaussianBlur(cv_img, (kernel_size, kernel_size), 0),
+                        commute=LINEAR)
+        step.blur_kernel = kernel_size
+        return [step]
+    if blur_type == "median":
+        return [PlanStep("blur_median", "cv", lambda cv_img: cv2.medianBlur(cv_img, kernel_size))]
+    if blur_type == "bilateral":
+        return [PlanStep("blur_bilateral", "cv", lambda cv_img: cv2.bilateralFilter(cv_img, kernel_size, 75, 75))]
+    return []
+
+
+def _equalize_run(cv_img: np.ndarray) -> np.ndarray:
+    if len(cv_img.shape) == 2:  # Grayscale
+        return cv2.equalizeHist(cv_img)
+    # Color - equalize Y channel in YUV
+    yuv = cv2.cvtColor(cv_img, cv2.COLOR_BGR2YUV)
+    yuv[:, :, 0] = cv2.equalizeHist(yuv[:, :, 0])
+    return cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR)
+
+
+def _stretch_run(cv_img: np.ndarray) -> np.ndarray:
+    if len(cv_img.shape) == 2:  # Grayscale
+        p2, p98 = np.percentile(cv_img, (2, 98))
+        return np.clip((cv_img - p2) / (p98 - p2) * 255, 0, 255).astype(np.uint8)
+    # Color - stretch each channel
+    for i in range(3):
+        p2, p98 = np.percentile(cv_img[:, :, i], (2, 98))
+        if p98 > p2:
+            cv_img[:, :, i] = np.clip((cv_img[:, :, i] - p2) / (p98 - p2) * 255, 0, 255).astype(np.uint8)
+    return cv_img
+
+
+def _threshold(op: PipelineOp, strict: bool) -> List[PlanStep]:
+    value = _param(op, "value", int)
+    threshold_type = _choice(op, "type", THRESHOLD_TYPES, "binary", strict)
+    steps = [_gray_cv_step("to_gray")]
+    if threshold_type == "binary":
+        steps.append(PlanStep("threshold", "lut", lut=np.where(_RAMP > value, 255, 0).astype(np.uint8)))
+    elif threshold_type == "binary_inv":
+        steps.append(PlanStep("threshold", "lut", lut=np.where(_RAMP > value, 0, 255).astype(np.uint8)))
+    elif threshold_type == "adaptive_mean":
+        steps.append(PlanStep("threshold_adaptive", "cv", lambda cv_img: cv2.adaptiveThreshold(
+            cv_img, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 11, 2)))
+    elif threshold_type == "adaptive_gaussian":
+        steps.append(PlanStep("threshold_adaptive", "cv", lambda cv_img: cv2.adaptiveThreshold(
+            cv_img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)))
+    elif threshold_type == "otsu":
+        steps.append(PlanStep("threshold", "cv", lambda cv_img: cv2.threshold(
+            cv_img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]))
+    return steps
+
+
+def _edges(op: PipelineOp, strict: bool) -> List[PlanStep]:
+    method = _choice(op, "method", EDGE_METHODS, None, strict)
+
+    def run(cv_img: np.ndarray) -> np.ndarray:
+        if method == "canny":
+            return cv2.Canny(cv_img, 50, 150)
+        if method == "sobel":
+            sobel_x = cv2.Sobel(cv_img, cv2.CV_64F, 1, 0, ksize=3)
+            sobel_y = cv2.Sobel(cv_img, cv2.CV_64F, 0, 1, ksize=3)
+            return np.sqrt(sobel_x**2 + sobel_y**2).astype(np.uint8)
+        if method == "laplacian":
+            return np.absolute(cv2.Laplacian(cv_img, cv2.CV_64F)).astype(np.uint8)
+        if method == "sobel_x":
+            return np.absolute(cv2.Sobel(cv_img, cv2.CV_64F, 1, 0, ksize=3)).astype(np.uint8)
+        if method == "sobel_y":
+            return np.absolute(cv2.Sobel(cv_img, cv2.CV_64F, 0, 1, ksize=3)).astype(np.uint8)
+        return cv_img
+    steps = [_gray_cv_step("to_gray")]
+    if method is not None:
+        steps.append(PlanStep("edges", "cv", run))
+    return steps
+
+
+def _simple(name: str, run: Callable[[np.ndarray], np.ndarray]):
+    return lambda op, strict: [PlanStep(name, "cv", run)]
+
+
+OPERATIONS = {
+    "brightness": _brightness,
+    "contrast": _enhance(ImageEnhance.Contrast, 0.1, 3.0, 1.0),
+    "saturation": _enhance(ImageEnhance.Color, 0.0, 3.0, 1.0, rgb=True),
+    "sharpness": _enhance(ImageEnhance.Sharpness, 0.0, 3.0, 1.0),
+    "gamma": _gamma,
+    "grayscale": _grayscale,
+    "resize": _resize,
+    "rotate": _rotate,
+    "flip": _flip,
+    "blur": _blur,
+    "equalize": _simple("equalize", _equalize_run),
+    "stretch": _simple("stretch", _stretch_run),
+    "threshold": _threshold,
+    "edges": _edges,
+    "normalize": _simple("normalize", lambda cv_img: cv2.normalize(cv_img, None, 0, 255, cv2.NORM_MINMAX)),
+}
+
+
+def _cost_name(op: PipelineOp) -> str:
+    """Name of an operation in the admission cost table"""
+    if op.op == "blur":
+        return f"blur_{op.params.get('type', 'gaussian')}"
+    if op.op == "threshold":
+        return "threshold_adaptive" if str(op.params.get("type", "")).startswith("adaptive") else "threshold"
+    return op.op
+
+
+# --- Rewrites ---
+
+def _fold_flips(steps: List[PlanStep]) -> List[PlanStep]:
+    folded = []
+    for step in steps:
+        if step.flip is not None and folded and folded[-1].flip is not None:
+            previous = folded.pop()
+            combined = _flip_step(previous.flip[0] != step.flip[0], previous.flip[1] != step.flip[1])
+            if combined is not None:
+                folded.append(combined)
+        else:
+            folded.append(step)
+    return folded
+
+
+def _hoist_gray(steps: List[PlanStep], allowed) -> List[PlanStep]:
+    """Move each grayscale conversion ahead of the preceding steps it commutes with"""
+    steps = list(steps)
+    for index in range(len(steps)):
+        if not steps[index].gray:
+            continue
+        target = index
+        while target > 0 and not steps[target - 1].gray and steps[target - 1].commute in allowed:
+            target -= 1
+        if target != index:
+            steps.insert(target, steps.pop(index))
+    return steps
+
+
+def _blur_after_downscale(steps: List[PlanStep]) -> List[PlanStep]:
+    """Gaussian blur then downscaling resize -> resize, then blur with the kernel scaled down"""
+    rewritten = []
+    index = 0
+    while index < len(steps):
+        step = steps[index]
+        following = steps[index + 1] if index + 1 < len(steps) else None
+        if step.blur_kernel is not None and following is not None and following.resize is not None:
+            rewritten.append(_scaled_blur_step(step, following))
+            index += 2
+        else:
+            rewritten.append(step)
+            index += 1
+    return rewritten
+
+
+def _scaled_blur_step(blur: PlanStep, resize: PlanStep) -> PlanStep:
+    def run(frame: Frame) -> Frame:
+        image = frame.as_pil()
+        target = resize.resize(*image.size)
+        scale = min(target[0] / image.size[0], target[1] / image.size[1])
+        if scale >= 1:
+            # Not a downscale: keep the written order
+            blurred = Frame(cv=blur.run(frame.as_cv()))
+            return Frame(pil=resize.run(blurred.as_pil()))
+        resized = Frame(pil=resize.run(image))
+        kernel = int(round(blur.blur_kernel * scale))
+        if kernel < 3:
+            # The downscale's own filtering already covers a blur this small
+            return resized
+        kernel += 1 - kernel % 2
+        return Frame(cv=cv2.GaussianBlur(resized.as_cv(), (kernel, kernel), 0))
+    return PlanStep("resize+blur_gaussian", "frame", run)
+
+
+def _fuse_luts(steps: List[PlanStep]) -> List[PlanStep]:
+    fused = []
+    for step in steps:
+        if step.kind == "lut" and fused and fused[-1].kind == "lut":
+            previous = fused.pop()
+            alpha_lut = None
+            if previous.alpha_lut is not None or step.alpha_lut is not None:
+                first = _RAMP if previous.alpha_lut is None else previous.alpha_lut
+                alpha_lut = first if step.alpha_lut is None else step.alpha_lut[first]
+            fused.append(PlanStep(f"{previous.name}+{step.name}", "lut", lut=step.lut[previous.lut],
+                                  alpha_lut=alpha_lut))
+        else:
+            fused.append(step)
+    return [step for step in fused if not _is_identity(step)]
+
+
+def _is_identity(step: PlanStep) -> bool:
+    return (step.kind == "lut" and np.array_equal(step.lut, _RAMP)
+            and (step.alpha_lut is None or np.array_equal(step.alpha_lut, _RAMP)))
+
+
+def compile_pipeline(ops: List[PipelineOp], optimize: str = "exact", strict: bool = True) -> ExecutionPlan:
+    """
+    Compile ordered operations into an execution plan (cached per spec).
+
+    With strict=False, unknown choices (blur type, flip direction...) make
+    their operation a no-op instead of raising ValueError, as process_image
+    always did. Unknown operations and missing parameters always raise.
+    """
+    if optimize not in OPTIMIZE_LEVELS:
+        raise ValueError(f"optimize must be one of {', '.join(OPTIMIZE_LEVELS)}")
+    spec = json.dumps([op.model_dump() for op in ops], sort_keys=True, default=str)
+    return _compile(spec, optimize, strict)
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(spec: str, optimize: str, strict: bool) -> ExecutionPlan:
+    ops = [PipelineOp(**op) for op in json.loads(spec)]
+    steps = []
+    for op in ops:
+        build = OPERATIONS.get(op.op)
+        if build is None:
+            raise ValueError(f"Unknown operation '{op.op}' (expected one of {', '.join(OPERATIONS)})")
+        steps.extend(build(op, strict))
+
+    if optimize != "off":
+        steps = _fold_flips(steps)
+        steps = _hoist_gray(steps, (EXACT, LINEAR) if optimize == "fast" else (EXACT,))
+        if optimize == "fast":
+            steps = _blur_after_downscale(steps)
+        steps = _fuse_luts(steps)
+    return ExecutionPlan(steps, [_cost_name(op) for op in ops])
@@ -0,0 +1,171 @@
+"""
+Named pipelines ("presets") registered once and applied by name.
+
+A preset is a PipelineSpec compiled into its ExecutionPlan when it is
+registered: lookup tables are built and fused, flips folded, kernel sizes
+resolved, so applying it only runs the plan. Definitions are JSON files in
+a shared directory, which every uvicorn worker reads; each worker keeps
+the compiled plans and recompiles a preset only when its file changes.
+Registrations take an exclusive flock on the directory's lock file, so the
+preset limit holds across workers.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import stat
+import threading
+import uuid
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from ..domain.models import PipelineSpec, PresetInfo
+from .pipeline import ExecutionPlan, compile_pipeline
+
+logger = logging.getLogger(__name__)
+
+DIR_ENV = "IMAGEFLOW_PRESETS_DIR"
+MAX_PRESETS_ENV = "IMAGEFLOW_MAX_PRESETS"
+
+# Letters (accents included), digits, spaces, dashes, underscores and dots
+_NAME = re.compile(r"^[\w][\w .\-]*$")
+
+
+def _default_directory() -> str:
+    # Owned by the user running the API, not a world-writable temp directory where
+    # other local users could plant or delete definitions
+    data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+    return os.path.join(data_home, "imageflow", "presets")
+
+
+class Preset:
+    """A registered preset: its definition and the plan compiled from it"""
+
+    __slots__ = ("name", "description", "spec", "plan", "created_at")
+
+    def __init__(self, name: str, description: str, spec: PipelineSpec, plan: ExecutionPlan, created_at: str):
+        self.name = name
+        self.description = description
+        self.spec = spec
+        self.plan = plan
+        self.created_at = created_at
+
+    def info(self) -> PresetInfo:
+        return PresetInfo(name=self.name, description=self.description, spec=self.spec,
+                          plan=self.plan.describe(), created_at=self.created_at)
+
+
+class PresetRegistry:
+    """Host-wide preset definitions, compiled once per worker"""
+
+    def __init__(self, directory: str, max_presets: int = 100):
+        self.directory = directory
+        self.max_presets = max_presets
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        mode = os.stat(directory).st_mode
+        if mode & (stat.S_IWGRP | stat.S_IWOTH):
+            logger.warning("⚠️ Presets directory %s is writable by other users: they can change the presets served",
+                           directory)
+        self._lock = threading.Lock()
+        self._compiled: Dict[str, Tuple[int, Preset]] = {}  # file name -> (mtime_ns, preset)
+
+    def register(self, name: str, spec: PipelineSpec, description: str = "") -> Preset:
+        """Compile and store a preset (replacing one of the same name); ValueError if it is invalid"""
+        name = name.strip()
+        if not _NAME.match(name):
+            raise ValueError("Preset names may only contain letters, digits, spaces, '.', '-' and '_'")
+        plan = compile_pipeline(spec.ops, spec.optimize)
+        file_name = self._file_name(name)
+        path = os.path.join(self.directory, file_name)
+        preset = Preset(name, description, spec, plan, datetime.now(timezone.utc).isoformat(timespec="seconds"))
+        payload = json.dumps({
+            "name": name, "description": description,
+            "spec": spec.model_dump(), "created_at": preset.created_at,
+        }).encode()
+        tmp_path = os.path.join(self.directory, f".tmp-{os.getpid()}-{uuid.uuid4().hex}")
+        with open(os.path.join(self.directory, ".lock"), "ab") as lock:
+            # Count and publish under one lock: concurrent registrations cannot overshoot the limit
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(path) and len(self._file_names()) >= self.max_presets:
+                raise ValueError(f"Too many presets (max {self.max_presets})")
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(payload)
+                # Atomic publish: other workers never read a partially written preset
+                os.replace(tmp_path, path)
+            except OSError:
+                try:
+                    os.unlink(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+        with self._lock:
+            self._compiled[file_name] = (os.stat(path).st_mtime_ns, preset)
+        logger.info("🎨 Preset '%s' registered: %s", name, ",".join(plan.describe()))
+        return preset
+
+    def get(self, name: str) -> Optional[Preset]:
+        return self._load(self._file_name(name.strip()))
+
+    def list(self) -> List[Preset]:
+        presets = [self._load(file_name) for file_name in self._file_names()]
+        return sorted((preset for preset in presets if preset is not None), key=lambda preset: preset.name.lower())
+
+    def delete(self, name: str) -> bool:
+        file_name = self._file_name(name.strip())
+        with self._lock:
+            self._compiled.pop(file_name, None)
+        try:
+            os.unlink(os.path.join(self.directory, file_name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _load(self, file_name: str) -> Optional[Preset]:
+        """The preset stored in `file_name`, compiled again only if the file changed since"""
+        path = os.path.join(self.directory, file_name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            with self._lock:
+                self._compiled.pop(file_name, None)
+            return None
+        with self._lock:
+            cached = self._compiled.get(file_name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        try:
+            with open(path, "rb") as f:
+                data = json.loads(f.read())
+            spec = PipelineSpec.model_validate(data["spec"])
+            preset = Preset(data["name"], data.get("description", ""), spec,
+                            compile_pipeline(spec.ops, spec.optimize), data.get("created_at", ""))
+        except FileNotFoundError:
+            return None  # Deleted meanwhile
+        except Exception as e:
+            logger.warning("⚠️ Skipping unreadable preset file %s: %s", path, e)
+            return None
+        with self._lock:
+            self._compiled[file_name] = (mtime, preset)
+        return preset
+
+    def _file_names(self) -> List[str]:
+        return [name for name in os.listdir(self.directory) if name.endswith(".json")]
+
+    @staticmethod
+    def _file_name(name: str) -> str:
+        # Names are free text: files are keyed by a hash of the case-folded name
+        return hashlib.sha1(name.casefold().encode()).hexdigest()[:20] + ".json"
+
+
+@lru_cache()
+def get_preset_registry() -> PresetRegistry:
+    """Process-wide PresetRegistry"""
+    directory = os.environ.get(DIR_ENV) or _default_directory()
+    registry = PresetRegistry(directory, int(os.environ.get(MAX_PRESETS_ENV, "100")))
+    logger.info("🎨 Presets stored in %s", directory)
+    return registry
@@ -1,7 +1,12 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
+from backend.app.core.metrics import get_metrics_registry, request_timer
+from backend.app.core.profiling import finish_memory_profile, start_memory_profile, start_memory_tracing
+from backend.app.api.monitoring import router as monitoring_router
 
 # Configure logging
 logging.basicConfig(
@@ -14,6 +19,8 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """Manage application lifecycle"""
     logger.info("🚀 Starting Image Processing API...")
+    # tracemalloc's peak counter is process-wide: profiled requests run one at a time
+    app.state.memory_profile_lock = asyncio.Lock() if start_memory_tracing() else None
     yield
     logger.info("🛑 Shutting down Image Processing API...")
 
@@ -37,6 +44,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _route_template(request: Request) -> str:
+    """
+    Route template of a request ("/api/presets/{name}"), "unmatched" if no route matched.
+
+    Metrics are labelled by template, never by raw path, so preset names or
+    random 404 paths don't each get their own series. Routes included with a
+    prefix may report their path without it: the (static) prefix is then
+    taken from the leading segments of the request path.
+    """
+    route = request.scope.get("route")
+    if route is None:
+        return "unmatched"
+    template = route.path
+    missing = request.url.path.rstrip("/").count("/") - template.rstrip("/").count("/")
+    if missing > 0:
+        template = "/".join(request.url.path.split("/")[:missing + 1]) + template
+    return template
+
+@app.middleware("http")
+async def stage_timing_middleware(request: Request, call_next):
+    """Time every request, expose its stages as Server-Timing and feed /metrics"""
+    memory_lock = getattr(request.app.state, "memory_profile_lock", None)
+    if memory_lock is None:
+        return await _observe_request(request, call_next)
+    async with memory_lock:
+        return await _observe_request(request, call_next)
+
+async def _observe_request(request: Request, call_next):
+    memory = start_memory_profile()
+    with request_timer(memory) as timer:
+        start = time.perf_counter()
+        response = await call_next(request)
+        total = time.perf_counter() - start
+
+    endpoint = _route_template(request)
+
+    registry = get_metrics_registry()
+    registry.observe_request(request.method, endpoint, response.status_code, total)
+    registry.observe_stages(timer)
+    response.headers["Server-Timing"] = timer.server_timing_header(total)
+
+    if memory is not None:
+        finish_memory_profile(endpoint, memory, total)
+        response.headers["X-Memory-Peak"] = f"{memory.peak_bytes / (1024 * 1024):.1f}MB"
+    return response
+
 # Import routers
 try:
     from backend.app.api.preprocess import router as preprocess_router
@@ -60,6 +113,7 @@ except ImportError as e:
 
 # Include router
 app.include_router(preprocess_router, prefix="/api", tags=["Image Processing"])
+app.include_router(monitoring_router, tags=["Monitoring"])
 
 @app.get("/")
 async def root():
@@ -70,9 +124,18 @@ async def root():
         "endpoints": {
             "preprocess": "/api/preprocess",
             "histogram": "/api/histogram",
+            "histograms": "/api/histograms",
             "segment": "/api/segment",
             "detect_faces": "/api/detect_faces",
+            "thumbnail": "/api/thumbnail",
+            "export": "/api/export",
+            "pipeline": "/api/pipeline",
+            "presets": "/api/presets",
             "test": "/api/test",
+            "metrics": "/metrics",
+            "ready": "/ready",
+            "memory": "/debug/memory",
+            "store": "/debug/store",
             "docs": "/docs"
         }
     }
@@ -0,0 +1,70 @@
+"""
+Serve the API on TCP and, for clients on the same host, on a Unix domain socket.
+
+uvicorn's CLI binds a single listener; this launcher binds both up front and
+hands them to every worker, so remote clients keep using TCP while a co-located
+frontend talks over the socket and may pass images as shared-memory handles
+(see backend/app/core/local_transport.py).
+
+    python -m backend.serve --host 127.0.0.1 --port 8000 --uds /tmp/imageflow.sock --workers 4
+"""
+import argparse
+import logging
+import os
+import socket
+import stat
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+APP = "backend.app.main:app"
+DEFAULT_UDS = "/tmp/imageflow.sock"
+
+# uvicorn.Config sets this logger up, so launcher messages share the server's format
+logger = logging.getLogger("uvicorn.error")
+
+
+def bind_unix_socket(path: str, mode: int = 0o660) -> socket.socket:
+    """Bind `path`, replacing a stale socket left by a previous run"""
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, mode)
+    return sock
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--uds", default=os.environ.get("IMAGEFLOW_UDS", DEFAULT_UDS),
+                        help="Unix socket path ('' to serve TCP only)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    config = uvicorn.Config(APP, host=args.host, port=args.port, workers=args.workers, log_level=args.log_level)
+    server = uvicorn.Server(config)
+    sockets = [config.bind_socket()]
+    if args.uds:
+        sockets.append(bind_unix_socket(args.uds))
+        logger.info("Also listening on unix socket %s", args.uds)
+
+    try:
+        if args.workers > 1:
+            Multiprocess(config, sockets=sockets).run()
+        else:
+            server.run(sockets=sockets)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.uds and os.path.exists(args.uds):
+            os.unlink(args.uds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import os
+import tempfile
+
+# Keep the suite off /dev/shm and out of the real preset directory
+os.environ.setdefault("IMAGEFLOW_SHARED_STORE", "false")
+os.environ.setdefault("IMAGEFLOW_PRESETS_DIR", tempfile.mkdtemp(prefix="imageflow-test-presets-"))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app.main import app
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,87 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from backend.app.core.admission import AdmissionController, AdmissionRejected, RequestCost, get_admission_controller
+from backend.app.infrastructure.image_processor import ImageProcessor
+from backend.app.main import app
+from backend.tests.helpers import decode, make_image, png_bytes
+
+
+def _controller(**overrides) -> AdmissionController:
+    settings = dict(cpu_budget=10.0, memory_budget=1024 * 1024 * 1024, queue_timeout=0.05, max_queue=4)
+    settings.update(overrides)
+    return AdmissionController(**settings)
+
+
+@pytest.fixture
+def saturated():
+    """Admission controller whose whole CPU budget is held by another request"""
+    controller = _controller(max_queue=0)
+    controller._take(RequestCost(controller.cpu_budget, 0))
+    app.dependency_overrides[get_admission_controller] = lambda: controller
+    try:
+        yield controller
+    finally:
+        app.dependency_overrides.pop(get_admission_controller, None)
+
+
+def test_saturated_server_answers_503_with_retry_after(client, saturated):
+    files = {"file": ("image.png", png_bytes(make_image()), "image/png")}
+    response = client.post("/api/preprocess", files=files, data={"grayscale": "true"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert saturated.rejected_total == 1
+
+    # Once the other request finishes, the same request goes through
+    saturated._release(RequestCost(saturated.cpu_budget, 0), 0.1)
+    response = client.post("/api/preprocess", files=files, data={"grayscale": "true"})
+    assert response.status_code == 200
+
+
+def test_queued_request_is_granted_when_budget_is_released():
+    async def scenario():
+        controller = _controller(queue_timeout=1.0)
+        holder = await controller.acquire(RequestCost(10.0, 0))
+        waiter = asyncio.ensure_future(controller.acquire(RequestCost(5.0, 0)))
+        await asyncio.sleep(0)
+        assert controller.snapshot()["queued"] == 1
+        controller._release(holder, 0.01)
+        granted = await waiter
+        assert granted.cpu == 5.0 and controller.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_queued_request_times_out_with_rejection():
+    async def scenario():
+        controller = _controller()
+        await controller.acquire(RequestCost(10.0, 0))
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire(RequestCost(1.0, 0))
+        assert rejected.value.retry_after >= 1
+        assert controller.snapshot()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_histogram_renders_match_serial_ones():
+    processor = ImageProcessor()
+    images = [png_bytes(make_image(seed=seed)) for seed in range(4)]
+    serial = [bytes(processor.generate_histogram_image(data, "all")) for data in images]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        parallel = list(pool.map(lambda data: bytes(processor.generate_histogram_image(data, "all")), images))
+    for expected, actual in zip(serial, parallel):
+        assert np.array_equal(decode(expected), decode(actual))
+
+
+def test_failed_histogram_render_releases_its_figure():
+    import matplotlib.pyplot as plt
+
+    processor = ImageProcessor()
+    before = len(plt.get_fignums())
+    with pytest.raises(RuntimeError):
+        processor.generate_histogram_image(png_bytes(make_image()), "purple")
+    assert len(plt.get_fignums()) == before
@@ -0,0 +1,37 @@
+import json
+
+from benchmarks.bench_image_processor import compare_to_baseline, main, make_synthetic_image, percentile
+
+
+def test_percentile_interpolates_between_ranks():
+    assert percentile([4.0], 95) == 4.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+
+
+def test_synthetic_images_have_the_requested_size_and_mode():
+    img = make_synthetic_image(0.01, "RGBA")
+    assert img.mode == "RGBA"
+    assert abs(img.width * img.height - 10_000) < 200
+
+
+def test_compare_flags_only_slowdowns_above_threshold():
+    baseline = {"a": {"p50_ms": 10.0}, "b": {"p50_ms": 10.0}, "c": {"error": "boom"}}
+    results = {"a": {"p50_ms": 11.0}, "b": {"p50_ms": 12.0}, "c": {"p50_ms": 99.0}, "d": {"p50_ms": 1.0}}
+    assert compare_to_baseline(results, baseline, 0.15) == [("b", 10.0, 12.0)]
+
+
+def test_main_saves_a_baseline_and_fails_on_regression(tmp_path, capsys):
+    args = ["--sizes", "0.01", "--modes", "L", "--formats", "PNG", "--only", "op.grayscale",
+            "--repeat", "1", "--warmup", "0"]
+    saved = tmp_path / "baseline.json"
+    assert main(args + ["--save-baseline", str(saved)]) == 0
+
+    report = json.loads(saved.read_text())
+    key = "op.grayscale|0.01MP|L|PNG"
+    assert report["results"][key]["p50_ms"] > 0
+
+    # A baseline that was impossibly fast makes the current run a regression
+    report["results"][key]["p50_ms"] = 1e-6
+    saved.write_text(json.dumps(report))
+    assert main(args + ["--baseline", str(saved)]) == 1
+    assert "regression" in capsys.readouterr().out
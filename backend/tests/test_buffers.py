@@ -0,0 +1,50 @@
+import numpy as np
+
+from backend.app.core.buffers import BufferPool
+from backend.app.domain.models import ImageProcessingParams
+from backend.app.infrastructure.image_processor import ImageProcessor
+from backend.tests.helpers import decode, make_image, png_bytes
+
+
+def test_buffer_returns_to_pool_once_its_view_is_released():
+    pool = BufferPool(initial_bytes=16)
+    buffer = pool.acquire()
+    buffer.write(b"hello ")
+    buffer.write(b"world, longer than sixteen bytes")
+    view = buffer.getbuffer()
+    assert bytes(view) == b"hello world, longer than sixteen bytes"
+
+    derived = view[:5]
+    view.release()
+    assert pool.stats()["free_buffers"] == 0  # `derived` still reads the storage
+    assert bytes(derived) == b"hello"
+    derived.release()
+    assert pool.stats()["free_buffers"] == 1
+
+    again = pool.acquire()
+    assert pool.stats()["reused"] == 1
+    again.write(b"x")
+    assert bytes(again.getbuffer()) == b"x"
+
+
+def test_oversized_buffers_are_not_kept():
+    pool = BufferPool(max_buffer_bytes=1024)
+    buffer = pool.acquire()
+    buffer.write(b"x" * 4096)
+    buffer.getbuffer().release()
+    assert pool.stats()["free_buffers"] == 0
+
+
+def test_encoder_reuses_pooled_buffers_with_identical_output():
+    pool = BufferPool()
+    processor = ImageProcessor(buffers=pool)
+    data = png_bytes(make_image(seed=5))
+    params = ImageProcessingParams(brightness=20)
+
+    first = processor.process_image(data, params)
+    expected = decode(first)
+    first.release()
+    second = processor.process_image(data, params)
+    assert pool.stats()["reused"] >= 1
+    assert np.array_equal(decode(second), expected)
+    second.release()
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from backend.tests.helpers import decode, make_image, png_bytes
+
+
+@pytest.mark.parametrize("mode", ["L", "RGB", "RGBA"])
+def test_export_is_lossless_and_keeps_the_mode(client, mode):
+    image = make_image(mode=mode, seed=2)
+    response = client.post("/api/export", files={"file": ("image.png", png_bytes(image), "image/png")})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "image/png"
+    assert np.array_equal(decode(response.content), np.asarray(image))
+
+
+def test_export_rejects_non_images(client):
+    response = client.post("/api/export", files={"file": ("notes.txt", b"hello", "text/plain")})
+    assert response.status_code == 400
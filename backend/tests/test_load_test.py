@@ -0,0 +1,32 @@
+import random
+
+import pytest
+
+from backend.tests.helpers import make_image, png_bytes
+from benchmarks.load_test import build_request, find_knee, parse_mix
+
+
+def test_parse_mix_reads_weights_and_defaults_to_one():
+    assert parse_mix("preprocess=60, histogram=15,crop,") == (["preprocess", "histogram", "crop"], [60.0, 15.0, 1.0])
+
+
+def test_find_knee_returns_last_concurrency_worth_adding():
+    steps = [
+        {"concurrency": 1, "throughput_rps": 10.0},
+        {"concurrency": 2, "throughput_rps": 19.0},
+        {"concurrency": 4, "throughput_rps": 20.0},
+        {"concurrency": 8, "throughput_rps": 20.5},
+    ]
+    assert find_knee(steps, 0.1) == 2
+    assert find_knee(steps[:2], 0.1) is None
+
+
+@pytest.mark.parametrize("endpoint", ["preprocess", "histogram", "crop"])
+def test_generated_requests_are_accepted_by_the_api(client, endpoint):
+    image = make_image(80, 60)
+    data = png_bytes(image)
+    rng = random.Random(7)
+    for _ in range(15):
+        form = build_request(endpoint, rng, image.size)
+        response = client.post(f"/api/{endpoint}", files={"file": ("image", data, "image/png")}, data=form)
+        assert response.status_code == 200, (form, response.text)
@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+import uvicorn
+
+from backend.app.core import local_transport
+from backend.app.core.local_transport import HANDLE_MEDIA_TYPE, HandoffArea, is_local_request
+from backend.app.core.raw_format import RAW_MEDIA_TYPE, to_pil
+from backend.app.main import app
+from backend.serve import bind_unix_socket
+from backend.tests.helpers import decode, make_image, png_bytes
+
+
+def test_handoff_round_trip_and_validation(tmp_path):
+    area = HandoffArea(str(tmp_path))
+    handle = area.publish(b"pixels", RAW_MEDIA_TYPE)
+    spec = json.loads(handle)
+    assert spec["media_type"] == RAW_MEDIA_TYPE and spec["size"] == 6
+    assert bytes(area.open(handle)) == b"pixels"
+
+    with pytest.raises(ValueError, match="Invalid handoff name"):
+        area.open(json.dumps({"name": "../etc/passwd", "size": 1}).encode())
+    with pytest.raises(ValueError, match="does not match"):
+        area.open(json.dumps({"name": spec["name"], "size": 7}).encode())
+    with pytest.raises(ValueError, match="not found"):
+        area.open(json.dumps({"name": "missing", "size": 1}).encode())
+
+
+def test_only_unix_socket_requests_are_local():
+    assert is_local_request({"server": ("/tmp/imageflow.sock", None)})
+    assert not is_local_request({"server": ("127.0.0.1", 8000)})
+
+
+def test_bind_replaces_a_stale_socket(tmp_path):
+    path = str(tmp_path / "api.sock")
+    stale = bind_unix_socket(path)
+    stale.close()  # The file stays behind, like after a crash
+    sock = bind_unix_socket(path)
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o660)
+    sock.close()
+
+
+def test_handle_upload_is_refused_over_tcp(client):
+    response = client.post("/api/preprocess", files={"file": ("image.shm", b"{}", HANDLE_MEDIA_TYPE)})
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def unix_server(tmp_path, monkeypatch):
+    """The app served on a Unix socket in a background thread, with its own handoff directory"""
+    handoff_dir = str(tmp_path / "handoff")
+    monkeypatch.setenv(local_transport.HANDOFF_DIR_ENV, handoff_dir)
+    local_transport.get_handoff_area.cache_clear()
+    path = str(tmp_path / "api.sock")
+    server = uvicorn.Server(uvicorn.Config(app, uds=path, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started and time.time() < deadline:
+        time.sleep(0.05)
+    try:
+        yield path, handoff_dir
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        local_transport.get_handoff_area.cache_clear()
+
+
+def test_handles_over_the_unix_socket_match_a_tcp_upload(client, unix_server):
+    from services.http_client import ApiHttpClient
+    from services.local_transport import read_handoff, write_handoff
+    from utils.raw_format import encode_parts
+
+    socket_path, handoff_dir = unix_server
+    image = make_image(seed=6)
+    form = {"blur_type": "gaussian", "brightness": "15"}
+    expected = decode(client.post("/api/preprocess", files={"file": ("image.png", png_bytes(image), "image/png")},
+                                  data=form).content)
+
+    http = ApiHttpClient(socket_path)
+    handle, upload_path = write_handoff(handoff_dir, encode_parts(image), RAW_MEDIA_TYPE)
+    response = http.post("http://localhost/api/preprocess", 30, data=form,
+                         files={"file": ("image.shm", handle, HANDLE_MEDIA_TYPE)},
+                         headers={"Accept": f"{HANDLE_MEDIA_TYPE}, {RAW_MEDIA_TYPE}"})
+    os.remove(upload_path)
+    assert response.status_code == 200, response.text
+    assert response.headers["Content-Type"].startswith(HANDLE_MEDIA_TYPE)
+
+    media_type, pixels = read_handoff(handoff_dir, response.content)
+    assert media_type == RAW_MEDIA_TYPE
+    assert np.array_equal(np.asarray(to_pil(pixels)), expected)
+    assert os.listdir(handoff_dir) == []
+    http.close()
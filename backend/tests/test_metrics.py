@@ -0,0 +1,57 @@
+from backend.app.core.metrics import MetricsRegistry, request_timer, timed_stage
+from backend.tests.helpers import make_image, png_bytes
+
+
+def test_stages_are_timed_inside_a_request_only():
+    with timed_stage("outside"):
+        pass  # No timer installed: nothing to record
+
+    with request_timer() as timer:
+        with timed_stage("decode"):
+            pass
+        with timed_stage("encode"):
+            pass
+
+    assert [name for name, _ in timer.stages] == ["decode", "encode"]
+    header = timer.server_timing_header(0.5)
+    assert header.startswith("decode;dur=")
+    assert header.endswith("total;dur=500.00")
+
+
+def test_registry_renders_cumulative_histograms():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.observe_request("POST", "/api/preprocess", 200, 0.05)
+    registry.observe_request("POST", "/api/preprocess", 200, 0.5)
+
+    text = registry.render_prometheus()
+    labels = 'method="POST",endpoint="/api/preprocess"'
+    assert f'imageflow_request_duration_seconds_bucket{{{labels},le="0.1"}} 1' in text
+    assert f'imageflow_request_duration_seconds_bucket{{{labels},le="1.0"}} 2' in text
+    assert f'imageflow_request_duration_seconds_count{{{labels}}} 2' in text
+    assert f'imageflow_requests_total{{{labels},status="200"}} 2' in text
+
+
+def test_responses_carry_server_timing_and_feed_metrics(client):
+    response = client.post(
+        "/api/preprocess",
+        files={"file": ("image.png", png_bytes(make_image()), "image/png")},
+        data={"grayscale": "true"},
+    )
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    assert "decode;dur=" in timing and "total;dur=" in timing
+
+    metrics = client.get("/metrics").text
+    assert 'imageflow_request_duration_seconds_count{method="POST",endpoint="/api/preprocess"}' in metrics
+    assert 'imageflow_stage_duration_seconds_count{stage="decode"}' in metrics
+
+
+def test_metrics_are_labelled_by_route_template(client):
+    for name in ("first-label", "second-label"):
+        assert client.get(f"/api/presets/{name}").status_code == 404
+    assert client.get("/no/such/path").status_code == 404
+
+    metrics = client.get("/metrics").text
+    assert 'imageflow_requests_total{method="GET",endpoint="/api/presets/{name}",status="404"}' in metrics
+    assert 'endpoint="unmatched"' in metrics
+    assert "first-label" not in metrics and "/no/such/path" not in metrics
@@ -0,0 +1,82 @@
+import base64
+import json
+
+import numpy as np
+import pytest
+
+from backend.app.api.preprocess import MAX_UPLOAD_BYTES
+from backend.tests.helpers import decode, make_image, png_bytes
+
+STEPS = [
+    {"brightness": "25", "contrast": "1.3"},
+    {"blur_type": "median", "blur_kernel": "5"},
+    {"rotate_angle": "90", "flip": "horizontal"},
+    {"grayscale": "true", "equalize": "true"},
+    {"threshold": "128", "threshold_type": "otsu"},
+]
+
+
+def _upload(data: bytes, media_type: str = "image/png") -> dict:
+    return {"file": ("image.png", data, media_type)}
+
+
+def _sequential(client, data: bytes, steps: list) -> list:
+    results = []
+    for step in steps:
+        response = client.post("/api/preprocess", files=_upload(data), data=step)
+        assert response.status_code == 200, response.text
+        data = response.content
+        results.append(decode(data))
+    return results
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA"])
+def test_pipeline_matches_chained_preprocess_calls(client, mode):
+    data = png_bytes(make_image(mode=mode, seed=11))
+    expected = _sequential(client, data, STEPS)
+
+    response = client.post("/api/pipeline", files=_upload(data), data={"steps": json.dumps(STEPS)})
+    assert response.status_code == 200
+    assert np.array_equal(decode(response.content), expected[-1])
+
+    response = client.post("/api/pipeline", files=_upload(data),
+                           data={"steps": json.dumps(STEPS), "intermediates": "true"})
+    images = [decode(base64.b64decode(image)) for image in response.json()["images"]]
+    assert len(images) == len(STEPS)
+    for image, reference in zip(images, expected):
+        assert np.array_equal(image, reference)
+
+
+@pytest.mark.parametrize("steps,status", [
+    ("not json", 400),
+    ("[]", 400),
+    (json.dumps([{"unknown": "1"}]), 400),
+    (json.dumps([{"grayscale": "true"}] * 33), 400),
+])
+def test_invalid_steps_are_rejected(client, steps, status):
+    response = client.post("/api/pipeline", files=_upload(png_bytes(make_image())), data={"steps": steps})
+    assert response.status_code == status
+
+
+@pytest.mark.parametrize("path,form", [
+    ("/api/preprocess", {}),
+    ("/api/pipeline", {"steps": json.dumps([{"grayscale": "true"}])}),
+    ("/api/thumbnail", {}),
+    ("/api/export", {}),
+    ("/api/crop", {"x": "0", "y": "0", "width": "4", "height": "4"}),
+])
+def test_routes_share_the_upload_checks(client, path, form):
+    response = client.post(path, files=_upload(b"x" * (MAX_UPLOAD_BYTES + 1)), data=form)
+    assert response.status_code == 413
+    response = client.post(path, files=_upload(png_bytes(make_image()), "text/plain"), data=form)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "File must be an image"
+
+
+def test_preset_apply_shares_the_upload_checks(client):
+    response = client.post("/api/presets", json={"name": "grey", "steps": [{"grayscale": "true"}]})
+    assert response.status_code == 200
+    response = client.post("/api/presets/grey/apply", files=_upload(b"x" * (MAX_UPLOAD_BYTES + 1)))
+    assert response.status_code == 413
+    response = client.post("/api/presets/grey/apply", files=_upload(png_bytes(make_image()), "text/plain"))
+    assert response.status_code == 400
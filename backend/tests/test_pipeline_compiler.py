@@ -0,0 +1,124 @@
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend.app.domain.models import PipelineOp
+from backend.app.infrastructure.pipeline import compile_pipeline
+from backend.tests.helpers import decode, make_image, png_bytes
+
+# Operations followed by the /preprocess form fields that run them one at a time
+OPS = [
+    ({"op": "brightness", "params": {"value": 30}}, {"brightness": "30"}),
+    ({"op": "gamma", "params": {"value": 0.7}}, {"gamma": "0.7"}),
+    ({"op": "flip", "params": {"direction": "horizontal"}}, {"flip": "horizontal"}),
+    ({"op": "flip", "params": {"direction": "both"}}, {"flip": "both"}),
+    ({"op": "grayscale"}, {"grayscale": "true"}),
+    ({"op": "brightness", "params": {"value": -10}}, {"brightness": "-10"}),
+    ({"op": "threshold", "params": {"value": 100}}, {"threshold": "100"}),
+]
+
+
+def _ops(entries) -> list:
+    return [PipelineOp(**op) for op, _ in entries]
+
+
+def _upload(data: bytes) -> dict:
+    return {"file": ("image.png", data, "image/png")}
+
+
+def test_exact_plan_is_rewritten():
+    plan = compile_pipeline(_ops(OPS), "exact")
+    assert compile_pipeline(_ops(OPS), "off").describe() == [
+        "brightness", "gamma", "flip", "flip", "grayscale", "brightness", "to_gray", "threshold"]
+    # Both flips fold into one vertical flip, the grayscale conversion moves ahead of it
+    # and the adjacent brightness and gamma tables are fused into one
+    assert plan.describe() == ["brightness+gamma", "grayscale", "flip", "brightness", "to_gray", "threshold"]
+    assert compile_pipeline(_ops(OPS), "exact") is plan
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L"])
+def test_exact_matches_unoptimized(mode):
+    image = make_image(mode=mode, seed=3)
+    for count in range(1, len(OPS) + 1):
+        ops = _ops(OPS[:count])
+        assert np.array_equal(compile_pipeline(ops, "exact").run(image), compile_pipeline(ops, "off").run(image))
+
+
+def test_fast_stays_close_to_unoptimized():
+    ops = [PipelineOp(op="contrast", params={"factor": 0.8}),
+           PipelineOp(op="blur", params={"type": "gaussian", "kernel": 9}),
+           PipelineOp(op="resize", params={"width": 32}),
+           PipelineOp(op="grayscale")]
+    image = make_image(width=128, height=96, seed=5)
+    fast = compile_pipeline(ops, "fast")
+    assert fast.describe()[0] == "grayscale"
+    assert "resize+blur_gaussian" in fast.describe()
+    fast_result = fast.run(image).astype(int)
+    off_result = compile_pipeline(ops, "off").run(image).astype(int)
+    assert fast_result.shape == off_result.shape == (24, 32)
+    assert np.abs(fast_result - off_result).mean() < 8
+
+
+def test_invalid_specs_are_rejected():
+    with pytest.raises(ValueError):
+        compile_pipeline(_ops(OPS), "fastest")
+    with pytest.raises(ValueError):
+        compile_pipeline([PipelineOp(op="sepia")])
+    with pytest.raises(ValueError):
+        compile_pipeline([PipelineOp(op="flip", params={"direction": "diagonal"})])
+    assert compile_pipeline([PipelineOp(op="flip", params={"direction": "diagonal"})], strict=False).describe() == []
+
+
+@pytest.mark.parametrize("optimize", ["exact", "off"])
+def test_spec_matches_sequential_preprocess(client, optimize):
+    data = png_bytes(make_image(mode="RGBA", seed=8))
+    spec = {"ops": [op for op, _ in OPS], "optimize": optimize}
+    response = client.post("/api/pipeline", files=_upload(data), data={"spec": json.dumps(spec)})
+    assert response.status_code == 200, response.text
+    assert response.headers["X-Pipeline-Plan"] == ",".join(compile_pipeline(_ops(OPS), optimize).describe())
+
+    expected = data
+    for _, form in OPS:
+        step = client.post("/api/preprocess", files=_upload(expected), data=form)
+        assert step.status_code == 200
+        expected = step.content
+    assert np.array_equal(decode(response.content), decode(expected))
+
+
+def test_spec_rejects_steps_and_intermediates(client):
+    data = png_bytes(make_image())
+    spec = json.dumps({"ops": [{"op": "grayscale"}]})
+    response = client.post("/api/pipeline", files=_upload(data),
+                           data={"spec": spec, "steps": json.dumps([{"grayscale": "true"}])})
+    assert response.status_code == 400
+    response = client.post("/api/pipeline", files=_upload(data), data={"spec": spec, "intermediates": "true"})
+    assert response.status_code == 400
+    response = client.post("/api/pipeline", files=_upload(data), data={"spec": json.dumps({"ops": []})})
+    assert response.status_code == 400
+
+
+def _saturated_image() -> Image.Image:
+    pixels = np.array(make_image(width=64, height=64, seed=6))
+    pixels[:32, :32] = (255, 0, 0)
+    pixels[32:, :32] = (0, 0, 255)
+    pixels[:32, 32:] = (255, 255, 0)
+    return Image.fromarray(pixels)
+
+
+@pytest.mark.parametrize("op,params,hoisted", [
+    ("brightness", {"value": 100}, False),
+    ("contrast", {"factor": 2.0}, False),
+    ("sharpness", {"factor": 3.0}, False),
+    ("brightness", {"value": -40}, True),
+    ("contrast", {"factor": 0.5}, True),
+    ("sharpness", {"factor": 0.5}, True),
+])
+def test_fast_only_hoists_gray_over_steps_that_do_not_clip(op, params, hoisted):
+    ops = [PipelineOp(op=op, params=params), PipelineOp(op="grayscale")]
+    fast = compile_pipeline(ops, "fast")
+    assert (fast.describe()[0] == "grayscale") == hoisted
+    image = _saturated_image()
+    difference = np.abs(fast.run(image).astype(int) - compile_pipeline(ops, "off").run(image).astype(int))
+    assert difference.max() <= 1
@@ -0,0 +1,113 @@
+import base64
+import json
+import os
+import stat
+import threading
+
+import numpy as np
+import pytest
+
+from backend.app.domain.models import PipelineSpec
+from backend.app.infrastructure.presets import DIR_ENV, PresetRegistry, get_preset_registry
+from backend.tests.helpers import decode, make_image, png_bytes
+
+SPEC = PipelineSpec.model_validate({"ops": [
+    {"op": "brightness", "params": {"value": 20}},
+    {"op": "gamma", "params": {"value": 0.8}},
+    {"op": "flip", "params": {"direction": "vertical"}},
+]})
+STEPS = [{"brightness": "20", "gamma": "0.8"}, {"flip": "vertical", "grayscale": "true"}]
+
+
+def _upload(data: bytes) -> tuple:
+    return ("file", ("image.png", data, "image/png"))
+
+
+def test_registry_is_shared_between_workers(tmp_path):
+    first, second = PresetRegistry(str(tmp_path)), PresetRegistry(str(tmp_path))
+    preset = first.register(" Warm ", SPEC, "warmer")
+    assert preset.name == "Warm"
+    assert preset.plan.describe() == ["brightness+gamma", "flip"]
+
+    loaded = second.get("WARM")
+    assert loaded.spec == SPEC and loaded.description == "warmer"
+    assert second.get("warm") is loaded  # Compiled once while the file is unchanged
+    assert [preset.name for preset in second.list()] == ["Warm"]
+
+    assert second.delete("warm")
+    assert first.get("Warm") is None
+    assert not first.delete("warm")
+    with pytest.raises(ValueError):
+        first.register("../escape", SPEC)
+
+
+def test_limit_holds_under_concurrent_registrations(tmp_path):
+    max_presets = 5
+    # One registry per thread, as if each were a separate worker
+    registries = [PresetRegistry(str(tmp_path), max_presets) for _ in range(20)]
+    barrier = threading.Barrier(len(registries))
+    outcomes = []
+
+    def register(index: int) -> None:
+        barrier.wait()
+        try:
+            outcomes.append(registries[index].register(f"preset {index}", SPEC).name)
+        except ValueError:
+            outcomes.append(None)
+
+    threads = [threading.Thread(target=register, args=(index,)) for index in range(len(registries))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    registered = [name for name in outcomes if name is not None]
+    assert len(registered) == max_presets
+    assert sorted(preset.name for preset in registries[0].list()) == sorted(registered)
+    # Replacing an existing preset is still allowed once the limit is reached
+    registries[0].register(registered[0], SPEC, "replaced")
+    assert registries[1].get(registered[0]).description == "replaced"
+
+
+def test_preset_api_round_trip(client):
+    response = client.post("/api/presets", json={"name": "contrasty", "description": "demo", "steps": STEPS})
+    assert response.status_code == 200
+    info = response.json()
+    assert info["name"] == "contrasty" and info["plan"]
+    assert client.get("/api/presets/contrasty").json()["spec"] == info["spec"]
+    assert "contrasty" in [preset["name"] for preset in client.get("/api/presets").json()]
+
+    data = png_bytes(make_image(mode="RGBA", seed=4))
+    applied = client.post("/api/presets/contrasty/apply", files=[_upload(data)])
+    assert applied.status_code == 200
+    assert applied.headers["X-Preset"] == "contrasty"
+    expected = client.post("/api/pipeline", files=[_upload(data)], data={"steps": json.dumps(STEPS)})
+    assert np.array_equal(decode(applied.content), decode(expected.content))
+
+    batch = client.post("/api/presets/contrasty/batch", files=[
+        ("files", ("a.png", data, "image/png")), ("files", ("b.txt", b"text", "text/plain"))])
+    images = batch.json()["images"]
+    assert [image["filename"] for image in images] == ["a.png", "b.txt"]
+    assert np.array_equal(decode(base64.b64decode(images[0]["image"])), decode(applied.content))
+    assert images[1]["image"] is None and images[1]["error"] == "File must be an image"
+
+    assert client.delete("/api/presets/contrasty").status_code == 200
+    assert client.get("/api/presets/contrasty").status_code == 404
+    assert client.post("/api/presets/contrasty/apply", files=[_upload(data)]).status_code == 404
+
+
+@pytest.mark.parametrize("body", [
+    {"name": "both", "steps": STEPS, "spec": SPEC.model_dump()},
+    {"name": "neither"},
+    {"name": "bad/name", "steps": STEPS},
+    {"name": "unknown", "spec": {"ops": [{"op": "sepia"}]}},
+])
+def test_invalid_presets_are_rejected(client, body):
+    assert client.post("/api/presets", json=body).status_code == 400
+
+
+def test_default_directory_is_private(tmp_path, monkeypatch):
+    monkeypatch.delenv(DIR_ENV)
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path))
+    registry = get_preset_registry.__wrapped__()
+    assert registry.directory == str(tmp_path / "imageflow" / "presets")
+    assert stat.S_IMODE(os.stat(registry.directory).st_mode) == 0o700
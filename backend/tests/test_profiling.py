@@ -0,0 +1,86 @@
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app import main
+from backend.app.core.profiling import (
+    MB, PROFILE_ENV, MemoryProfile, finish_memory_profile, get_profiling_config, start_memory_profile,
+)
+from backend.tests.helpers import make_image, png_bytes
+
+
+@pytest.fixture
+def tracing():
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        tracemalloc.stop()
+
+
+def _allocate(megabytes: int) -> None:
+    buffer = np.ones(megabytes * MB, dtype=np.uint8)
+    del buffer
+
+
+def test_stage_records_traced_numpy_growth(tracing):
+    profile = MemoryProfile(large_bytes=1024 * MB)
+    with profile.stage("decode"):
+        _allocate(4)
+    profile.finish()
+    (name, growth), = profile.stages
+    assert name == "decode"
+    assert growth >= 4 * MB
+    assert profile.peak_bytes >= 4 * MB
+
+
+def test_nested_stage_keeps_the_outer_peak(tracing):
+    profile = MemoryProfile(large_bytes=1024 * MB)
+    with profile.stage("operations"):
+        _allocate(8)
+        with profile.stage("op.blur"):
+            _allocate(1)
+        _allocate(2)
+    profile.finish()
+    growth = dict(profile.stages)
+    assert 1 * MB <= growth["op.blur"] < 8 * MB
+    # The 8 MB reached before the inner stage reset the counter still counts
+    assert growth["operations"] >= 8 * MB
+    assert profile.peak_bytes >= 8 * MB
+
+
+@pytest.fixture
+def profiling(monkeypatch):
+    monkeypatch.setenv(PROFILE_ENV, "true")
+    get_profiling_config.cache_clear()
+    try:
+        yield
+    finally:
+        get_profiling_config.cache_clear()
+        tracemalloc.stop()
+
+
+def test_profiled_requests_run_one_at_a_time(profiling, monkeypatch):
+    in_flight, overlaps = [0], []
+
+    def start():
+        in_flight[0] += 1
+        overlaps.append(in_flight[0])
+        return start_memory_profile()
+
+    def finish(endpoint, profile, seconds):
+        in_flight[0] -= 1
+        finish_memory_profile(endpoint, profile, seconds)
+
+    monkeypatch.setattr(main, "start_memory_profile", start)
+    monkeypatch.setattr(main, "finish_memory_profile", finish)
+    files = {"file": ("image.png", png_bytes(make_image(width=256, height=256)), "image/png")}
+    with TestClient(main.app) as client:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            responses = list(pool.map(
+                lambda _: client.post("/api/preprocess", files=files, data={"blur_type": "gaussian"}), range(8)))
+    assert all(response.status_code == 200 and "X-Memory-Peak" in response.headers for response in responses)
+    assert max(overlaps) == 1
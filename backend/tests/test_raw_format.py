@@ -0,0 +1,95 @@
+import io
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend.app.core import raw_format
+from backend.tests.helpers import decode, make_image, png_bytes
+
+
+def _raw(image: Image.Image, order: str = None, compression: str = "none") -> bytes:
+    order = order or image.mode
+    out = io.BytesIO()
+    pixels = np.asarray(image)
+    if order in ("BGR", "BGRA"):
+        pixels = np.ascontiguousarray(pixels[:, :, [2, 1, 0, 3][:pixels.shape[2]]])
+    raw_format.write_raw(out, pixels, image.width, image.height, order, compression)
+    return out.getvalue()
+
+
+def _header(width: int, height: int, channels: int, order: bytes, compression: int, payload: bytes) -> bytes:
+    return struct.pack("<4sBBBB4sIIQ4x", b"IFRW", 1, 1, channels, compression, order,
+                       width, height, len(payload)) + payload
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+@pytest.mark.parametrize("mode,order", [("L", "L"), ("RGB", "RGB"), ("RGBA", "RGBA"), ("RGB", "BGR"), ("RGBA", "BGRA")])
+def test_round_trip_is_exact(mode, order, compression):
+    image = make_image(mode=mode, seed=1)
+    decoded = raw_format.to_pil(_raw(image, order, compression))
+    assert decoded.mode == mode
+    assert np.array_equal(np.asarray(decoded), np.asarray(image))
+
+
+def test_frontend_encoding_is_read_by_the_backend():
+    from utils.raw_format import encode_image
+
+    image = make_image(mode="RGBA", seed=2)
+    assert np.array_equal(np.asarray(raw_format.to_pil(encode_image(image, "zlib"))), np.asarray(image))
+
+
+def test_payload_of_the_wrong_size_is_rejected():
+    with pytest.raises(ValueError):
+        raw_format.to_pil(_header(4, 4, 3, b"RGB\x00", 0, b"\x00" * 47))
+    with pytest.raises(ValueError):
+        raw_format.to_pil(_header(4, 4, 3, b"RGB\x00", 1, zlib.compress(b"\x00" * 47)))
+
+
+def test_decompression_is_bounded_by_the_header():
+    # 10 MB of zeros compress to ~10 KB; the header only allows 48 bytes
+    bomb = zlib.compress(b"\x00" * (10 * 1024 * 1024), 9)
+    with pytest.raises(ValueError, match="does not match"):
+        raw_format._decompress("zlib", bomb, 48)
+    with pytest.raises(ValueError, match="does not match"):
+        raw_format.to_pil(_header(4, 4, 3, b"RGB\x00", 1, bomb))
+
+
+def test_truncated_and_corrupt_streams_are_rejected():
+    stream = zlib.compress(b"\x01" * 48)
+    with pytest.raises(ValueError):
+        raw_format._decompress("zlib", stream[:-6], 48)
+    with pytest.raises(ValueError, match="Corrupt"):
+        raw_format._decompress("zlib", b"not a zlib stream", 48)
+
+
+def test_dimensions_above_the_pixel_limit_are_rejected_before_decoding():
+    huge = _header(100_000, 100_000, 1, b"L\x00\x00\x00", 1, zlib.compress(b"\x00"))
+    with pytest.raises(ValueError, match="pixel limit"):
+        raw_format.read_header(huge)
+
+
+def test_raw_bomb_uploads_are_rejected(client):
+    def upload(data):
+        return client.post("/api/preprocess", files={"file": ("bomb", data, raw_format.RAW_MEDIA_TYPE)},
+                           data={"grayscale": "true"})
+
+    # Oversized dimensions are refused from the header, before admission
+    response = upload(_header(100_000, 100_000, 1, b"L\x00\x00\x00", 1, zlib.compress(b"\x00")))
+    assert response.status_code == 400
+    response = upload(_header(4, 4, 3, b"RGB\x00", 1, zlib.compress(b"\x00" * (1024 * 1024))))
+    assert response.status_code != 200
+    assert "does not match" in response.json()["detail"]
+
+
+def test_raw_upload_matches_png_upload(client):
+    image = make_image(seed=4)
+    results = []
+    for data, media_type in ((png_bytes(image), "image/png"), (_raw(image, compression="zlib"), raw_format.RAW_MEDIA_TYPE)):
+        response = client.post("/api/preprocess", files={"file": ("image", data, media_type)},
+                               data={"blur_type": "gaussian"})
+        assert response.status_code == 200
+        results.append(decode(response.content))
+    assert np.array_equal(*results)
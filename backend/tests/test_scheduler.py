@@ -0,0 +1,90 @@
+from backend.app.core.admission import RequestCost
+from backend.app.core.scheduler import BULK, INTERACTIVE, FairShareQueue, Ticket, classify_lane
+
+
+def _ticket(client: str, lane: str = BULK, cpu: float = 1.0) -> Ticket:
+    return Ticket(client, lane, RequestCost(cpu, 0), future=None)
+
+
+def _drain(queue: FairShareQueue) -> list:
+    order = []
+    while queue:
+        ticket = queue.pop()
+        order.append(ticket.client)
+    return order
+
+
+def test_classify_lane_by_size_and_hint():
+    assert classify_lane(1_000_000, None, 4_000_000) == INTERACTIVE
+    assert classify_lane(8_000_000, None, 4_000_000) == BULK
+    assert classify_lane(1_000, "Bulk", 4_000_000) == BULK
+
+
+def test_deep_backlog_does_not_starve_another_client():
+    queue = FairShareQueue()
+    for _ in range(10):
+        queue.push(_ticket("batch"))
+    queue.push(_ticket("editor"))
+    order = _drain(queue)
+    # The late client is served after at most one of the backlog, not after all ten
+    assert order.index("editor") <= 1
+    assert order.count("batch") == 10
+
+
+def test_equal_clients_are_interleaved():
+    queue = FairShareQueue()
+    for _ in range(3):
+        queue.push(_ticket("a"))
+    for _ in range(3):
+        queue.push(_ticket("b"))
+    assert _drain(queue) == ["a", "b", "a", "b", "a", "b"]
+
+
+def test_interactive_lane_gets_its_weighted_share():
+    queue = FairShareQueue()
+    for _ in range(4):
+        queue.push(_ticket("batch", BULK, cpu=8.0))
+    for _ in range(8):
+        queue.push(_ticket("editor", INTERACTIVE, cpu=8.0))
+    first_nine = _drain(queue)[:9]
+    # Weight 8 against 1: eight interactive requests per bulk one
+    assert first_nine.count("editor") == 8
+
+
+def test_remove_and_count_track_flows():
+    queue = FairShareQueue()
+    first, second = _ticket("a"), _ticket("a")
+    queue.push(first)
+    queue.push(second)
+    queue.push(_ticket("b", INTERACTIVE))
+    assert queue.count(client="a") == 2 and queue.count(lane=INTERACTIVE) == 1
+    queue.remove(first)
+    assert len(queue) == 2 and queue.count(client="a") == 1
+    assert [queue.pop(), queue.pop()][1] is second
+
+
+def test_idle_flows_are_forgotten_once_virtual_time_passes_them():
+    queue = FairShareQueue()
+    for _ in range(20):
+        queue.push(_ticket("steady"))
+    # Callers rotating X-Client-Id, each giving up on its one request
+    for index in range(100):
+        ticket = _ticket(f"rotating-{index}", cpu=2.0)
+        queue.push(ticket)
+        queue.remove(ticket)
+    assert len(queue._last_finish) == 101
+    for _ in range(5):
+        queue.pop()
+    assert list(queue._last_finish) == [(BULK, "steady")]
+    assert not queue._idle
+
+
+def test_drained_queue_keeps_no_flow_state():
+    queue = FairShareQueue()
+    queue.push(_ticket("heavy", cpu=50.0))
+    queue.push(_ticket("light"))
+    waiting = _ticket("gave-up", cpu=50.0)
+    queue.push(waiting)
+    queue.remove(waiting)
+    _drain(queue)
+    assert not queue._last_finish and not queue._idle
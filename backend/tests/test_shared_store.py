@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+
+from backend.app.core.shared_store import MB, SharedImageStore
+from backend.app.domain.models import ImageProcessingParams
+from backend.app.infrastructure.image_processor import ImageProcessor
+from backend.tests.helpers import decode, make_image, png_bytes
+
+
+def test_store_hit_matches_a_cold_decode(tmp_path):
+    store = SharedImageStore(str(tmp_path), 64 * MB)
+    params = ImageProcessingParams(grayscale=False, blur_type="gaussian", blur_kernel=5)
+    for mode in ("L", "RGB", "RGBA"):
+        data = png_bytes(make_image(mode=mode, seed=3))
+        cold = decode(ImageProcessor().process_image(data, params))
+
+        # A fresh processor per call, like another worker sharing the store
+        first = decode(ImageProcessor(store=store).process_image(data, params))
+        hits = store.hits
+        second = decode(ImageProcessor(store=store).process_image(data, params))
+        assert store.hits > hits
+        assert np.array_equal(first, cold)
+        assert np.array_equal(second, cold)
+
+
+def test_put_get_round_trip(tmp_path):
+    store = SharedImageStore(str(tmp_path), MB)
+    key = store.key("decoded", store.digest(b"upload"))
+    assert store.get(key) is None
+    assert store.put(key, b"pixels", {"mode": "L"})
+    entry = store.get(key)
+    assert entry.meta == {"mode": "L"}
+    assert bytes(entry.data) == b"pixels"
+    entry.release()
+
+
+def test_eviction_drops_least_recently_used_and_skips_pinned(tmp_path):
+    payload = b"x" * 3000
+    entry_size = 64 + len(payload)  # Header and metadata are padded to 64 bytes
+    store = SharedImageStore(str(tmp_path), 3 * entry_size + 100)
+    for name in ("a", "b", "c"):
+        assert store.put(name, payload)
+        os.utime(store._path(name), (0, {"a": 1, "b": 2, "c": 3}[name]))
+
+    pinned = store.get("a")  # Refreshes "a" and pins it with a shared lock
+    os.utime(store._path("a"), (0, 1))
+    assert store.put("d", payload)
+    assert store.evictions == 1
+    assert store.get("b") is None
+    assert bytes(pinned.data) == payload
+    pinned.release()
+
+
+def test_directory_is_only_scanned_when_over_capacity(tmp_path, monkeypatch):
+    store = SharedImageStore(str(tmp_path), MB)
+    scans = []
+    evict = store._evict
+    monkeypatch.setattr(store, "_evict", lambda incoming: scans.append(incoming) or evict(incoming))
+
+    for index in range(10):
+        assert store.put(f"entry-{index}", b"x" * 1000)
+    # Only the first write, with no running total yet, lists the directory
+    assert len(scans) == 1
+    assert store.stats()["entries"] == 10
+
+    # A new store object (another worker) picks up the total from the lock file
+    other = SharedImageStore(str(tmp_path), 10 * (64 + 1000) + 100)
+    monkeypatch.setattr(other, "_evict", lambda incoming: scans.append(incoming) or evict.__func__(other, incoming))
+    assert other.put("entry-10", b"x" * 1000)
+    assert len(scans) == 2 and other.evictions == 1
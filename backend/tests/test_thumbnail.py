@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from backend.tests.helpers import decode, make_image, png_bytes
+
+
+def _thumbnail(client, data: bytes, size: str):
+    return client.post("/api/thumbnail", files={"file": ("image.png", data, "image/png")}, data={"size": size})
+
+
+@pytest.mark.parametrize("width,height,size,expected", [
+    (640, 480, "150", (150, 112)),
+    (300, 900, "100", (33, 100)),
+    (80, 60, "150", (80, 60)),  # Never enlarged
+])
+def test_thumbnail_fits_the_box_and_keeps_the_aspect_ratio(client, width, height, size, expected):
+    response = _thumbnail(client, png_bytes(make_image(width, height)), size)
+    assert response.status_code == 200
+    pixels = decode(response.content)
+    assert (pixels.shape[1], pixels.shape[0]) == expected
+
+
+def test_thumbnail_matches_the_frontend_shrink(client):
+    from utils.thumbnails import shrink_to_fit
+
+    image = make_image(640, 480, "RGBA", seed=3)
+    response = _thumbnail(client, png_bytes(image), "150")
+    assert np.array_equal(decode(response.content), np.asarray(shrink_to_fit(image, 150)))
+
+
+@pytest.mark.parametrize("size", ["0", "2048", "big"])
+def test_invalid_sizes_are_rejected(client, size):
+    assert _thumbnail(client, png_bytes(make_image()), size).status_code == 400
@@ -0,0 +1,309 @@
+"""
+Benchmark suite for ImageProcessor.
+
+Generates deterministic synthetic images for every (size, mode, format)
+combination, times each single operation of `process_image` plus every
+endpoint-equivalent path, and reports throughput, p50/p95 latency and peak
+memory. Memory is reported twice: tracemalloc sees Python and NumPy buffers,
+while the sampled RSS delta also catches PIL/OpenCV native allocations. Results can be saved as a baseline JSON and later compared
+against it, failing when a case regresses beyond a configurable threshold.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_image_processor --sizes 0.3,2 --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_image_processor --sizes 0.3,2 --baseline benchmarks/baseline.json --threshold 0.15
+"""
+import argparse
+import ctypes
+import ctypes.util
+import gc
+import io
+import json
+import math
+import platform
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from backend.app.domain.models import ImageProcessingParams
+from backend.app.infrastructure.image_processor import ImageProcessor
+
+DEFAULT_SIZES = "0.3,2,12,24"
+DEFAULT_MODES = "L,RGB,RGBA"
+DEFAULT_FORMATS = "PNG,JPEG"
+
+# One entry per operation of process_image, each run in isolation
+OPERATION_CASES: Dict[str, ImageProcessingParams] = {
+    "op.noop": ImageProcessingParams(),
+    "op.brightness": ImageProcessingParams(brightness=20),
+    "op.contrast": ImageProcessingParams(contrast=1.5),
+    "op.saturation": ImageProcessingParams(saturation=1.5),
+    "op.sharpness": ImageProcessingParams(sharpness=2.0),
+    "op.gamma": ImageProcessingParams(gamma=0.8),
+    "op.grayscale": ImageProcessingParams(grayscale=True),
+    "op.rotate": ImageProcessingParams(rotate_angle=30),
+    "op.flip": ImageProcessingParams(flip="horizontal"),
+    "op.blur_gaussian": ImageProcessingParams(blur_type="gaussian", blur_kernel=5),
+    "op.blur_median": ImageProcessingParams(blur_type="median", blur_kernel=5),
+    "op.blur_bilateral": ImageProcessingParams(blur_type="bilateral", blur_kernel=9),
+    "op.equalize": ImageProcessingParams(equalize=True),
+    "op.stretch": ImageProcessingParams(stretch=True),
+    "op.threshold_binary": ImageProcessingParams(threshold=127, threshold_type="binary"),
+    "op.threshold_adaptive": ImageProcessingParams(threshold=127, threshold_type="adaptive_gaussian"),
+    "op.threshold_otsu": ImageProcessingParams(threshold=0, threshold_type="otsu"),
+    "op.edges_canny": ImageProcessingParams(edge_detection="canny"),
+    "op.edges_sobel": ImageProcessingParams(edge_detection="sobel"),
+    "op.edges_laplacian": ImageProcessingParams(edge_detection="laplacian"),
+    "op.normalize": ImageProcessingParams(normalize=True),
+}
+
+
+def make_synthetic_image(megapixels: float, mode: str, seed: int = 0) -> Image.Image:
+    """Smooth gradients plus mild noise: compresses like a photo, not like white noise"""
+    width = int(math.sqrt(megapixels * 1_000_000 * 4 / 3))
+    height = max(1, int(megapixels * 1_000_000 / width))
+    rng = np.random.default_rng(seed)
+
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        127 + 100 * np.sin(xx / (width / 6.0)),
+        127 + 100 * np.cos(yy / (height / 4.0)),
+        255 * (xx + yy) / (width + height),
+    ], axis=-1)
+    base += rng.normal(0, 12, size=base.shape).astype(np.float32)
+    rgb = np.clip(base, 0, 255).astype(np.uint8)
+    del base, xx, yy
+
+    img = Image.fromarray(rgb, mode="RGB")
+    if mode == "L":
+        return img.convert("L")
+    if mode == "RGBA":
+        alpha = Image.linear_gradient("L").resize(img.size)
+        img = img.convert("RGBA")
+        img.putalpha(alpha)
+    return img
+
+
+def encode_image(img: Image.Image, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "JPEG":
+        img.save(buf, format="JPEG", quality=90)
+    else:
+        img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def build_cases(processor: ImageProcessor, img: Image.Image) -> Dict[str, Callable[[bytes], object]]:
+    """Map case name -> callable taking the encoded image bytes"""
+    cases: Dict[str, Callable[[bytes], object]] = {}
+    for name, params in OPERATION_CASES.items():
+        cases[name] = lambda data, p=params: processor.process_image(data, p)
+    half_size = ImageProcessingParams(resize_width=max(1, img.width // 2))
+    cases["op.resize_half"] = lambda data: processor.process_image(data, half_size)
+
+    # Endpoint-equivalent paths (what each route spends inside the processor)
+    typical = ImageProcessingParams(brightness=10, contrast=1.2, blur_type="gaussian", blur_kernel=5)
+    crop_w, crop_h = max(1, img.width // 2), max(1, img.height // 2)
+    cases.update({
+        "endpoint.preprocess": lambda data: processor.process_image(data, typical),
+        "endpoint.histogram": lambda data: processor.get_histogram(data, "all"),
+        "endpoint.histogram_png": lambda data: processor.generate_histogram_image(data, "all"),
+        "endpoint.segment": lambda data: processor.segment_image(data),
+        "endpoint.detect_faces": lambda data: processor.detect_faces(data),
+        "endpoint.crop": lambda data: processor.crop_image(data, img.width // 4, img.height // 4, crop_w, crop_h),
+    })
+    return cases
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0  # Not on Linux: RSS sampling unavailable
+
+
+def _release_free_memory() -> None:
+    """Return freed heap pages to the OS so the next RSS delta isn't hidden by reuse"""
+    gc.collect()
+    libc_name = ctypes.util.find_library("c")
+    if libc_name:
+        try:
+            ctypes.CDLL(libc_name).malloc_trim(0)
+        except (OSError, AttributeError):
+            pass  # Not glibc
+
+
+def measure_peak_memory(func: Callable[[bytes], object], data: bytes) -> Tuple[int, int]:
+    """Run func once and return (tracemalloc peak, sampled RSS growth) in bytes"""
+    _release_free_memory()
+    baseline_rss = _rss_bytes()
+    peak_rss = baseline_rss
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak_rss
+        while not done.is_set():
+            peak_rss = max(peak_rss, _rss_bytes())
+            done.wait(0.001)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    tracemalloc.start()
+    try:
+        func(data)
+        _, traced_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        done.set()
+        sampler.join()
+    return traced_peak, max(0, peak_rss - baseline_rss)
+
+
+def run_case(func: Callable[[bytes], object], data: bytes, megapixels: float,
+             repeat: int, warmup: int) -> Dict[str, float]:
+    for _ in range(warmup):
+        func(data)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        timings.append(time.perf_counter() - start)
+
+    # Peak memory is measured on a separate run so tracing overhead doesn't skew timings
+    traced_peak, rss_peak = measure_peak_memory(func, data)
+
+    p50 = percentile(timings, 50)
+    return {
+        "p50_ms": p50 * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "throughput_ops": 1.0 / p50 if p50 > 0 else float("inf"),
+        "throughput_mpx": megapixels / p50 if p50 > 0 else float("inf"),
+        "peak_traced_mb": traced_peak / (1024 * 1024),
+        "peak_rss_delta_mb": rss_peak / (1024 * 1024),
+        "input_kb": len(data) / 1024,
+    }
+
+
+def run_suite(sizes: List[float], modes: List[str], formats: List[str], only: Optional[str],
+              repeat: int, warmup: int, seed: int) -> Dict[str, Dict]:
+    processor = ImageProcessor()
+    results: Dict[str, Dict] = {}
+
+    for megapixels in sizes:
+        for mode in modes:
+            img = make_synthetic_image(megapixels, mode, seed)
+            for fmt in formats:
+                if fmt == "JPEG" and mode == "RGBA":
+                    continue  # JPEG has no alpha channel
+                data = encode_image(img, fmt)
+                for case_name, func in build_cases(processor, img).items():
+                    if only and only not in case_name:
+                        continue
+                    key = f"{case_name}|{megapixels}MP|{mode}|{fmt}"
+                    try:
+                        results[key] = run_case(func, data, megapixels, repeat, warmup)
+                    except Exception as e:
+                        results[key] = {"error": str(e)}
+                    print(format_row(key, results[key]), flush=True)
+    return results
+
+
+def format_row(key: str, result: Dict) -> str:
+    if "error" in result:
+        return f"{key:<55} ERROR {result['error']}"
+    return (
+        f"{key:<55} p50 {result['p50_ms']:9.1f} ms  p95 {result['p95_ms']:9.1f} ms  "
+        f"{result['throughput_mpx']:8.1f} MP/s  traced {result['peak_traced_mb']:7.1f} MB  "
+        f"rss +{result['peak_rss_delta_mb']:7.1f} MB"
+    )
+
+
+def compare_to_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict],
+                        threshold: float) -> List[Tuple[str, float, float]]:
+    """Return (case, baseline p50, current p50) for every case slower than the threshold"""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous or "error" in current or "error" in previous:
+            continue
+        if current["p50_ms"] > previous["p50_ms"] * (1 + threshold):
+            regressions.append((key, previous["p50_ms"], current["p50_ms"]))
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark ImageProcessor operations across image sizes")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated sizes in megapixels")
+    parser.add_argument("--modes", default=DEFAULT_MODES, help="Comma-separated PIL modes (L, RGB, RGBA)")
+    parser.add_argument("--formats", default=DEFAULT_FORMATS, help="Comma-separated input formats (PNG, JPEG)")
+    parser.add_argument("--only", default=None, help="Only run cases whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed warmup runs per case")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for synthetic image generation")
+    parser.add_argument("--output", default=None, help="Write full results JSON to this path")
+    parser.add_argument("--save-baseline", default=None, help="Save results as the new baseline JSON")
+    parser.add_argument("--baseline", default=None, help="Compare against this baseline JSON")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Allowed p50 slowdown vs baseline before failing (0.15 = 15%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = run_suite(
+        sizes=[float(s) for s in args.sizes.split(",") if s],
+        modes=[m.strip().upper() for m in args.modes.split(",") if m],
+        formats=[f.strip().upper() for f in args.formats.split(",") if f],
+        only=args.only,
+        repeat=max(1, args.repeat),
+        warmup=max(0, args.warmup),
+        seed=args.seed,
+    )
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f).get("results", {})
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}:")
+            for key, before, after in regressions:
+                print(f"  {key}: {before:.1f} ms -> {after:.1f} ms ({after / before - 1:+.0%})")
+            return 1
+        print(f"\nNo regression above {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
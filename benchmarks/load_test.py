@@ -0,0 +1,361 @@
+"""
+Load-test harness for the FastAPI service.
+
+Replays a weighted mix of /preprocess, /histogram, /segment, /detect_faces and
+/crop requests with realistic parameter distributions, stepping through
+increasing client concurrency, and reports throughput, tail latency, error
+rate and server CPU saturation for each step so the knee of the
+throughput/latency curve can be read off per worker configuration.
+
+Targets:
+    --mode inprocess   run the app in this process on a local uvicorn thread (default)
+    --mode spawn       start `uvicorn backend.app.main:app --workers N` as a subprocess
+    --mode url         hit an already running server (--url, optionally --server-pid)
+
+Usage (from the repository root):
+    python -m benchmarks.load_test --concurrency 1,2,4,8 --duration 20
+    python -m benchmarks.load_test --mode spawn --workers 4 --concurrency 1,4,8,16,32
+    python -m benchmarks.load_test --mode url --url http://127.0.0.1:8000 --server-pid 1234
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from benchmarks.bench_image_processor import encode_image, make_synthetic_image, percentile
+
+DEFAULT_MIX = "preprocess=60,histogram=15,segment=10,detect_faces=5,crop=10"
+
+
+# ==================== REQUEST GENERATION ====================
+
+def preprocess_params(rng: random.Random, size: Tuple[int, int]) -> Dict[str, str]:
+    """One editor action, weighted roughly like the Streamlit tabs are used"""
+    width, height = size
+    choice = rng.choices(
+        ["adjust", "blur", "threshold", "resize", "geometry", "edges", "convert"],
+        weights=[25, 20, 10, 15, 10, 10, 10],
+    )[0]
+    if choice == "adjust":
+        return {"brightness": str(rng.randint(-40, 40)), "contrast": f"{rng.uniform(0.7, 1.6):.1f}"}
+    if choice == "blur":
+        return {"blur_type": rng.choice(["gaussian", "gaussian", "median", "bilateral"]),
+                "blur_kernel": str(rng.choice([3, 5, 5, 7, 9, 15]))}
+    if choice == "threshold":
+        return {"threshold": str(rng.randint(60, 200)),
+                "threshold_type": rng.choice(["binary", "binary_inv", "otsu", "adaptive_mean"])}
+    if choice == "resize":
+        scale = rng.choice([0.25, 0.5, 0.5, 0.75, 1.5])
+        return {"resize_width": str(max(1, int(width * scale))), "resize_height": str(max(1, int(height * scale)))}
+    if choice == "geometry":
+        return {"rotate_angle": str(rng.choice([90, -90, 15, 180])), "flip": rng.choice(["", "horizontal", "vertical"])}
+    if choice == "edges":
+        return {"edge_detection": rng.choice(["canny", "canny", "sobel", "laplacian"])}
+    return {"grayscale": "true", "equalize": rng.choice(["true", "false"])}
+
+
+def build_request(endpoint: str, rng: random.Random, size: Tuple[int, int]) -> Dict[str, str]:
+    width, height = size
+    if endpoint == "preprocess":
+        return preprocess_params(rng, size)
+    if endpoint == "histogram":
+        return {"channel": rng.choice(["all", "all", "red", "green", "blue", "gray"]),
+                "download": "true" if rng.random() < 0.2 else "false"}
+    if endpoint == "crop":
+        crop_w = rng.randint(max(1, width // 5), width)
+        crop_h = rng.randint(max(1, height // 5), height)
+        return {"x": str(rng.randint(0, width - crop_w)), "y": str(rng.randint(0, height - crop_h)),
+                "width": str(crop_w), "height": str(crop_h)}
+    return {}
+
+
+def parse_mix(spec: str) -> Tuple[List[str], List[float]]:
+    endpoints, weights = [], []
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip():
+            endpoints.append(name.strip())
+            weights.append(float(weight or 1))
+    return endpoints, weights
+
+
+# ==================== SERVER CPU ACCOUNTING ====================
+
+def _proc_cpu_seconds(pid: int) -> float:
+    """utime + stime of a process and its direct children (uvicorn workers), from /proc"""
+    ticks = os.sysconf("SC_CLK_TCK")
+    total = 0.0
+    pids = [pid]
+    try:
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        fields = f.read().rsplit(")", 1)[1].split()
+                    if int(fields[1]) == pid:
+                        pids.append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    continue
+        for p in pids:
+            try:
+                with open(f"/proc/{p}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                total += (int(fields[11]) + int(fields[12])) / ticks
+            except (OSError, IndexError, ValueError):
+                continue
+    except OSError:
+        pass
+    return total
+
+
+class CpuMeter:
+    """Measures server CPU seconds, either of a pid tree or of this whole process"""
+
+    def __init__(self, pid: Optional[int]):
+        self.pid = pid
+
+    def read(self) -> Optional[float]:
+        if self.pid is None:
+            times = os.times()
+            return times.user + times.system
+        if not os.path.exists(f"/proc/{self.pid}"):
+            return None
+        return _proc_cpu_seconds(self.pid)
+
+
+# ==================== TARGETS ====================
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_healthy(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become healthy within {timeout:.0f}s")
+
+
+def start_inprocess_server() -> Tuple[str, Callable[[], None]]:
+    import uvicorn
+    from backend.app.main import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{port}"
+    _wait_until_healthy(base_url)
+
+    def stop():
+        server.should_exit = True
+        thread.join(timeout=10)
+    return base_url, stop
+
+
+def start_spawned_server(workers: int) -> Tuple[str, int, Callable[[], None]]:
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app.main:app",
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_until_healthy(base_url)
+    except RuntimeError:
+        proc.terminate()
+        raise
+
+    def stop():
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return base_url, proc.pid, stop
+
+
+# ==================== LOAD GENERATION ====================
+
+def run_step(base_url: str, images: List[Tuple[bytes, str, Tuple[int, int]]], endpoints: List[str],
+             weights: List[float], concurrency: int, duration: float, timeout: float,
+             cpu_meter: Optional[CpuMeter], seed: int) -> Dict:
+    """Closed-loop load: `concurrency` clients each issue requests back to back for `duration` seconds"""
+    latencies: Dict[str, List[float]] = {name: [] for name in endpoints}
+    errors: Dict[str, int] = {name: 0 for name in endpoints}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(index: int):
+        rng = random.Random(seed * 1000 + index)
+        session = requests.Session()
+        while time.perf_counter() < stop_at:
+            endpoint = rng.choices(endpoints, weights=weights)[0]
+            data, mime, size = rng.choice(images)
+            form = build_request(endpoint, rng, size)
+            start = time.perf_counter()
+            ok = False
+            try:
+                response = session.post(
+                    f"{base_url}/api/{endpoint}",
+                    files={"file": ("image", data, mime)},
+                    data=form,
+                    timeout=timeout,
+                )
+                ok = response.status_code == 200
+            except requests.exceptions.RequestException:
+                pass
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies[endpoint].append(elapsed)
+                else:
+                    errors[endpoint] += 1
+        session.close()
+
+    cpu_before = cpu_meter.read() if cpu_meter else None
+    wall_start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall_start
+    cpu_after = cpu_meter.read() if cpu_meter else None
+
+    all_latencies = [v for values in latencies.values() for v in values]
+    total_errors = sum(errors.values())
+    total = len(all_latencies) + total_errors
+    cpu_saturation = None
+    if cpu_before is not None and cpu_after is not None and wall > 0:
+        cpu_saturation = (cpu_after - cpu_before) / (wall * (os.cpu_count() or 1))
+
+    def summary(values: List[float]) -> Dict[str, Optional[float]]:
+        if not values:
+            return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+        return {
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput_rps": len(all_latencies) / wall if wall > 0 else 0.0,
+        "error_rate": total_errors / total if total else 0.0,
+        "cpu_saturation": cpu_saturation,
+        **summary(all_latencies),
+        "per_endpoint": {
+            name: {"ok": len(latencies[name]), "errors": errors[name], **summary(latencies[name])}
+            for name in endpoints
+        },
+    }
+
+
+def find_knee(steps: List[Dict], min_gain: float) -> Optional[int]:
+    """Concurrency after which adding clients no longer buys `min_gain` more throughput"""
+    for previous, current in zip(steps, steps[1:]):
+        if previous["throughput_rps"] <= 0:
+            continue
+        if current["throughput_rps"] / previous["throughput_rps"] - 1 < min_gain:
+            return previous["concurrency"]
+    return None
+
+
+def format_step(step: Dict) -> str:
+    def ms(value):
+        return f"{value:8.1f}" if value is not None else "     n/a"
+    cpu = f"{step['cpu_saturation']:6.0%}" if step["cpu_saturation"] is not None else "   n/a"
+    return (
+        f"c={step['concurrency']:<4} {step['throughput_rps']:8.2f} req/s  "
+        f"p50 {ms(step['p50_ms'])} ms  p95 {ms(step['p95_ms'])} ms  p99 {ms(step['p99_ms'])} ms  "
+        f"errors {step['error_rate']:6.1%}  cpu {cpu}"
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load-test the image processing API at increasing concurrency")
+    parser.add_argument("--mode", choices=["inprocess", "spawn", "url"], default="inprocess")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL for --mode url (without /api)")
+    parser.add_argument("--server-pid", type=int, default=None, help="Server pid for CPU accounting in --mode url")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for --mode spawn")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted endpoint mix, e.g. preprocess=60,crop=10")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="Comma-separated client counts to step through")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per concurrency step")
+    parser.add_argument("--sizes", default="0.3,2", help="Comma-separated upload sizes in megapixels")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--knee-gain", type=float, default=0.10,
+                        help="Minimum relative throughput gain per step before declaring the knee")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write results JSON to this path")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    endpoints, weights = parse_mix(args.mix)
+
+    images = []
+    for i, megapixels in enumerate(float(s) for s in args.sizes.split(",") if s):
+        img = make_synthetic_image(megapixels, "RGB", seed=args.seed + i)
+        images.append((encode_image(img, "JPEG"), "image/jpeg", img.size))
+        images.append((encode_image(img, "PNG"), "image/png", img.size))
+
+    stop = None
+    server_pid: Optional[int] = None
+    if args.mode == "inprocess":
+        base_url, stop = start_inprocess_server()
+        print("Server: in-process uvicorn (CPU figures include the load generator threads)")
+    elif args.mode == "spawn":
+        base_url, server_pid, stop = start_spawned_server(args.workers)
+        print(f"Server: uvicorn subprocess with {args.workers} worker(s), pid {server_pid}")
+    else:
+        base_url, server_pid = args.url.rstrip("/"), args.server_pid
+        _wait_until_healthy(base_url, timeout=5)
+        print(f"Server: {base_url}" + ("" if server_pid else " (no --server-pid: CPU not measured)"))
+
+    cpu_meter = CpuMeter(server_pid) if (server_pid or args.mode == "inprocess") else None
+
+    steps = []
+    try:
+        for concurrency in (int(c) for c in args.concurrency.split(",") if c):
+            step = run_step(base_url, images, endpoints, weights, concurrency,
+                            args.duration, args.timeout, cpu_meter, args.seed)
+            steps.append(step)
+            print(format_step(step), flush=True)
+    finally:
+        if stop:
+            stop()
+
+    knee = find_knee(steps, args.knee_gain)
+    if knee is not None:
+        print(f"\nKnee: throughput stops growing by {args.knee_gain:.0%}+ beyond concurrency {knee}")
+    else:
+        print("\nNo knee found in the tested range: try higher concurrency")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"mode": args.mode, "workers": args.workers, "mix": args.mix,
+                       "knee_concurrency": knee, "steps": steps}, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -61,10 +61,10 @@ if st.session_state.current_image is not None:
             # Réinitialiser l'état pour revenir à l'accueil
             st.session_state.current_image = None
             st.session_state.original_image = None
-            st.session_state.history = []
+            st.session_state.history.clear()
             st.session_state.history_index = 0
             st.session_state.operations_count = 0
-            st.session_state.gallery = []
+            st.session_state.gallery.clear()
             #scroll to the header
             st.session_state.scroll_to_header = True 
             scroll_to_here(0, key='header')  # Scroll to the header of the page
@@ -0,0 +1,123 @@
+import json
+import streamlit as st
+from services.batch import BATCH_CONCURRENCY, BATCH_MAX_FILES, DONE, FAILED, PENDING, RUNNING, run_batch
+from services.presets import load_presets, preset_endpoint
+from utils.helpers import operation_name
+
+STATUS_LABELS = {
+    PENDING: "⏳ En attente",
+    RUNNING: "⚙️ En cours",
+    DONE: "✅ Traité",
+    FAILED: "❌ Erreur",
+}
+
+
+def _status_rows(run) -> list:
+    """Une ligne par fichier pour le tableau de suivi"""
+    return [{
+        "Fichier": item.name,
+        "État": STATUS_LABELS[item.status],
+        "Durée (s)": round(item.seconds, 2) if item.seconds is not None else None,
+        "Taille (Ko)": round(item.output_size / 1024, 1) if item.output_size else None,
+        "Détail": item.error or item.output_name or "",
+    } for item in run.items]
+
+
+def _render_stats(run, container) -> None:
+    stats = run.stats()
+    with container.container():
+        col_s1, col_s2, col_s3, col_s4 = st.columns(4)
+        col_s1.metric("Traités", f"{stats['done']}/{stats['total']}")
+        col_s2.metric("Erreurs", stats['failed'])
+        col_s3.metric("Débit", f"{stats['images_per_second']:.1f} img/s")
+        col_s4.metric("Envoyé", f"{stats['mb_per_second']:.1f} Mo/s")
+
+
+def _batch_source():
+    """(endpoint, données, libellé) du traitement choisi, ou None s'il n'y a rien à appliquer"""
+    presets = load_presets()
+    queue = st.session_state.operation_queue
+    sources = []
+    if presets:
+        sources.append("🎨 Preset")
+    if queue:
+        sources.append(f"🧾 File d'opérations ({len(queue)})")
+    if not sources:
+        st.info("Enregistrez un preset ou mettez des opérations en file pour les appliquer à un lot.")
+        return None
+
+    source = st.radio("Traitement", sources, horizontal=True, key="batch_source")
+    if source == "🎨 Preset":
+        name = st.selectbox("Preset à appliquer", list(presets), key="batch_preset")
+        st.caption(f"Plan: {' → '.join(presets[name]['plan'])}")
+        return preset_endpoint(name, "apply"), {}, f"Preset {name}"
+    st.caption(" → ".join(operation_name(params) for params in queue))
+    return "pipeline", {"steps": json.dumps(queue)}, f"File de {len(queue)} opération(s)"
+
+
+def render_batch():
+    """Traitement par lots: un traitement appliqué par le backend à plusieurs fichiers, en parallèle"""
+    st.markdown("### ⚡ Traitement par lots")
+
+    batch_files = st.file_uploader(
+        "Sélectionnez plusieurs images",
+        type=['png', 'jpg', 'jpeg', 'bmp', 'tiff', 'webp'],
+        accept_multiple_files=True,
+        help=f"Jusqu'à {BATCH_MAX_FILES} images, envoyées telles quelles au backend",
+        key="batch_files"
+    )
+    source = _batch_source()
+
+    if batch_files:
+        if len(batch_files) > BATCH_MAX_FILES:
+            st.warning(f"⚠️ {len(batch_files)} images sélectionnées: seules les {BATCH_MAX_FILES} premières seront traitées")
+            batch_files = batch_files[:BATCH_MAX_FILES]
+        total_mb = sum(file.size for file in batch_files) / (1024 * 1024)
+        st.info(f"{len(batch_files)} image(s) sélectionnée(s) ({total_mb:.1f} Mo), "
+                f"{BATCH_CONCURRENCY} traitée(s) en parallèle")
+
+        if st.button("🚀 Lancer le traitement batch", type="primary", use_container_width=True,
+                     disabled=source is None):
+            endpoint, data, label = source
+            files = [(file.name, file.getvalue(), file.type or 'application/octet-stream') for file in batch_files]
+            progress_bar = st.progress(0.0, text="Envoi des fichiers...")
+            stats_placeholder = st.empty()
+            table_placeholder = st.empty()
+
+            def report(run):
+                stats = run.stats()
+                progress_bar.progress(stats['done'] / stats['total'],
+                                      text=f"{stats['done']}/{stats['total']} fichier(s) traité(s)")
+                _render_stats(run, stats_placeholder)
+                table_placeholder.dataframe(_status_rows(run), hide_index=True, use_container_width=True)
+
+            st.session_state.batch_result = None  # Libère l'archive du lot précédent
+            st.session_state.batch_result = run_batch(files, endpoint, data, label, progress=report)
+            progress_bar.empty()
+            stats_placeholder.empty()
+            table_placeholder.empty()
+
+    run = st.session_state.batch_result
+    if run is None:
+        return
+
+    stats = run.stats()
+    st.markdown(f"#### 📋 Dernier lot: {run.label}")
+    _render_stats(run, st.empty())
+    st.caption(f"Durée totale: {stats['elapsed']:.1f} s")
+    if stats['failed']:
+        st.warning(f"⚠️ {stats['failed']} fichier(s) en erreur: voir le détail ci-dessous")
+    with st.expander("📋 Détails des résultats", expanded=bool(stats['failed'])):
+        st.dataframe(_status_rows(run), hide_index=True, use_container_width=True)
+
+    if run.count(DONE):
+        with open(run.zip_path, "rb") as zip_file:
+            st.download_button(
+                label=f"📦 Télécharger le lot ({run.count(DONE)} image(s), ZIP)",
+                data=zip_file,
+                file_name="lot_traite.zip",
+                mime="application/zip",
+                key="dl_batch_zip",
+                type="primary",
+                use_container_width=True
+            )
@@ -328,8 +328,8 @@ def render_crop():
         if st.button("🔄 Réinitialiser", 
                     use_container_width=True,
                     help="Rétablir l'image originale"):
-            st.session_state.current_image = st.session_state.original_image.copy()
-            st.session_state.history = []
+            st.session_state.current_image = st.session_state.original_image
+            st.session_state.history.clear()
             st.session_state.history_index = 0
             st.rerun()
 
@@ -365,21 +365,10 @@ def apply_crop_direct(cropped_image: Image.Image):
 def apply_crop(x: int, y: int, width: int, height: int):
     """Applique le cropping via l'API"""
     try:
-        from utils.helpers import image_to_bytes
         from components.history import add_to_history
-        
-        # Récupérer l'URL de l'API
-        try:
-            api_url = st.secrets["api_url"]
-        except Exception:
-            import os
-            api_url = os.environ.get("API_URL", "http://localhost:8000/api")
+        from services.api_client import post_image, decode_image_response
         
         # Préparer les données
-        files = {
-            'file': ('image.png', image_to_bytes(st.session_state.current_image), 'image/png')
-        }
-        
         params = {
             'x': str(x),
             'y': str(y),
@@ -388,16 +377,11 @@ def apply_crop(x: int, y: int, width: int, height: int):
         }
         
         with st.spinner("✂️ Application du crop..."):
-            response = requests.post(
-                f"{api_url}/crop",
-                files=files,
-                data=params,
-                timeout=30
-            )
+            response = post_image("crop", st.session_state.current_image, params)
             
             if response.status_code == 200:
                 # Charger l'image cropée
-                cropped_image = Image.open(io.BytesIO(response.content))
+                cropped_image = decode_image_response(response)
                 
                 # Mettre à jour l'état et l'historique
                 st.session_state.current_image = cropped_image
@@ -409,7 +393,8 @@ def apply_crop(x: int, y: int, width: int, height: int):
                         'y': y,
                         'width': width,
                         'height': height
-                    }
+                    },
+                    {"endpoint": "crop", "data": params}
                 )
                 st.session_state.operations_count += 1
                 
@@ -1,46 +1,45 @@
 import streamlit as st
-from datetime import datetime
-from utils.helpers import image_to_bytes
+from components.history import start_history
 
 def render_gallery():
-    if st.session_state.gallery:
+    gallery = st.session_state.gallery
+    if len(gallery):
         st.markdown("### 🖼️ Galerie")
+        if len(gallery) >= gallery.max_items:
+            st.warning(f"⚠️ Galerie pleine ({gallery.max_items} images): les nouveaux envois n'y seront pas ajoutés")
         
         search_term = st.text_input("🔍 Rechercher", placeholder="Nom de l'image...")
         
-        filtered_gallery = [img for img in st.session_state.gallery 
-                          if search_term.lower() in img['name'].lower()] if search_term else st.session_state.gallery
+        filtered_gallery = gallery.search(search_term)
         
-        for idx, item in enumerate(filtered_gallery[:10]):  # Limite à 10 pour la performance
-            col_gal1, col_gal2, col_gal3 = st.columns([3, 1, 1])
+        for item in filtered_gallery[:10]:  # Limite à 10 pour la performance
+            col_gal0, col_gal1, col_gal2, col_gal3 = st.columns([1, 3, 1, 1])
+            
+            with col_gal0:
+                # Miniature gardée en session: l'original reste sur disque
+                st.image(item.thumbnail, use_container_width=True)
             
             with col_gal1:
-                if st.button(f"📷 {item['name'][:25]}", 
-                           key=f"gal_btn_{idx}",
+                if st.button(f"📷 {item.name[:25]}", 
+                           key=f"gal_btn_{item.digest}",
                            use_container_width=True):
-                    st.session_state.original_image = item['image'].copy()
-                    st.session_state.current_image = item['image'].copy()
-                    st.session_state.history = [{
-                        'image': item['image'].copy(),
-                        'operation': 'Original',
-                        'params': {},
-                        'timestamp': datetime.now(),
-                        'preview': image_to_bytes(item['image'].resize((150, 150), 1))
-                    }]
-                    st.session_state.history_index = 0
+                    image = gallery.load(item)
+                    st.session_state.original_image = image
+                    st.session_state.current_image = image
+                    start_history(image)
                     st.rerun()
             
             with col_gal2:
-                if st.button("⭐", key=f"fav_{idx}", 
+                if st.button("⭐", key=f"fav_{item.digest}", 
                            help="Ajouter aux favoris",
                            use_container_width=True):
-                    if item['name'] not in st.session_state.favorites:
-                        st.session_state.favorites.append(item['name'])
+                    if item.name not in st.session_state.favorites:
+                        st.session_state.favorites.append(item.name)
                         st.success("✓ Ajouté aux favoris")
             
             with col_gal3:
-                if st.button("🗑️", key=f"del_{idx}",
+                if st.button("🗑️", key=f"del_{item.digest}",
                            help="Supprimer",
                            use_container_width=True):
-                    st.session_state.gallery.pop(idx)
+                    gallery.remove(item.digest)
                     st.rerun()
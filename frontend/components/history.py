@@ -1,59 +1,76 @@
 import streamlit as st
 from datetime import datetime
-from utils.helpers import image_to_bytes
+from utils.thumbnails import thumbnail_bytes
 from PIL import Image
 
-def add_to_history(image: Image.Image, operation: str, params: dict = None):
-    """Ajoute une image à l'historique avec métadonnées"""
+def add_to_history(image: Image.Image, operation: str, params: dict = None, recipe: dict = None):
+    """Ajoute une image à l'historique avec métadonnées
+
+    `recipe` ({endpoint, data}) décrit comment rejouer l'étape depuis la
+    précédente; sans recette, l'étape garde toujours ses pixels.
+    """
     timestamp = datetime.now()
     
     if st.session_state.history_index < len(st.session_state.history) - 1:
-        st.session_state.history = st.session_state.history[:st.session_state.history_index + 1]
-    
-    history_entry = {
-        'image': image.copy(),
-        'operation': operation,
-        'params': params or {},
-        'timestamp': timestamp,
-        'preview': image_to_bytes(image.resize((150, 150), Image.LANCZOS))
-    }
+        st.session_state.history.truncate(st.session_state.history_index + 1)
     
-    st.session_state.history.append(history_entry)
+    # Les images ne sont jamais modifiées sur place: l'historique et l'image
+    # courante partagent le même objet (et donc ses octets encodés en cache)
+    st.session_state.history.append(
+        image,
+        operation,
+        params or {},
+        timestamp,
+        thumbnail_bytes(image),
+        recipe
+    )
     st.session_state.history_index = len(st.session_state.history) - 1
-    st.session_state.current_image = image.copy()
+    st.session_state.current_image = image
     st.session_state.operations_count += 1
 
+def _go_to(index: int) -> bool:
+    """Se place sur une étape (reconstruite si besoin avant de changer l'état)"""
+    try:
+        image = st.session_state.history[index]['image']
+    except Exception as e:
+        st.error(f"⚠️ Impossible de reconstruire l'étape {index}: {str(e)}")
+        return False
+    st.session_state.history_index = index
+    st.session_state.current_image = image
+    return True
+
 def undo():
     """Annule la dernière opération"""
     if st.session_state.history_index > 0:
-        st.session_state.history_index -= 1
-        st.session_state.current_image = st.session_state.history[st.session_state.history_index]['image'].copy()
-        return True
+        return _go_to(st.session_state.history_index - 1)
     return False
 
 def redo():
     """Rétablit l'opération suivante"""
     if st.session_state.history_index < len(st.session_state.history) - 1:
-        st.session_state.history_index += 1
-        st.session_state.current_image = st.session_state.history[st.session_state.history_index]['image'].copy()
-        return True
+        return _go_to(st.session_state.history_index + 1)
     return False
 
 def reset_to_original():
     """Réinitialise à l'image originale"""
     if st.session_state.original_image:
-        st.session_state.current_image = st.session_state.original_image.copy()
-        st.session_state.history = [{
-            'image': st.session_state.original_image.copy(),
-            'operation': 'Original',
-            'params': {},
-            'timestamp': st.session_state.session_start,
-            'preview': image_to_bytes(st.session_state.original_image.resize((150, 150), Image.LANCZOS))
-        }]
-        st.session_state.history_index = 0
+        st.session_state.current_image = st.session_state.original_image
+        start_history(st.session_state.original_image, st.session_state.session_start)
         return True
     return False
 
+def start_history(image: Image.Image, timestamp: datetime = None):
+    """Repart d'un historique ne contenant que l'image d'origine"""
+    st.session_state.history.clear()
+    st.session_state.history.append(
+        image,
+        'Original',
+        {},
+        timestamp or datetime.now(),
+        thumbnail_bytes(image)
+    )
+    st.session_state.history_index = 0
+
 def render_history():
     if st.session_state.history:
         st.markdown("### 📜 Historique des opérations")
@@ -1,24 +1,145 @@
 import streamlit as st
-import numpy as np
 import plotly.graph_objects as go
 from PIL import Image
 from datetime import datetime
-import io
-from utils.helpers import create_split_view, image_to_bytes
+import os
+import tempfile
+import weakref
+from utils.helpers import create_split_view, image_to_bytes, operation_name
+from utils.image_metrics import overview_metrics
 from utils.visualization import display_histogram
-from services.api_client import apply_operation
+from utils.histogram_data import histogram_data
+from services.api_client import apply_operation, apply_pipeline
+from services.async_client import fetch_histograms
+from services.presets import apply_preset, delete_preset, load_presets, save_preset
+from services.exports import cached_step_export, step_export, step_file_name, write_history_zip
 from components.history import add_to_history
 from components.crop import render_crop
+from components.batch import render_batch
+
+HISTOGRAM_CHANNELS = ["all", "red", "green", "blue"]
+
+def _memoized(name: str, images: list, extra, compute):
+    """Résultat de compute() gardé en session tant que les images (mêmes objets) et `extra` ne changent pas"""
+    cached = st.session_state.get(name)
+    if (cached and cached['extra'] == extra and len(cached['refs']) == len(images)
+            and all(ref() is image for ref, image in zip(cached['refs'], images))):
+        return cached['value']
+    value = compute()
+    st.session_state[name] = {'refs': [weakref.ref(image) for image in images], 'extra': extra, 'value': value}
+    return value
+
+def _overview_metrics() -> dict:
+    """Métriques de la vue d'ensemble, calculées une fois par paire (originale, courante)"""
+    history = st.session_state.history
+    return _memoized(
+        'overview_metrics',
+        [st.session_state.original_image, st.session_state.current_image],
+        len(history),
+        lambda: overview_metrics(
+            st.session_state.original_image,
+            st.session_state.current_image,
+            [item['operation'] for item in history]
+        )
+    )
+
+def _histogram_pngs():
+    """PNG des histogrammes (tous les canaux) de l'image courante et de l'originale
+
+    Une requête /histograms par image, envoyées en parallèle; le résultat est
+    gardé en session tant que les images ne changent pas.
+    """
+    images = {"current": st.session_state.current_image}
+    original = st.session_state.get('original_image')
+    if original is not None and original is not st.session_state.current_image:
+        images["original"] = original
+    def fetch():
+        with st.spinner("⏳ Génération des histogrammes..."):
+            return fetch_histograms(images, HISTOGRAM_CHANNELS)
+    return _memoized('histogram_pngs', list(images.values()), tuple(images), fetch)
+
+def _submit(params: dict):
+    """Applique une opération /preprocess, ou la met en file d'attente en mode file"""
+    if st.session_state.queue_mode:
+        st.session_state.operation_queue.append(params)
+        st.toast(f"➕ {operation_name(params)} ajouté à la file", icon="🧾")
+    else:
+        apply_operation(st.session_state.current_image, "preprocess", params, on_success_callback)
+
+def _render_operation_queue():
+    """File d'opérations: exécutées en une seule requête /pipeline, chaque étape gardée dans l'historique"""
+    queue = st.session_state.operation_queue
+    with st.expander(f"🧾 File d'opérations ({len(queue)})", expanded=bool(queue)):
+        st.toggle("Mettre les opérations en file au lieu de les appliquer", key="queue_mode",
+                  help="Les boutons « Appliquer » ajoutent l'opération à la file; "
+                       "la file est ensuite envoyée au backend en une seule requête")
+        for idx, params in enumerate(queue):
+            col_q1, col_q2 = st.columns([5, 1])
+            with col_q1:
+                st.caption(f"{idx + 1}. {operation_name(params)}")
+            with col_q2:
+                if st.button("✖", key=f"queue_del_{idx}", help="Retirer de la file"):
+                    queue.pop(idx)
+                    st.rerun()
+        if queue:
+            col_run, col_clear = st.columns(2)
+            with col_run:
+                if st.button(f"▶️ Exécuter la file ({len(queue)})", type="primary", use_container_width=True):
+                    apply_pipeline(st.session_state.current_image, list(queue), on_pipeline_success)
+            with col_clear:
+                if st.button("🗑️ Vider la file", use_container_width=True):
+                    queue.clear()
+                    st.rerun()
+
+def _render_presets():
+    """Presets du backend: la file enregistrée sous un nom, puis appliquée en une requête (plan précompilé)"""
+    presets = load_presets()
+    queue = st.session_state.operation_queue
+    with st.expander(f"🎨 Presets ({len(presets)})"):
+        if queue:
+            col_name, col_save = st.columns([3, 2])
+            with col_name:
+                preset_name = st.text_input("Nom du preset", placeholder="Ex: 'Contraste élevé'",
+                                            key="preset_name", label_visibility="collapsed")
+            with col_save:
+                if st.button("💾 Enregistrer la file", use_container_width=True, disabled=not preset_name):
+                    if save_preset(preset_name, list(queue)) is not None:
+                        st.toast(f"💾 Preset '{preset_name}' enregistré", icon="🎨")
+        else:
+            st.caption("Mettez des opérations en file pour les enregistrer comme preset.")
+
+        if presets:
+            col_select, col_apply, col_delete = st.columns([3, 2, 1])
+            with col_select:
+                selected = st.selectbox("Preset", list(presets), key="preset_selected", label_visibility="collapsed")
+            preset = presets[selected]
+            with col_apply:
+                if st.button("▶️ Appliquer", type="primary", use_container_width=True, key="preset_apply"):
+                    apply_preset(st.session_state.current_image, preset, on_preset_success)
+            with col_delete:
+                if st.button("🗑️", key="preset_delete", help="Supprimer le preset"):
+                    delete_preset(selected)
+                    st.rerun()
+            if preset.get("description"):
+                st.caption(preset["description"])
+            st.caption(f"Plan: {' → '.join(preset['plan'])}")
+        if st.button("🔄 Rafraîchir", key="preset_refresh"):
+            load_presets(refresh=True)
+            st.rerun()
 
 def render_image_view():
     if st.session_state.current_image is not None:
+        _render_operation_queue()
+        _render_presets()
+
         # Navigation par onglets (styles appliqués via styles.py)
-        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+        tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
             "🏠 Vue d'ensemble",
             "✂️ Cropping",
             "🎨 Prétraitement",
             "🔧 Transformations", 
             "📊 Analyse",
+            "⚡ Lots",
             "💾 Export"
         ])
         
@@ -48,24 +169,20 @@ def render_image_view():
                     st.write(f"🔸 Hauteur: {st.session_state.original_image.size[1]} px")
                     st.write(f"🔸 Mode: {st.session_state.original_image.mode}")
                 
+                metrics = _overview_metrics()
+                
                 # Comparaison avec original
                 with st.container(border=True):
                     st.markdown("**Comparaison**")
-                    original_pixels = st.session_state.original_image.size[0] * st.session_state.original_image.size[1]
-                    current_pixels = st.session_state.current_image.size[0] * st.session_state.current_image.size[1]
-                    
                     #if current_pixels != original_pixels:
-                    reduction = ((original_pixels - current_pixels) / original_pixels) * 100
-                    st.write(f"📉 Réduction: {reduction:.1f}%")
+                    st.write(f"📉 Réduction: {metrics['reduction']:.1f}%")
                     #else:
                     #    st.write(f"📊 Taille inchangée")
                 
                 # Historique
                 with st.container(border=True):
                     st.markdown("**Historique**")
-                    operations_applied = len([h for h in st.session_state.history 
-                                            if h['operation'] != 'Original'])
-                    st.write(f"✂️ Opérations: {operations_applied}")
+                    st.write(f"✂️ Opérations: {metrics['operations']}")
                     st.write(f"📍 Position: {st.session_state.history_index + 1}/{len(st.session_state.history)}")
             
             # Métriques détaillées en dessous
@@ -75,29 +192,22 @@ def render_image_view():
             col_met1, col_met2, col_met3, col_met4 = st.columns(4)
             
             with col_met1:
-                original_pixels = st.session_state.original_image.size[0] * st.session_state.original_image.size[1]
-                current_pixels = st.session_state.current_image.size[0] * st.session_state.current_image.size[1]
-                st.metric("Pixels", f"{current_pixels:,}", 
-                         delta=f"{(current_pixels - original_pixels):+,}")
+                st.metric("Pixels", f"{metrics['current_pixels']:,}", 
+                         delta=f"{(metrics['current_pixels'] - metrics['original_pixels']):+,}")
             
             with col_met2:
-                # Calcul de la différence moyenne
-                original_arr = np.array(st.session_state.original_image.convert('RGB'))
-                current_arr = np.array(st.session_state.current_image.convert('RGB'))
-                if original_arr.shape == current_arr.shape:
-                    diff = np.abs(original_arr.astype(float) - current_arr.astype(float)).mean()
-                    st.metric("Différence", f"{diff:.1f}%")
+                # Différence moyenne (sur une copie réduite pour les grandes images)
+                if metrics['difference'] is not None:
+                    st.metric("Différence", f"{metrics['difference']:.1f}%")
                 else:
                     st.metric("Différence", "N/A")
             
             with col_met3:
-                operations_applied = len([h for h in st.session_state.history 
-                                        if h['operation'] != 'Original'])
-                st.metric("Opérations", operations_applied)
+                st.metric("Opérations", metrics['operations'])
             
             with col_met4:
-                file_size_kb = len(image_to_bytes(st.session_state.current_image)) / 1024
-                st.metric("Taille estimée", f"{file_size_kb:.1f} KB")
+                file_size_kb = metrics['size_bytes'] / 1024
+                st.metric("Taille estimée", f"{file_size_kb:.1f} KB" if metrics['size_exact'] else f"~{file_size_kb:.1f} KB")
             
             # Comparaison Avant/Après
             """st.markdown("---")
@@ -148,7 +258,7 @@ def render_image_view():
                             'equalize': str(equalize).lower(),
                             'normalize': str(normalize).lower()
                         }
-                        apply_operation(st.session_state.current_image, "preprocess", params, on_success_callback)
+                        _submit(params)
             
             with st.expander("🎯 Seuillage", expanded=True):
                 col_thresh1, col_thresh2 = st.columns(2)
@@ -178,7 +288,7 @@ def render_image_view():
                             'threshold': str(threshold_value),
                             'threshold_type': threshold_type
                         }
-                        apply_operation(st.session_state.current_image, "preprocess", params, on_success_callback)
+                        _submit(params)
             
             with st.expander("🌫️ Filtres", expanded=True):
                 col_filt1, col_filt2 = st.columns(2)
@@ -208,7 +318,7 @@ def render_image_view():
                             'blur_type': blur_type,
                             'blur_kernel': str(blur_kernel)
                         }
-                        apply_operation(st.session_state.current_image, "preprocess", params, on_success_callback)
+                        _submit(params)
             
             with st.expander("📐 Redimensionnement", expanded=True):
                 col_res1, col_res2 = st.columns(2)
@@ -255,7 +365,7 @@ def render_image_view():
                             'resize_width': str(new_width),
                             'resize_height': str(new_height)
                         }
-                        apply_operation(st.session_state.current_image, "preprocess", params, on_success_callback)
+                        _submit(params)
         
         # ==================== TAB 4: TRANSFORMATIONS ====================
         with tab4:
@@ -289,7 +399,7 @@ def render_image_view():
                     params['flip'] = flip_type
                 
                 if params:
-                    apply_operation(st.session_state.current_image, "preprocess", params, on_success_callback)
+                    _submit(params)
             
             #with col_trans2:
             st.markdown("---")
@@ -314,7 +424,7 @@ def render_image_view():
                     params['contrast'] = str(contrast)
                 
                 if params:
-                    apply_operation(st.session_state.current_image, "preprocess", params, on_success_callback)
+                    _submit(params)
             
             st.markdown("---")
             # Détection de contours
@@ -343,7 +453,7 @@ def render_image_view():
                         type="primary",
                         use_container_width=True):
                 params = {'edge_detection': edge_method}
-                apply_operation(st.session_state.current_image, "preprocess", params, on_success_callback)
+                _submit(params)
     
         # ==================== TAB 5: ANALYSE ====================
         with tab5:
@@ -371,17 +481,21 @@ def render_image_view():
                 with col_btn1:
                     if st.button("📥 Télécharger histogramme (PNG)", key="download_hist_all"):
                         try:
-                            hist_image = apply_operation(
-                                st.session_state.current_image,
-                                "/histogram",
-                                {"channel": "all", "download": "true"}
-                            )
+                            pngs = _histogram_pngs()
                             st.download_button(
                                 label="💾 Télécharger",
-                                data=hist_image,
+                                data=pngs["current"]["all"],
                                 file_name="histogram_all.png",
                                 mime="image/png"
                             )
+                            if "original" in pngs:
+                                st.download_button(
+                                    label="💾 Télécharger (originale)",
+                                    data=pngs["original"]["all"],
+                                    file_name="histogram_original_all.png",
+                                    mime="image/png",
+                                    key="download_btn_original_all"
+                                )
                             st.success("✅ Histogramme généré avec succès!")
                         except Exception as e:
                             st.error(f"❌ Erreur: {str(e)}")
@@ -390,13 +504,13 @@ def render_image_view():
                 # Afficher les histogrammes par canal séparément
                 tabs_r, g, b = st.tabs(["🔴 Rouge", "🟢 Vert", "🔵 Bleu"])
                 
-                img_array = np.array(st.session_state.current_image.convert('RGB'))
+                hist_data = histogram_data(st.session_state.current_image)
                 
                 with tabs_r:
                     fig_r = go.Figure()
-                    hist_r = np.histogram(img_array[:,:,0].flatten(), bins=256, range=[0, 256])[0]
+                    hist_r = hist_data.channel("red")
                     # Limiter Y au 98e percentile pour lisibilité
-                    y_max_r = float(np.percentile(hist_r, 98) * 1.1)
+                    y_max_r = hist_data.y_max("red")
                     fig_r.add_trace(go.Scatter(
                         x=list(range(256)),
                         y=hist_r,
@@ -430,14 +544,10 @@ def render_image_view():
                     with col_r1:
                         if st.button("📥 Télécharger (Rouge)", key="download_hist_red"):
                             try:
-                                hist_image = apply_operation(
-                                    st.session_state.current_image,
-                                    "/histogram",
-                                    {"channel": "red", "download": "true"}
-                                )
+                                pngs = _histogram_pngs()
                                 st.download_button(
                                     label="💾 Télécharger PNG",
-                                    data=hist_image,
+                                    data=pngs["current"]["red"],
                                     file_name="histogram_red.png",
                                     mime="image/png",
                                     key="download_btn_red"
@@ -447,8 +557,8 @@ def render_image_view():
                 
                 with g:
                     fig_g = go.Figure()
-                    hist_g = np.histogram(img_array[:,:,1].flatten(), bins=256, range=[0, 256])[0]
-                    y_max_g = float(np.percentile(hist_g, 98) * 1.1)
+                    hist_g = hist_data.channel("green")
+                    y_max_g = hist_data.y_max("green")
                     fig_g.add_trace(go.Scatter(
                         x=list(range(256)),
                         y=hist_g,
@@ -482,14 +592,10 @@ def render_image_view():
                     with col_g1:
                         if st.button("📥 Télécharger (Vert)", key="download_hist_green"):
                             try:
-                                hist_image = apply_operation(
-                                    st.session_state.current_image,
-                                    "/histogram",
-                                    {"channel": "green", "download": "true"}
-                                )
+                                pngs = _histogram_pngs()
                                 st.download_button(
                                     label="💾 Télécharger PNG",
-                                    data=hist_image,
+                                    data=pngs["current"]["green"],
                                     file_name="histogram_green.png",
                                     mime="image/png",
                                     key="download_btn_green"
@@ -499,8 +605,8 @@ def render_image_view():
                 
                 with b:
                     fig_b = go.Figure()
-                    hist_b = np.histogram(img_array[:,:,2].flatten(), bins=256, range=[0, 256])[0]
-                    y_max_b = float(np.percentile(hist_b, 98) * 1.1)
+                    hist_b = hist_data.channel("blue")
+                    y_max_b = hist_data.y_max("blue")
                     fig_b.add_trace(go.Scatter(
                         x=list(range(256)),
                         y=hist_b,
@@ -534,14 +640,10 @@ def render_image_view():
                     with col_b1:
                         if st.button("📥 Télécharger (Bleu)", key="download_hist_blue"):
                             try:
-                                hist_image = apply_operation(
-                                    st.session_state.current_image,
-                                    "/histogram",
-                                    {"channel": "blue", "download": "true"}
-                                )
+                                pngs = _histogram_pngs()
                                 st.download_button(
                                     label="💾 Télécharger PNG",
-                                    data=hist_image,
+                                    data=pngs["current"]["blue"],
                                     file_name="histogram_blue.png",
                                     mime="image/png",
                                     key="download_btn_blue"
@@ -552,120 +654,24 @@ def render_image_view():
             st.markdown("---")
             st.markdown("#### 📊 Statistiques")
             
-            # Calculer les statistiques
-            img_array = np.array(st.session_state.current_image.convert('RGB'))
+            # Statistiques déduites des histogrammes (aucun nouveau passage sur les pixels)
+            stats = histogram_data(st.session_state.current_image).stats()
             
             col_stats1, col_stats2 = st.columns(2)
             with col_stats1:
-                st.metric("Moyenne", f"{img_array.mean():.1f}")
-                st.metric("Écart-type", f"{img_array.std():.1f}")
+                st.metric("Moyenne", f"{stats['mean']:.1f}")
+                st.metric("Écart-type", f"{stats['std']:.1f}")
             
             with col_stats2:
-                st.metric("Minimum", f"{img_array.min()}")
-                st.metric("Maximum", f"{img_array.max()}")
+                st.metric("Minimum", f"{stats['min']}")
+                st.metric("Maximum", f"{stats['max']}")
         
-        # ==================== TAB 5: BATCH & PRESETS ====================
-        """with tab5:
-            st.markdown("### ⚡ Traitement par lots et presets")
-            
-            col_batch1, col_batch2 = st.columns(2)
-            
-            with col_batch1:
-                st.markdown("#### 📁 Traitement batch")
-                
-                batch_files = st.file_uploader(
-                    "Sélectionnez plusieurs images",
-                    type=['png', 'jpg', 'jpeg'],
-                    accept_multiple_files=True,
-                    help="Sélectionnez jusqu'à 10 images"
-                )
-                
-                if batch_files and len(batch_files) > 0:
-                    st.info(f"{len(batch_files)} image(s) sélectionnée(s)")
-                    
-                    # Configuration du traitement batch
-                    batch_operation = st.selectbox(
-                        "Opération à appliquer",
-                        ["Conversion niveaux de gris", "Redimensionnement", "Seuillage", "Rotation"]
-                    )
-                    
-                    if st.button("🚀 Lancer le traitement batch", 
-                               type="primary",
-                               use_container_width=True):
-                        progress_bar = st.progress(0)
-                        results = []
-                        
-                        for idx, file in enumerate(batch_files):
-                            try:
-                                # Traiter chaque image
-                                image = Image.open(file)
-                                # Ici, vous ajouteriez l'appel API pour chaque image
-                                results.append({
-                                    'name': file.name,
-                                    'status': 'success',
-                                    'message': 'Traitement réussi'
-                                })
-                                
-                                progress_bar.progress((idx + 1) / len(batch_files))
-                                
-                            except Exception as e:
-                                results.append({
-                                    'name': file.name,
-                                    'status': 'error',
-                                    'message': str(e)
-                                })
-                        
-                        # Afficher les résultats
-                        st.success(f"Traitement terminé : {len([r for r in results if r['status'] == 'success'])}/{len(results)} réussis")
-                        
-                        with st.expander("📋 Détails des résultats"):
-                            for result in results:
-                                emoji = "✅" if result['status'] == 'success' else "❌"
-                                st.write(f"{emoji} {result['name']}: {result['message']}")
-            
-            with col_batch2:
-                st.markdown("#### 💾 Presets sauvegardés")
-                
-                # Gestion des presets
-                preset_name = st.text_input("Nom du preset", 
-                                           placeholder="Ex: 'Contraste élevé'")
-                
-                col_preset1, col_preset2 = st.columns(2)
-                with col_preset1:
-                    if st.button("💾 Sauvegarder preset", 
-                               use_container_width=True,
-                               disabled=not preset_name):
-                        # Ici, vous sauvegarderiez les paramètres actuels
-                        st.success(f"Preset '{preset_name}' sauvegardé!")
-                
-                with col_preset2:
-                    if st.session_state.presets:
-                        selected_preset = st.selectbox(
-                            "Charger un preset",
-                            list(st.session_state.presets.keys())
-                        )
-                        
-                        if st.button("📂 Charger preset",
-                                   use_container_width=True,
-                                   disabled=not selected_preset):
-                            # Charger les paramètres du preset
-                            st.info(f"Preset '{selected_preset}' chargé")
-                
-                # Liste des presets
-                if st.session_state.presets:
-                    st.markdown("**Mes presets:**")
-                    for name, preset in st.session_state.presets.items():
-                        col_p1, col_p2 = st.columns([3, 1])
-                        with col_p1:
-                            st.write(f"• {name}")
-                            st.caption(f"Créé le {preset.get('created_at', 'N/A')}")
-                        with col_p2:
-                            if st.button("🗑️", key=f"del_preset_{name}"):
-                                del st.session_state.presets[name]
-                                st.rerun()
-        """
-        # ==================== TAB 6: EXPORT ====================
+        # ==================== TAB 6: TRAITEMENT PAR LOTS ====================
         with tab6:
+            render_batch()
+        
+        # ==================== TAB 7: EXPORT ====================
+        with tab7:
             st.markdown("### 💾 Exportation et téléchargement")
             
             st.markdown("#### 🖼️ Galerie d'export")
@@ -711,52 +717,59 @@ def render_image_view():
                 for col_idx, history_idx in enumerate(range(start_idx, end_idx)):
                     item = st.session_state.history[history_idx]
                     with cols[col_idx]:
-                        # Miniature
-                        thumb = item['image'].resize((120, 120), Image.LANCZOS)
-                        st.image(thumb, use_container_width=True)
+                        # Miniature (aperçu enregistré: l'étape n'a pas à être décodée)
+                        st.image(item['preview'], use_container_width=True)
                         
                         # Informations
                         st.caption(f"**{item['operation']}**")
                         st.caption(f"Étape {history_idx}")
                         
-                        # Bouton de téléchargement
-                        buf_step = io.BytesIO()
-                        item['image'].save(buf_step, format="PNG")
-                        buf_step.seek(0)
-                        
-                        st.download_button(
-                            label="📥",
-                            data=buf_step,
-                            file_name=f"etape_{history_idx}_{item['operation'].replace(' ', '_')}.png",
-                            mime="image/png",
-                            key=f"dl_step_{history_idx}",
-                            use_container_width=True
-                        )
+                        # Téléchargement: le PNG n'est produit qu'à la demande, puis gardé en cache
+                        data = cached_step_export(item)
+                        if data is None and st.button("📥", key=f"prep_step_{history_idx}",
+                                                      help="Préparer le PNG de cette étape",
+                                                      use_container_width=True):
+                            with st.spinner("Préparation..."):
+                                data = step_export(item)
+                        if data is not None:
+                            st.download_button(
+                                label="💾",
+                                data=data,
+                                file_name=step_file_name(history_idx, item),
+                                mime="image/png",
+                                key=f"dl_step_{history_idx}",
+                                use_container_width=True
+                            )
                 
                 # Télécharger tout l'historique en ZIP
                 if st.button("📦 Télécharger tout l'historique (ZIP)", 
                             use_container_width=True,
                             type="primary"):
-                    import zipfile
-                    
-                    buf_zip = io.BytesIO()
-                    with zipfile.ZipFile(buf_zip, 'w') as zip_file:
-                        for idx, item in enumerate(st.session_state.history):
-                            img_buf = io.BytesIO()
-                            item['image'].save(img_buf, format="PNG")
-                            img_buf.seek(0)
-                            zip_file.writestr(f"etape_{idx}_{item['operation'].replace(' ', '_')}.png", img_buf.getvalue())
-                    
-                    buf_zip.seek(0)
-                    st.download_button(
-                        label="✅ Télécharger ZIP",
-                        data=buf_zip,
-                        file_name="historique_complet.zip",
-                        mime="application/zip",
-                        key="dl_all_zip",
-                        use_container_width=True
-                    )
-                    st.success("✅ ZIP prêt au téléchargement!")
+                    # Archive écrite sur disque au fil de l'encodage parallèle des étapes
+                    progress_bar = st.progress(0.0, text="Encodage des étapes...")
+
+                    def report(done, total):
+                        progress_bar.progress(done / total, text=f"Encodage des étapes... {done}/{total}")
+
+                    try:
+                        with tempfile.TemporaryDirectory(prefix="imageflow-export-") as export_dir:
+                            zip_path = os.path.join(export_dir, "historique_complet.zip")
+                            with open(zip_path, "wb") as zip_file:
+                                write_history_zip(st.session_state.history, zip_file, progress=report)
+                            with open(zip_path, "rb") as zip_file:
+                                st.download_button(
+                                    label="✅ Télécharger ZIP",
+                                    data=zip_file,
+                                    file_name="historique_complet.zip",
+                                    mime="application/zip",
+                                    key="dl_all_zip",
+                                    use_container_width=True
+                                )
+                        progress_bar.empty()
+                        st.success("✅ ZIP prêt au téléchargement!")
+                    except Exception as e:
+                        progress_bar.empty()
+                        st.error(f"❌ Export ZIP impossible: {str(e)}")
                 
                 st.markdown("---")
 
@@ -796,25 +809,19 @@ def render_image_view():
 
 def on_success_callback(result_image, endpoint, params):
     """Callback called when an operation is successful"""
-    # Déterminer le nom de l'opération basé sur les paramètres
-    operation_name = "Opération"
-    
-    if 'grayscale' in params or 'equalize' in params or 'normalize' in params:
-        operation_name = "Conversions couleur"
-    elif 'threshold' in params:
-        operation_name = "Seuillage"
-    elif 'blur_type' in params:
-        operation_name = f"Filtre {params.get('blur_type', 'unknown')}"
-    elif 'resize_width' in params:
-        operation_name = "Redimensionnement"
-    elif 'rotate_angle' in params or 'flip' in params:
-        operation_name = "Transformations géométriques"
-    elif 'brightness' in params or 'contrast' in params:
-        operation_name = "Ajustements visuels"
-    elif 'edge_detection' in params:
-        operation_name = f"Détection {params.get('edge_detection', 'unknown')}"
-    
     # Ajouter à l'historique seulement si le résultat est une Image valide
     if isinstance(result_image, Image.Image):
-        add_to_history(result_image, operation_name, params)
+        add_to_history(result_image, operation_name(params), params, {"endpoint": endpoint, "data": dict(params)})
         st.rerun()  # Force la mise à jour du sidebar
+
+def on_preset_success(result_image, preset, recipe):
+    """Callback d'un preset appliqué: une seule étape d'historique, rejouée avec la spec du preset"""
+    add_to_history(result_image, f"Preset {preset['name']}", {"preset": preset['name']}, recipe)
+    st.rerun()
+
+def on_pipeline_success(images, steps):
+    """Callback d'une file exécutée: chaque étape entre dans l'historique, rejouable seule"""
+    for image, params in zip(images, steps):
+        add_to_history(image, operation_name(params), params, {"endpoint": "preprocess", "data": dict(params)})
+    st.session_state.operation_queue.clear()
+    st.rerun()
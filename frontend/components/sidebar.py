@@ -1,4 +1,8 @@
 import streamlit as st
+from services.api_client import http_client
+from services.exports import get_export_cache
+from utils.encoded_cache import get_encoded_cache
+from utils.thumbnails import SIDEBAR_SIZE, thumbnail_bytes
 
 def render_sidebar():
     with st.sidebar:
@@ -24,7 +28,7 @@ def render_sidebar():
             
             # Affichage de l'image
             st.image(
-                st.session_state.current_image,
+                thumbnail_bytes(st.session_state.current_image, SIDEBAR_SIZE),
                 use_container_width=True,
                 caption="Image actuelle"
             )
@@ -40,4 +44,43 @@ def render_sidebar():
                     st.metric("Hauteur", f"{img.size[1]} px")
                     st.metric("Pixels", f"{img.size[0] * img.size[1]:,}")
 
+            # Mémoire occupée par l'historique de cette session
+            with st.expander("🧠 Mémoire de l'historique", expanded=False):
+                mem = st.session_state.history.stats()
+                col_mem1, col_mem2 = st.columns(2)
+                with col_mem1:
+                    st.metric("Décodées", f"{mem['decoded']} / {mem['steps']}")
+                    st.metric("Compressées", mem['compressed'])
+                    st.metric("Sur disque", mem['on_disk'])
+                with col_mem2:
+                    st.metric("RAM (pixels)", f"{mem['decoded_bytes'] / 1024 / 1024:.1f} Mo")
+                    st.metric("RAM (compressé)", f"{mem['compressed_bytes'] / 1024 / 1024:.1f} Mo")
+                    st.metric("Disque", f"{mem['disk_bytes'] / 1024 / 1024:.1f} Mo")
+                if st.session_state.history.keyframe_every > 1:
+                    st.caption(f"🎞️ Images clés: {mem['keyframes']} / {mem['steps']} (les autres étapes sont rejouées)")
+
         st.markdown("---")
+
+        # Connexions vers le backend (compteurs du processus Streamlit)
+        with st.expander("🔌 Connexions backend", expanded=False):
+            stats = http_client().stats()
+            col_conn1, col_conn2 = st.columns(2)
+            with col_conn1:
+                st.metric("Requêtes", stats["requests"])
+                st.metric("Réutilisation", f"{stats['reuse_ratio']:.0%}")
+            with col_conn2:
+                st.metric("Connexions", stats["connections_opened"])
+                st.metric("Réessais", stats["retries"])
+            if stats["errors"]:
+                st.caption(f"⚠️ {stats['errors']} erreur(s) réseau")
+            cache = get_encoded_cache().stats()
+            st.caption(
+                f"🗜️ Cache d'encodage: {cache['entries']} image(s), "
+                f"{cache['bytes'] / 1024 / 1024:.1f}/{cache['max_bytes'] / 1024 / 1024:.0f} Mo, "
+                f"{cache['hits']} réutilisation(s)"
+            )
+            exports = get_export_cache().stats()
+            st.caption(
+                f"📦 Exports prêts: {exports['entries']} fichier(s), "
+                f"{exports['bytes'] / 1024 / 1024:.1f}/{exports['max_bytes'] / 1024 / 1024:.0f} Mo"
+            )
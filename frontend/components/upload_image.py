@@ -1,7 +1,6 @@
 import streamlit as st
 from PIL import Image
-from datetime import datetime
-from utils.helpers import image_to_bytes
+from components.history import start_history
 from streamlit_scroll_to_top import scroll_to_here
 
 def upload_image():    
@@ -35,26 +34,18 @@ def upload_image():
                 
                 # Initialisation
                 if st.button("🎯 Utiliser cette image", type="primary", use_container_width=True):
-                    st.session_state.original_image = image.copy()
-                    st.session_state.current_image = image.copy()
-                    st.session_state.history = [{
-                        'image': image.copy(),
-                        'operation': 'Original',
-                        'params': {},
-                        'timestamp': datetime.now(),
-                        'preview': image_to_bytes(image.resize((150, 150), Image.LANCZOS))
-                    }]
-                    st.session_state.history_index = 0
+                    # Une seule copie (chargée), partagée par l'état et l'historique
+                    image = image.copy()
+                    st.session_state.original_image = image
+                    st.session_state.current_image = image
+                    start_history(image)
                     
-                    # Ajouter à la galerie
-                    if not any(item['name'] == uploaded_file.name for item in st.session_state.gallery):
-                        if len(st.session_state.gallery) < 50:
-                            st.session_state.gallery.append({
-                                'name': uploaded_file.name,
-                                'image': image.copy(),
-                                'uploaded_at': datetime.now(),
-                                'size': file_size
-                            })
+                    # Ajouter à la galerie (original sur disque, dédoublonné par contenu)
+                    gallery = st.session_state.gallery
+                    item, _ = gallery.add(uploaded_file.getvalue(), uploaded_file.name, image)
+                    if item is None:
+                        st.toast(f"⚠️ Galerie pleine ({gallery.max_items} images): l'image n'y a pas été ajoutée. "
+                                 "Supprimez-en une pour faire de la place.", icon="⚠️")
                     
                     scroll_to_here(0, key='header')  # Scroll to the header of the page
                     st.rerun()
@@ -2,30 +2,182 @@ import os
 import streamlit as st
 import requests
 import io
+import json
+import base64
 from PIL import Image
 from utils.helpers import image_to_bytes
+from utils.raw_format import RAW_MEDIA_TYPE, COMPRESSION_HEADER, available_compressions, encode_image, encode_parts, decode_image
+from services.local_transport import HANDLE_MEDIA_TYPE, default_handoff_dir, write_handoff, read_handoff
+from services.http_client import ApiHttpClient, get_http_client
+
+def _setting(secret_key: str, env_var: str, default: str) -> str:
+    try:
+        return st.secrets[secret_key]
+    except Exception:
+        return os.environ.get(env_var, default)
 
 # URL de l'API
-try:
-    API_URL = st.secrets["api_url"]
-except Exception:
-    API_URL = os.environ.get("API_URL", "http://localhost:8000/api")
+API_URL = _setting("api_url", "API_URL", "http://localhost:8000/api")
+
+# Format d'échange des images: "png" (défaut) ou "raw" (pixels bruts, sans codec,
+# intéressant quand frontend et backend sont sur la même machine ou le même LAN)
+WIRE_FORMAT = _setting("wire_format", "API_WIRE_FORMAT", "png").lower()
+# Compression du format raw: none, lz4, zstd ou zlib
+RAW_COMPRESSION = _setting("raw_compression", "API_RAW_COMPRESSION", "none").lower()
+
+# Transport local: chemin du socket Unix du backend (python -m backend.serve).
+# Vide = TCP. Si défini, les pixels passent par la mémoire partagée.
+API_UDS = _setting("api_uds", "API_UDS", "")
+HANDOFF_DIR = _setting("handoff_dir", "IMAGEFLOW_HANDOFF_DIR", default_handoff_dir())
+
+# Encodage des fichiers téléchargés depuis l'onglet Export: "local" (défaut)
+# ou "backend" (POST /export, utile quand le backend a plus de CPU)
+EXPORT_SOURCE = _setting("export_source", "EXPORT_SOURCE", "local").lower()
 
 API_ENDPOINTS = {
     "preprocess": "/preprocess",
     "histogram": "/histogram", 
+    "histograms": "/histograms",
     "segment": "/segment",
     "detect_faces": "/detect_faces",
     "crop": "/crop",
+    "thumbnail": "/thumbnail",
+    "export": "/export",
+    "pipeline": "/pipeline",
+    "presets": "/presets",
     "test": "/test"
 }
 
+# Délai de lecture par endpoint (secondes), surchargeable par
+# API_TIMEOUT_<ENDPOINT> ou la table [timeouts] de secrets.toml
+DEFAULT_TIMEOUTS = {
+    "preprocess": 60,
+    "histogram": 30,
+    "histograms": 60,
+    "segment": 60,
+    "detect_faces": 60,
+    "crop": 30,
+    "thumbnail": 30,
+    "export": 60,
+    "pipeline": 120,
+    "presets": 120,
+    "test": 10
+}
+DEFAULT_TIMEOUT = 30
+
+def endpoint_timeout(endpoint: str) -> float:
+    """Délai de lecture configuré pour un endpoint ("crop", "/crop"; "/presets/<nom>/apply" -> "presets")"""
+    name = endpoint.strip('/').split('/')[0]
+    try:
+        return float(st.secrets["timeouts"][name])
+    except Exception:
+        return float(os.environ.get(f"API_TIMEOUT_{name.upper()}", DEFAULT_TIMEOUTS.get(name, DEFAULT_TIMEOUT)))
+
+def http_client() -> ApiHttpClient:
+    """Client HTTP partagé du processus (pool keep-alive, TCP ou socket Unix)"""
+    return get_http_client(API_UDS)
+
+def session_headers() -> dict:
+    """En-têtes identifiant la session, pour l'ordonnancement équitable côté backend"""
+    client_id = st.session_state.get('client_id')
+    return {"X-Client-Id": client_id} if client_id else {}
+
+def wire_headers() -> dict:
+    """En-têtes de session, plus la négociation du format raw et du transport local si activés"""
+    headers = session_headers()
+    if API_UDS:
+        # Même machine: handle vers des pixels bruts non compressés
+        headers["Accept"] = f"{HANDLE_MEDIA_TYPE}, {RAW_MEDIA_TYPE}, image/png;q=0.9"
+        headers[COMPRESSION_HEADER] = "none"
+    elif WIRE_FORMAT == "raw":
+        headers["Accept"] = f"{RAW_MEDIA_TYPE}, image/png;q=0.9"
+        # Préférence d'abord, puis tout ce que ce client sait décoder
+        compressions = [RAW_COMPRESSION] + [c for c in available_compressions() if c != RAW_COMPRESSION]
+        headers[COMPRESSION_HEADER] = ", ".join(compressions)
+    return headers
+
+def upload_file(image: Image.Image) -> tuple:
+    """Tuple (nom, contenu, type) pour envoyer une image au backend dans le format configuré"""
+    if WIRE_FORMAT == "raw":
+        return ('image.raw', encode_image(image, RAW_COMPRESSION), RAW_MEDIA_TYPE)
+    return ('image.png', image_to_bytes(image, profile='upload'), 'image/png')
+
+def prepare_upload(image: Image.Image) -> tuple:
+    """Partie 'file' à envoyer pour une image, et le fichier partagé à supprimer après (ou None)
+
+    En transport local, l'image est écrite en mémoire partagée et seul son
+    handle traversera le socket.
+    """
+    if API_UDS:
+        handle, handoff_path = write_handoff(HANDOFF_DIR, encode_parts(image), RAW_MEDIA_TYPE)
+        return ('image.shm', handle, HANDLE_MEDIA_TYPE), handoff_path
+    return upload_file(image), None
+
+def discard_upload(handoff_path) -> None:
+    if handoff_path:
+        try:
+            os.remove(handoff_path)
+        except FileNotFoundError:
+            pass
+
+def send_upload(endpoint: str, file: tuple, data: dict, headers: dict, client: ApiHttpClient = None) -> requests.Response:
+    """POST d'une partie préparée par prepare_upload (utilisable depuis un thread de travail)"""
+    client = client or http_client()
+    return client.post(
+        get_api_url(endpoint),
+        endpoint_timeout(endpoint),
+        files={'file': file},
+        data=data,
+        headers=headers
+    )
+
+def post_image(endpoint: str, image: Image.Image, data: dict) -> requests.Response:
+    """Envoie une image et des paramètres de formulaire à un endpoint du backend"""
+    file, handoff_path = prepare_upload(image)
+    try:
+        return send_upload(endpoint, file, data, wire_headers())
+    finally:
+        discard_upload(handoff_path)
+
+def response_body(response: requests.Response) -> tuple:
+    """(type, contenu) d'une réponse, en suivant le handle mémoire partagée s'il y en a un (une seule fois)"""
+    content_type = response.headers.get('Content-Type', '')
+    if content_type.startswith(HANDLE_MEDIA_TYPE):
+        return read_handoff(HANDOFF_DIR, response.content)
+    return content_type, response.content
+
+def is_image_response(response: requests.Response) -> bool:
+    content_type = response.headers.get('Content-Type', '')
+    return any(content_type.startswith(t) for t in ('image/', RAW_MEDIA_TYPE, HANDLE_MEDIA_TYPE))
+
+def decode_image_response(response: requests.Response) -> Image.Image:
+    """Image PIL à partir d'une réponse PNG, raw ou handle mémoire partagée"""
+    content_type, body = response_body(response)
+    if content_type.startswith(RAW_MEDIA_TYPE):
+        return decode_image(body)
+    return Image.open(io.BytesIO(body))
+
 def get_api_url(endpoint: str) -> str:
     """Retourne l'URL complète d'un endpoint API"""
     base_url = API_URL.rstrip('/')
     endpoint_path = API_ENDPOINTS.get(endpoint, endpoint)
     return f"{base_url}{endpoint_path}"
 
+def show_api_error(response: requests.Response) -> None:
+    """Affiche l'erreur d'une réponse non 200"""
+    if response.status_code == 503:
+        # Backend saturé: il indique quand réessayer
+        retry_after = response.headers.get('Retry-After', '?')
+        st.warning(f"⏳ Serveur occupé, réessayez dans {retry_after} s.")
+        return
+    # Statut non 200: essayer de montrer un message clair
+    try:
+        payload = response.json()
+        detail = payload.get('detail') if isinstance(payload, dict) else payload
+        st.error(f"❌ Erreur API ({response.status_code}): {detail}")
+    except Exception:
+        st.error(f"❌ Erreur API ({response.status_code}): {response.text}")
+
 def apply_operation(current_image: Image.Image, endpoint: str, params: dict, on_success=None):
     """Applique une opération via l'API
     
@@ -40,37 +192,22 @@ def apply_operation(current_image: Image.Image, endpoint: str, params: dict, on_
     """
     try:
         if current_image:
-            files = {
-                'file': ('image.png', image_to_bytes(current_image), 'image/png')
-            }
-            
-            # Déterminer l'URL endpoint
-            if endpoint.startswith('/'):
-                url = f"{API_URL.rstrip('/')}{endpoint}"
-            else:
-                url = get_api_url(endpoint)
-            
             with st.spinner("⏳ Traitement..."):
-                response = requests.post(
-                    url,
-                    files=files,
-                    data=params,
-                    timeout=30
-                )
+                response = post_image(endpoint, current_image, params)
                 
                 content_type = response.headers.get('Content-Type', '')
 
                 if response.status_code == 200:
                     # Gérer les réponses image
-                    if content_type.startswith('image/'):
+                    if is_image_response(response):
                         try:
                             # Vérifier si on demande un téléchargement (ex: histogram PNG)
                             if params.get('download') == 'true' or endpoint == '/histogram':
                                 # Retourner les bytes bruts pour le download
-                                return response.content
+                                return bytes(response_body(response)[1])
                             else:
                                 # Retourner l'image PIL
-                                result = Image.open(io.BytesIO(response.content))
+                                result = decode_image_response(response)
                                 st.toast(f"✅ Opération réussie!", icon="✅")
                                 if on_success:
                                     on_success(result, endpoint, params)
@@ -87,14 +224,59 @@ def apply_operation(current_image: Image.Image, endpoint: str, params: dict, on_
                             st.error(f"❌ Réponse inattendue du backend (type {content_type}).")
                         return None
                 else:
-                    # Statut non 200: essayer de montrer un message clair
-                    try:
-                        payload = response.json()
-                        detail = payload.get('detail') if isinstance(payload, dict) else payload
-                        st.error(f"❌ Erreur API ({response.status_code}): {detail}")
-                    except Exception:
-                        st.error(f"❌ Erreur API ({response.status_code}): {response.text}")
+                    show_api_error(response)
+                    return None
+    except requests.exceptions.ConnectionError:
+        st.error("🔌 Impossible de se connecter au backend. Vérifiez qu'il est démarré.")
+        return None
+    except Exception as e:
+        st.error(f"⚠️ Erreur: {str(e)}")
+        return None
+
+def decode_pipeline_images(payload: dict) -> list:
+    """Images PIL de chaque étape d'une réponse /pipeline avec intermediates=true"""
+    images = []
+    for encoded in payload['images']:
+        body = base64.b64decode(encoded)
+        if payload['media_type'].startswith(RAW_MEDIA_TYPE):
+            images.append(decode_image(body))
+        else:
+            images.append(Image.open(io.BytesIO(body)))
+    return images
+
+def apply_pipeline(current_image: Image.Image, steps: list, on_success=None):
+    """Applique plusieurs opérations /preprocess en une seule requête (image envoyée et décodée une fois)
+
+    Args:
+        current_image: L'image PIL actuelle
+        steps: Les paramètres de chaque étape, dans l'ordre (comme pour "/preprocess")
+        on_success: Callback optionnel après succès, appelé avec les images de chaque étape
+
+    Returns:
+        La liste des images de chaque étape, ou None si erreur
+    """
+    try:
+        if current_image and steps:
+            with st.spinner(f"⏳ Traitement de {len(steps)} opération(s)..."):
+                data = {'steps': json.dumps(steps), 'intermediates': 'true'}
+                file, handoff_path = prepare_upload(current_image)
+                try:
+                    # Réponse JSON: les étapes reviennent encodées en base64 dans le format négocié
+                    headers = {k: v for k, v in wire_headers().items() if k != 'Accept'}
+                    if WIRE_FORMAT == "raw" or API_UDS:
+                        headers['Accept'] = f"{RAW_MEDIA_TYPE}, image/png;q=0.9"
+                    response = send_upload("pipeline", file, data, headers)
+                finally:
+                    discard_upload(handoff_path)
+
+                if response.status_code != 200:
+                    show_api_error(response)
                     return None
+                images = decode_pipeline_images(response.json())
+                st.toast(f"✅ {len(images)} opération(s) appliquée(s)!", icon="✅")
+                if on_success:
+                    on_success(images, steps)
+                return images
     except requests.exceptions.ConnectionError:
         st.error("🔌 Impossible de se connecter au backend. Vérifiez qu'il est démarré.")
         return None
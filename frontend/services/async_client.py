@@ -0,0 +1,90 @@
+import asyncio
+import base64
+from typing import Optional
+
+import requests
+from PIL import Image
+
+from services.api_client import discard_upload, http_client, prepare_upload, send_upload, wire_headers
+
+# Nombre maximal de requêtes en vol par appel à fan_out (le backend garde sa
+# propre admission; au-delà on ne ferait qu'attendre dans sa file)
+DEFAULT_CONCURRENCY = 4
+
+
+class ApiCall:
+    """Un appel indépendant au backend: endpoint, image et paramètres de formulaire"""
+
+    def __init__(self, endpoint: str, image: Image.Image, data: Optional[dict] = None):
+        self.endpoint = endpoint
+        self.image = image
+        self.data = data or {}
+
+
+async def _gather(calls: list, headers: dict, client, max_concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    # Chaque image distincte n'est encodée (ou écrite en mémoire partagée) qu'une fois
+    uploads = {}
+    for call in calls:
+        if id(call.image) not in uploads:
+            uploads[id(call.image)] = prepare_upload(call.image)
+
+    async def run(call: ApiCall):
+        file, _ = uploads[id(call.image)]
+        async with semaphore:
+            return await asyncio.to_thread(send_upload, call.endpoint, file, call.data, headers, client)
+
+    try:
+        return await asyncio.gather(*(run(call) for call in calls), return_exceptions=True)
+    finally:
+        for _, handoff_path in uploads.values():
+            discard_upload(handoff_path)
+
+
+def fan_out(calls: list, max_concurrency: int = DEFAULT_CONCURRENCY) -> list:
+    """Envoie des appels indépendants en parallèle et retourne leurs réponses dans l'ordre
+
+    Les requêtes partent depuis des threads sur le client HTTP partagé (pool
+    keep-alive, nouvelles tentatives, socket Unix le cas échéant). Un appel
+    qui échoue donne son exception à sa place dans la liste au lieu
+    d'interrompre les autres.
+    """
+    if not calls:
+        return []
+    # st.session_state n'est lisible que depuis le thread du script
+    headers = wire_headers()
+    client = http_client()
+    return asyncio.run(_gather(calls, headers, client, max_concurrency))
+
+
+def raise_for_result(result) -> requests.Response:
+    """Relance l'exception d'un appel échoué, sinon retourne la réponse"""
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+
+def fetch_histograms(images: dict, channels: list) -> dict:
+    """Histogrammes PNG de plusieurs images, un appel /histograms par image en parallèle
+
+    Args:
+        images: {libellé: image PIL}
+        channels: canaux à rendre ("all", "red", "green", "blue", "gray")
+
+    Returns:
+        {libellé: {canal: octets PNG}}
+    """
+    labels = list(images)
+    calls = [ApiCall("histograms", images[label], {"channels": ",".join(channels)}) for label in labels]
+    results = {}
+    for label, result in zip(labels, fan_out(calls)):
+        response = raise_for_result(result)
+        if response.status_code != 200:
+            try:
+                detail = response.json().get('detail', response.text)
+            except Exception:
+                detail = response.text
+            raise RuntimeError(f"{response.status_code}: {detail}")
+        encoded = response.json()["images"]
+        results[label] = {channel: base64.b64decode(png) for channel, png in encoded.items()}
+    return results
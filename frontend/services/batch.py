@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+import time
+import weakref
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from services.api_client import http_client, send_upload, session_headers
+
+# Fichiers traités en même temps par un lot (le backend garde sa propre admission)
+BATCH_CONCURRENCY = max(1, int(os.environ.get("BATCH_CONCURRENCY", "4")))
+# Nombre maximal de fichiers par lot
+BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", "100"))
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+
+class BatchItem:
+    """Un fichier d'un lot et son état"""
+
+    __slots__ = ("name", "size", "status", "seconds", "output_name", "output_size", "error")
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.status = PENDING
+        self.seconds = None
+        self.output_name = None
+        self.output_size = 0
+        self.error = None
+
+
+class BatchRun:
+    """Résultat d'un lot: l'état de chaque fichier et l'archive ZIP des images traitées
+
+    L'archive vit dans un répertoire temporaire supprimé avec l'objet (ou à
+    l'arrêt du processus).
+    """
+
+    def __init__(self, label: str, items: list):
+        self.label = label
+        self.items = items
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self._dir = tempfile.mkdtemp(prefix="imageflow-batch-")
+        self.zip_path = os.path.join(self._dir, "lot.zip")
+        weakref.finalize(self, shutil.rmtree, self._dir, True)
+
+    def count(self, status: str) -> int:
+        return sum(1 for item in self.items if item.status == status)
+
+    def stats(self) -> dict:
+        """Avancement et débit (images/s, Mo/s envoyés) depuis le début du lot"""
+        finished = [item for item in self.items if item.status in (DONE, FAILED)]
+        elapsed = self.elapsed or (time.perf_counter() - self.started)
+        return {
+            "done": len(finished),
+            "total": len(self.items),
+            "failed": self.count(FAILED),
+            "elapsed": elapsed,
+            "images_per_second": len(finished) / elapsed if elapsed > 0 else 0.0,
+            "mb_per_second": sum(item.size for item in finished) / (1024 * 1024) / elapsed if elapsed > 0 else 0.0,
+        }
+
+
+def _error_detail(response: requests.Response) -> str:
+    try:
+        payload = response.json()
+        detail = payload.get('detail') if isinstance(payload, dict) else payload
+    except Exception:
+        detail = response.text
+    return f"HTTP {response.status_code}: {detail}"
+
+
+def _process(item: BatchItem, file: tuple, endpoint: str, data: dict, headers: dict, client) -> bytes:
+    """Envoie un fichier tel quel et retourne le PNG traité (exécuté dans un thread de travail)"""
+    item.status = RUNNING
+    start = time.perf_counter()
+    # Un 503 (backend saturé) est renvoyé par le client HTTP partagé après son Retry-After
+    response = send_upload(endpoint, file, data, headers, client)
+    item.seconds = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(_error_detail(response))
+    if not response.headers.get('Content-Type', '').startswith('image/png'):
+        raise RuntimeError(f"Réponse inattendue ({response.headers.get('Content-Type', '?')})")
+    return response.content
+
+
+def _output_name(name: str, used: set) -> str:
+    """Nom du fichier traité dans l'archive, unique même si deux fichiers portent le même nom"""
+    stem = os.path.splitext(os.path.basename(name))[0] or "image"
+    candidate = f"{stem}_traite.png"
+    index = 2
+    while candidate in used:
+        candidate = f"{stem}_traite_{index}.png"
+        index += 1
+    used.add(candidate)
+    return candidate
+
+
+def run_batch(files: list, endpoint: str, data: dict, label: str, progress=None,
+              max_concurrency: int = BATCH_CONCURRENCY) -> BatchRun:
+    """Traite des fichiers par le backend, au plus `max_concurrency` à la fois
+
+    Args:
+        files: (nom, octets, type MIME) de chaque fichier, envoyés sans être décodés
+        endpoint: endpoint appliqué à chaque fichier ("pipeline", "/presets/<nom>/apply"...)
+        data: champs de formulaire envoyés avec chaque fichier
+        label: description du traitement, gardée avec le résultat
+        progress: appelé dans le thread appelant avec le BatchRun à chaque
+            changement (au moins deux fois par seconde pendant le lot)
+
+    Les PNG reçus sont écrits dans l'archive (ZIP_STORED: ils sont déjà
+    compressés) dès leur arrivée. Un fichier en échec est noté comme tel
+    sans interrompre les autres.
+    """
+    run = BatchRun(label, [BatchItem(name, len(content)) for name, content, _ in files])
+    # st.session_state n'est lisible que depuis le thread du script
+    headers = {**session_headers(), "Accept": "image/png", "X-Priority": "bulk"}
+    client = http_client()
+    # Noms dans l'archive fixés dans l'ordre d'envoi, quel que soit l'ordre d'arrivée
+    used_names = set()
+    output_names = {id(item): _output_name(item.name, used_names) for item in run.items}
+
+    pool = ThreadPoolExecutor(max_workers=max(1, max_concurrency))
+    try:
+        with zipfile.ZipFile(run.zip_path, "w", zipfile.ZIP_STORED) as archive:
+            pending = {
+                pool.submit(_process, item, file, endpoint, data, headers, client): item
+                for item, file in zip(run.items, files)
+            }
+            while pending:
+                finished, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    item = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        item.status = FAILED
+                        item.error = str(e)
+                        continue
+                    item.output_name = output_names[id(item)]
+                    item.output_size = len(result)
+                    archive.writestr(item.output_name, result)
+                    item.status = DONE
+                if progress is not None:
+                    progress(run)
+    finally:
+        # Arrêt du script (bouton Stop): les fichiers pas encore partis sont abandonnés
+        pool.shutdown(wait=False, cancel_futures=True)
+    run.elapsed = time.perf_counter() - run.started
+    return run
@@ -0,0 +1,155 @@
+import os
+import threading
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from services.api_client import (
+    API_UDS, EXPORT_SOURCE, HANDLE_MEDIA_TYPE, discard_upload, prepare_upload,
+    response_body, send_upload, session_headers,
+)
+from utils.helpers import image_to_bytes
+
+# Budget du cache des fichiers exportés (PNG optimisés), pour tout le processus
+EXPORT_CACHE_MB = float(os.environ.get("EXPORT_CACHE_MB", "64"))
+# Encodages PNG simultanés pendant l'export ZIP (Pillow libère le GIL en encodant)
+EXPORT_WORKERS = max(1, int(os.environ.get("EXPORT_WORKERS", str(os.cpu_count() or 1))))
+
+
+class ExportCache:
+    """Fichiers exportés, par clé stable (uid d'étape d'historique), éviction LRU
+
+    Contrairement au cache d'octets encodés, les entrées ne dépendent pas de
+    l'objet image: une étape redescendue en mémoire compressée ou sur disque
+    garde son export sans avoir à être redécodée.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # clé -> octets
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data: bytes) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            if len(data) > self.max_bytes:
+                return
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "max_bytes": self.max_bytes}
+
+
+_cache = ExportCache(int(EXPORT_CACHE_MB * 1024 * 1024))
+
+
+def get_export_cache() -> ExportCache:
+    return _cache
+
+
+def _backend_png(image: Image.Image, headers: dict) -> bytes:
+    file, handoff_path = prepare_upload(image)
+    headers = dict(headers)
+    if API_UDS:
+        headers["Accept"] = f"{HANDLE_MEDIA_TYPE}, image/png;q=0.9"
+    try:
+        response = send_upload("export", file, {}, headers)
+    finally:
+        discard_upload(handoff_path)
+    if response.status_code != 200:
+        raise RuntimeError(f"Export refusé par le backend (HTTP {response.status_code})")
+    return bytes(response_body(response)[1])
+
+
+def png_exporter():
+    """Fonction image -> PNG exporté, utilisable depuis des threads de travail
+
+    Les en-têtes de session sont lus ici, dans le thread du script: les
+    threads de travail n'ont pas accès à st.session_state.
+    """
+    if EXPORT_SOURCE == "backend":
+        headers = session_headers()
+        return lambda image: _backend_png(image, headers)
+    return image_to_bytes
+
+
+def export_png(image: Image.Image) -> bytes:
+    """PNG optimisé d'une image, encodé localement ou par le backend (EXPORT_SOURCE)"""
+    return png_exporter()(image)
+
+
+def step_file_name(index: int, entry) -> str:
+    return f"etape_{index}_{entry['operation'].replace(' ', '_')}.png"
+
+
+def cached_step_export(entry):
+    """Export déjà produit d'une étape d'historique, ou None (ne décode rien)"""
+    return _cache.get(entry.uid)
+
+
+def step_export(entry) -> bytes:
+    """Export PNG d'une étape d'historique, produit à la première demande puis gardé en cache"""
+    data = _cache.get(entry.uid)
+    if data is None:
+        data = export_png(entry['image'])
+        _cache.put(entry.uid, data)
+    return data
+
+
+def write_history_zip(history, target, progress=None, workers: int = EXPORT_WORKERS) -> int:
+    """Écrit toutes les étapes d'un historique dans une archive ZIP, au fil de l'eau
+
+    Les étapes sont encodées en parallèle sur `workers` threads; leurs images
+    sont lues dans le thread appelant (l'historique n'est pas thread-safe) et
+    au plus 2 x `workers` sont en vol à la fois. Les PNG, déjà compressés, sont
+    stockés tels quels (ZIP_STORED) et écrits dans `target` (fichier binaire)
+    dans l'ordre, dès qu'ils sont prêts. Les exports déjà en cache sont
+    réutilisés, les nouveaux y sont ajoutés. `progress(fait, total)` est
+    appelé dans le thread appelant après chaque étape écrite.
+    """
+    total = len(history)
+    encode = png_exporter()
+    pending = deque()  # (nom, uid, octets ou Future), dans l'ordre de l'archive
+    written = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+            zipfile.ZipFile(target, "w", zipfile.ZIP_STORED) as archive:
+
+        def drain(limit: int) -> None:
+            nonlocal written
+            while len(pending) > limit:
+                name, uid, result = pending.popleft()
+                if not isinstance(result, bytes):
+                    result = result.result()
+                    _cache.put(uid, result)
+                archive.writestr(name, result)
+                written += 1
+                if progress is not None:
+                    progress(written, total)
+
+        for index, entry in enumerate(history):
+            data = _cache.get(entry.uid)
+            if data is None:
+                data = pool.submit(encode, entry['image'])
+            pending.append((step_file_name(index, entry), entry.uid, data))
+            drain(2 * workers)
+        drain(0)
+
+    return written
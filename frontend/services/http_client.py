@@ -0,0 +1,145 @@
+import threading
+from typing import Optional
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from services.local_transport import UnixSocketAdapter
+
+# Délai d'établissement de connexion (le délai de lecture dépend de l'endpoint)
+CONNECT_TIMEOUT = 3.05
+
+
+# Attente maximale avant une nouvelle tentative, quel que soit le Retry-After
+# demandé (urllib3 ne la borne pas et bloquerait le thread Streamlit d'autant)
+MAX_RETRY_AFTER = 5.0
+
+
+class ApiRetry(Retry):
+    """Retry qui ne renvoie un POST que s'il n'a pas été traité
+
+    Une erreur de connexion (la requête n'est pas partie) ou un 503 avec
+    Retry-After (refus du contrôle d'admission, avant tout traitement)
+    peuvent être renvoyés sans risque. Une lecture trop longue, un 502 ou
+    un 504 signifient au contraire que le backend travaille peut-être
+    encore: renvoyer le POST doublerait la charge au moment où il est saturé.
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method.upper() == "POST":
+            return bool(self.total) and status_code == 503 and has_retry_after
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def get_retry_after(self, response) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, MAX_RETRY_AFTER)
+
+
+def default_retry() -> ApiRetry:
+    """Nouvelles tentatives avec backoff exponentiel
+
+    Les erreurs de connexion sont retentées pour toutes les méthodes. Les
+    erreurs de lecture et les 502/503/504 ne le sont que pour les méthodes
+    idempotentes (GET...), une lecture trop longue une seule fois; un POST
+    ne l'est que refusé par l'admission (voir ApiRetry). Le Retry-After du
+    backend est respecté, dans la limite de MAX_RETRY_AFTER.
+    """
+    return ApiRetry(
+        total=3,
+        connect=3,
+        read=1,
+        status=2,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+class ApiHttpClient:
+    """Client HTTP partagé par toutes les sessions Streamlit du processus
+
+    Un seul adaptateur, avec un pool de connexions keep-alive vers le backend
+    (TCP, ou socket Unix en transport local), des nouvelles tentatives et des
+    compteurs permettant de vérifier que les connexions sont réutilisées.
+
+    Le client est utilisé depuis plusieurs threads (sessions Streamlit,
+    histogrammes en parallèle, lots): chaque thread a sa propre
+    requests.Session, qui n'est pas garantie thread-safe, et toutes montent
+    le même adaptateur, dont le pool urllib3 l'est.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, pool_size: int = 16, retry: Optional[Retry] = None):
+        retry = retry or default_retry()
+        if socket_path:
+            self._adapter = UnixSocketAdapter(socket_path, pool_maxsize=pool_size, max_retries=retry)
+        else:
+            self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+
+    @property
+    def session(self) -> requests.Session:
+        """Session du thread appelant, créée au premier appel"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+        return session
+
+    def close(self) -> None:
+        """Ferme les connexions du pool (toutes sessions confondues)"""
+        self._adapter.close()
+
+    def request(self, method: str, url: str, read_timeout: float, **kwargs) -> requests.Response:
+        with self._lock:
+            self.requests += 1
+        try:
+            response = self.session.request(method, url, timeout=(CONNECT_TIMEOUT, read_timeout), **kwargs)
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self.errors += 1
+            raise
+        history = getattr(getattr(response.raw, "retries", None), "history", ())
+        if history:
+            with self._lock:
+                self.retries += len(history)
+        return response
+
+    def post(self, url: str, read_timeout: float, **kwargs) -> requests.Response:
+        return self.request("POST", url, read_timeout, **kwargs)
+
+    def get(self, url: str, read_timeout: float, **kwargs) -> requests.Response:
+        return self.request("GET", url, read_timeout, **kwargs)
+
+    def _pools(self) -> list:
+        if isinstance(self._adapter, UnixSocketAdapter):
+            return [self._adapter._pool] if self._adapter._pool is not None else []
+        pools = self._adapter.poolmanager.pools
+        return [pools[key] for key in pools.keys()]
+
+    def stats(self) -> dict:
+        """Compteurs du processus: requêtes, connexions ouvertes, taux de réutilisation"""
+        pools = self._pools()
+        opened = sum(pool.num_connections for pool in pools)
+        sent = sum(pool.num_requests for pool in pools)
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections_opened": opened,
+                "reuse_ratio": (1 - opened / sent) if sent else 0.0,
+                "retries": self.retries,
+                "errors": self.errors,
+            }
+
+
+@st.cache_resource
+def get_http_client(socket_path: Optional[str] = None) -> ApiHttpClient:
+    """Client unique par processus serveur Streamlit (cache de ressources)"""
+    return ApiHttpClient(socket_path or None)
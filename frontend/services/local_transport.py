@@ -0,0 +1,92 @@
+import json
+import mmap
+import os
+import socket
+import tempfile
+import uuid
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+
+# Transport local: quand Streamlit et FastAPI tournent sur la même machine, les
+# requêtes passent par le socket Unix du backend (python -m backend.serve --uds ...)
+# et les pixels par un fichier en mémoire partagée (/dev/shm) dont seul le
+# "handle" est envoyé. À garder synchronisé avec backend/app/core/local_transport.py.
+HANDLE_MEDIA_TYPE = "application/x-imageflow-shm"
+
+
+def default_handoff_dir() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "imageflow-handoff")
+
+
+class UnixHTTPConnection(HTTPConnection):
+    """Connexion HTTP urllib3 ouverte sur un socket Unix au lieu de TCP"""
+
+    def __init__(self, *args, socket_path: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.socket_path = socket_path
+
+    def _new_conn(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if isinstance(self.timeout, (int, float)):
+            sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+
+class UnixHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = UnixHTTPConnection
+
+
+class UnixSocketAdapter(HTTPAdapter):
+    """Adaptateur requests qui envoie toutes les requêtes sur un socket Unix (l'hôte de l'URL est ignoré)"""
+
+    def __init__(self, socket_path: str, **kwargs):
+        self.socket_path = socket_path
+        self._pool = None
+        super().__init__(**kwargs)
+
+    def _get_pool(self) -> UnixHTTPConnectionPool:
+        if self._pool is None:
+            self._pool = UnixHTTPConnectionPool(
+                "localhost", maxsize=self._pool_maxsize, socket_path=self.socket_path
+            )
+        return self._pool
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        return self._get_pool()
+
+    def get_connection(self, url, proxies=None):
+        return self._get_pool()
+
+    def close(self):
+        super().close()
+        if self._pool is not None:
+            self._pool.close()
+
+
+def write_handoff(directory: str, parts: list, media_type: str) -> tuple:
+    """Écrit les morceaux d'une image dans un fichier partagé; retourne (handle JSON, chemin)"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    name = f"in-{os.getpid()}-{uuid.uuid4().hex}"
+    path = os.path.join(directory, name)
+    size = 0
+    with open(path, "wb") as f:
+        for part in parts:
+            size += f.write(part)
+    handle = json.dumps({"name": name, "size": size, "media_type": media_type}).encode()
+    return handle, path
+
+
+def read_handoff(directory: str, handle: bytes) -> tuple:
+    """Mappe le fichier désigné par un handle du backend puis le supprime; retourne (type, memoryview)"""
+    spec = json.loads(handle)
+    name = os.path.basename(spec["name"])
+    path = os.path.join(directory, name)
+    with open(path, "rb") as f:
+        mapping = mmap.mmap(f.fileno(), int(spec["size"]), access=mmap.ACCESS_READ)
+    # Le mapping reste valide après la suppression du fichier
+    os.unlink(path)
+    return spec["media_type"], memoryview(mapping)
@@ -0,0 +1,69 @@
+import json
+from urllib.parse import quote
+
+import requests
+import streamlit as st
+from PIL import Image
+
+from services.api_client import (
+    apply_operation, endpoint_timeout, get_api_url, http_client, session_headers, show_api_error,
+)
+
+
+def preset_endpoint(name: str, action: str = "") -> str:
+    """Chemin d'un preset du backend ("/presets/<nom>[/<action>]")"""
+    path = f"/presets/{quote(name, safe='')}"
+    return f"{path}/{action}" if action else path
+
+
+def _request(method: str, endpoint: str, **kwargs):
+    """Réponse JSON d'un appel au registre de presets, ou None (erreur affichée)"""
+    try:
+        response = http_client().request(method, get_api_url(endpoint), endpoint_timeout(endpoint),
+                                         headers=session_headers(), **kwargs)
+    except requests.exceptions.ConnectionError:
+        st.error("🔌 Impossible de se connecter au backend. Vérifiez qu'il est démarré.")
+        return None
+    if response.status_code != 200:
+        show_api_error(response)
+        return None
+    return response.json()
+
+
+def load_presets(refresh: bool = False) -> dict:
+    """Presets du backend (nom -> définition), gardés dans la session jusqu'au prochain rafraîchissement"""
+    if refresh or st.session_state.presets is None:
+        presets = _request("GET", "presets")
+        if presets is None:
+            # Backend injoignable: pas de nouvel essai avant un rafraîchissement explicite
+            st.session_state.presets = st.session_state.presets or {}
+            return st.session_state.presets
+        st.session_state.presets = {preset["name"]: preset for preset in presets}
+    return st.session_state.presets
+
+
+def save_preset(name: str, steps: list, description: str = ""):
+    """Enregistre des étapes /preprocess comme preset (compilé une fois par le backend)"""
+    preset = _request("POST", "presets", json={"name": name, "description": description, "steps": steps})
+    if preset is not None:
+        load_presets(refresh=True)
+    return preset
+
+
+def delete_preset(name: str) -> bool:
+    deleted = _request("DELETE", preset_endpoint(name)) is not None
+    load_presets(refresh=True)
+    return deleted
+
+
+def apply_preset(current_image: Image.Image, preset: dict, on_success=None):
+    """Applique un preset à l'image actuelle
+
+    on_success reçoit l'image, le preset et une recette /pipeline avec sa spec:
+    rejouer l'étape donne le même résultat même si le preset change ensuite.
+    """
+    def recorded(result, endpoint, params):
+        if on_success:
+            on_success(result, preset, {"endpoint": "pipeline", "data": {"spec": json.dumps(preset["spec"])}})
+
+    return apply_operation(current_image, preset_endpoint(preset["name"], "apply"), {}, recorded)
@@ -0,0 +1,30 @@
+from PIL import Image
+
+from services.api_client import decode_image_response, post_image
+
+
+def _replay_crop(image: Image.Image, data: dict) -> Image.Image:
+    """Même découpe que le backend (ImageProcessor.crop_image), sans aller-retour réseau"""
+    x = max(0, int(data['x']))
+    y = max(0, int(data['y']))
+    width = max(1, int(data['width']))
+    height = max(1, int(data['height']))
+    return image.crop((x, y, min(x + width, image.size[0]), min(y + height, image.size[1])))
+
+
+# Recettes rejouées localement; les autres sont renvoyées au backend
+LOCAL_REPLAYS = {
+    "crop": _replay_crop,
+}
+
+
+def replay_recipe(image: Image.Image, recipe: dict) -> Image.Image:
+    """Réapplique une étape d'historique ({endpoint, data}) à l'image de l'étape précédente"""
+    endpoint, data = recipe["endpoint"], recipe["data"]
+    local = LOCAL_REPLAYS.get(endpoint.strip('/'))
+    if local is not None:
+        return local(image, data)
+    response = post_image(endpoint, image, data)
+    if response.status_code != 200:
+        raise RuntimeError(f"Impossible de rejouer '{endpoint}' (HTTP {response.status_code})")
+    return decode_image_response(response)
@@ -0,0 +1,38 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+
+# Keep the backend started below off /dev/shm and out of the real preset directory
+os.environ.setdefault("IMAGEFLOW_SHARED_STORE", "false")
+os.environ.setdefault("IMAGEFLOW_PRESETS_DIR", tempfile.mkdtemp(prefix="imageflow-test-presets-"))
+
+import pytest
+import uvicorn
+
+
+@pytest.fixture(scope="session")
+def live_api():
+    """The FastAPI backend on a local port, with services.api_client pointed at it"""
+    from backend.app.main import app
+    from services import api_client
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started and time.time() < deadline:
+        time.sleep(0.05)
+
+    previous = api_client.API_URL
+    api_client.API_URL = f"http://127.0.0.1:{port}/api"
+    try:
+        yield api_client.API_URL
+    finally:
+        api_client.API_URL = previous
+        server.should_exit = True
+        thread.join(timeout=10)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import requests
+from PIL import Image
+
+from services import async_client
+from services.async_client import ApiCall, fan_out, fetch_histograms, raise_for_result
+
+
+def _image(seed: int, mode: str = "RGB") -> Image.Image:
+    pixels = np.random.default_rng(seed).integers(0, 256, (40, 60, 3), dtype=np.uint8)
+    return Image.fromarray(pixels).convert(mode)
+
+
+def test_fan_out_keeps_call_order_and_isolates_failures(live_api):
+    image = _image(0)
+    calls = [
+        ApiCall("histograms", image, {"channels": "red"}),
+        ApiCall("/does-not-exist", image),
+        ApiCall("histograms", image, {"channels": "gray,blue"}),
+    ]
+    first, missing, last = fan_out(calls, max_concurrency=2)
+    assert sorted(first.json()["images"]) == ["red"]
+    assert missing.status_code == 404
+    assert sorted(last.json()["images"]) == ["blue", "gray"]
+
+
+def test_fan_out_returns_exceptions_in_place(live_api, monkeypatch):
+    real_send = async_client.send_upload
+
+    def flaky(endpoint, *args):
+        if endpoint == "crop":
+            raise requests.exceptions.ConnectionError("refused")
+        return real_send(endpoint, *args)
+
+    monkeypatch.setattr(async_client, "send_upload", flaky)
+    results = fan_out([ApiCall("crop", _image(1)), ApiCall("histograms", _image(1), {"channels": "all"})])
+    with pytest.raises(requests.exceptions.ConnectionError):
+        raise_for_result(results[0])
+    assert raise_for_result(results[1]).status_code == 200
+
+
+def test_histograms_match_single_histogram_calls(live_api):
+    from services.api_client import post_image
+
+    images = {"actuelle": _image(2), "originale": _image(3, "L")}
+    histograms = fetch_histograms(images, ["all", "gray"])
+    assert set(histograms) == {"actuelle", "originale"}
+    for label, image in images.items():
+        single = post_image("histogram", image, {"channel": "gray", "download": "true"})
+        assert single.status_code == 200
+        assert histograms[label]["gray"] == single.content
@@ -0,0 +1,71 @@
+import io
+import json
+import threading
+import zipfile
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend.app.core.admission import AdmissionController, RequestCost, get_admission_controller
+from backend.app.main import app
+from services.api_client import http_client, send_upload
+from services.batch import DONE, FAILED, _output_name, run_batch
+
+STEPS = [{"grayscale": "true"}, {"brightness": "15", "flip": "horizontal"}]
+
+
+def _png(seed: int) -> bytes:
+    pixels = np.random.default_rng(seed).integers(0, 256, (24, 32, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_output_names_are_unique():
+    used = set()
+    names = [_output_name(name, used) for name in ["a.png", "dir/a.jpg", "a.png", "b.tiff", ""]]
+    assert names == ["a_traite.png", "a_traite_2.png", "a_traite_3.png", "b_traite.png", "image_traite.png"]
+
+
+def test_batch_archives_results_in_upload_order(live_api):
+    files = [("a.png", _png(1), "image/png"), ("notes.txt", b"text", "text/plain"),
+             ("photos/a.png", _png(2), "image/png"), ("b.png", _png(3), "image/png")]
+    updates = []
+    run = run_batch(files, "pipeline", {"steps": json.dumps(STEPS)}, "File", progress=updates.append,
+                    max_concurrency=2)
+
+    assert [item.status for item in run.items] == [DONE, FAILED, DONE, DONE]
+    assert [item.output_name for item in run.items] == ["a_traite.png", None, "a_traite_2.png", "b_traite.png"]
+    assert "HTTP 400" in run.items[1].error
+    assert updates and updates[-1] is run
+    stats = run.stats()
+    assert (stats["done"], stats["total"], stats["failed"]) == (4, 4, 1)
+
+    with zipfile.ZipFile(run.zip_path) as archive:
+        entries = archive.infolist()
+        assert sorted(entry.filename for entry in entries) == ["a_traite.png", "a_traite_2.png", "b_traite.png"]
+        assert all(entry.compress_type == zipfile.ZIP_STORED for entry in entries)
+        for item, file in zip(run.items, files):
+            if item.status == DONE:
+                expected = send_upload("pipeline", file, {"steps": json.dumps(STEPS)}, {}, http_client())
+                assert archive.read(item.output_name) == expected.content
+                assert item.output_size == len(expected.content)
+
+
+def test_saturated_backend_is_retried(live_api):
+    controller = AdmissionController(cpu_budget=10.0, memory_budget=1024 * 1024 * 1024,
+                                     queue_timeout=0.05, max_queue=0)
+    held = RequestCost(controller.cpu_budget, 0)
+    controller._take(held)
+    app.dependency_overrides[get_admission_controller] = lambda: controller
+    # The other request finishes before the backend's Retry-After has elapsed
+    release = threading.Timer(0.3, controller._release, (held, 0.3))
+    release.start()
+    try:
+        run = run_batch([("a.png", _png(4), "image/png")], "pipeline", {"steps": json.dumps(STEPS)}, "File")
+    finally:
+        release.cancel()
+        app.dependency_overrides.pop(get_admission_controller, None)
+    assert run.items[0].status == DONE
+    assert controller.rejected_total >= 1
@@ -0,0 +1,83 @@
+import gc
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+
+from utils.encoded_cache import EncodedImageCache
+from utils.helpers import image_to_bytes
+
+
+def _image(seed: int = 0) -> Image.Image:
+    return Image.fromarray(np.random.default_rng(seed).integers(0, 256, (32, 32, 3), dtype=np.uint8))
+
+
+def _encoder(calls: list, size: int):
+    def encode():
+        calls.append(1)
+        return b"x" * size
+    return encode
+
+
+def test_same_image_is_encoded_once_per_format_and_profile():
+    cache = EncodedImageCache(1024)
+    image, calls = _image(), []
+    assert cache.get_or_encode(image, "PNG", "download", _encoder(calls, 10)) == b"x" * 10
+    cache.get_or_encode(image, "PNG", "download", _encoder(calls, 10))
+    cache.get_or_encode(image, "PNG", "upload", _encoder(calls, 10))
+    assert len(calls) == 2
+    assert cache.stats()["hits"] == 1
+
+
+def test_budget_evicts_least_recently_used():
+    cache = EncodedImageCache(250)
+    images, calls = [_image(seed) for seed in range(3)], []
+    for image in images:
+        cache.get_or_encode(image, "PNG", "download", _encoder(calls, 100))
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] == 200 and stats["evictions"] == 1
+    # The first image was evicted, the last one is still cached
+    cache.get_or_encode(images[2], "PNG", "download", _encoder(calls, 100))
+    assert len(calls) == 3
+    cache.get_or_encode(images[0], "PNG", "download", _encoder(calls, 100))
+    assert len(calls) == 4
+
+    cache.get_or_encode(_image(9), "PNG", "download", _encoder(calls, 300))
+    assert cache.stats()["bytes"] <= 250  # Larger than the whole budget: not kept
+
+
+def test_entry_is_dropped_when_its_image_is_freed():
+    cache = EncodedImageCache(1024)
+    image = _image()
+    cache.get_or_encode(image, "PNG", "download", _encoder([], 10))
+    del image
+    gc.collect()
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
+
+
+def test_image_freed_while_the_lock_is_held_does_not_deadlock():
+    cache = EncodedImageCache(1024)
+    images = [_image()]
+    cache.get_or_encode(images[0], "PNG", "download", _encoder([], 10))
+
+    def free_under_lock():
+        # The collector may run the weakref callback in a thread that holds the lock
+        with cache._lock:
+            images.clear()
+            gc.collect()
+
+    thread = threading.Thread(target=free_under_lock, daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
+
+
+def test_image_to_bytes_profiles_decode_to_the_same_pixels():
+    image = _image(4)
+    download = image_to_bytes(image)
+    upload = image_to_bytes(image, profile="upload")
+    assert image_to_bytes(image) is download
+    for data in (download, upload):
+        assert np.array_equal(np.asarray(Image.open(io.BytesIO(data))), np.asarray(image))
@@ -0,0 +1,77 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from services import exports
+from services.exports import ExportCache, cached_step_export, step_export
+from utils.history_store import HistoryStore
+
+
+def _image(seed: int) -> Image.Image:
+    return Image.fromarray(np.random.default_rng(seed).integers(0, 256, (24, 32, 3), dtype=np.uint8))
+
+
+def _history(tmp_path, count: int) -> HistoryStore:
+    store = HistoryStore(hot_steps=1, spill_dir=str(tmp_path))
+    for index in range(count):
+        store.append(_image(index), f"Étape {index}", {}, timestamp=index, preview=b"")
+    return store
+
+
+def test_export_cache_evicts_least_recently_used():
+    cache = ExportCache(250)
+    for key in "abc":
+        cache.put(key, b"x" * 100)
+    assert cache.get("a") is None and cache.get("c") is not None
+    cache.put("huge", b"x" * 300)
+    assert cache.get("huge") is None and cache.stats()["bytes"] == 200
+
+
+def test_step_export_is_kept_across_history_tiers(tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "_cache", ExportCache(1024 * 1024))
+    history = _history(tmp_path, 3)
+    first = history[0]
+    assert cached_step_export(first) is None
+    data = step_export(first)
+    assert np.array_equal(np.asarray(Image.open(io.BytesIO(data))), np.asarray(_image(0)))
+    # The step is compressed now; its export is still found by uid, without decoding
+    assert history.stats()["decoded"] == 1
+    assert cached_step_export(history[0]) is data
+
+
+def test_backend_export_matches_the_local_one(live_api, monkeypatch):
+    image = _image(5).convert("RGBA")
+    local = exports.png_exporter()(image)
+    monkeypatch.setattr(exports, "EXPORT_SOURCE", "backend")
+    remote = exports.png_exporter()(image)
+    for data in (local, remote):
+        decoded = Image.open(io.BytesIO(data))
+        assert decoded.mode == "RGBA"
+        assert np.array_equal(np.asarray(decoded), np.asarray(image))
+
+
+def test_history_zip_is_written_in_order_and_reuses_cached_exports(tmp_path, monkeypatch):
+    import zipfile
+
+    monkeypatch.setattr(exports, "_cache", ExportCache(1024 * 1024))
+    history = _history(tmp_path / "spill", 7)
+    cached = step_export(history[3])
+    progress = []
+
+    target = tmp_path / "historique.zip"
+    with open(target, "wb") as f:
+        written = exports.write_history_zip(history, f, lambda done, total: progress.append((done, total)), workers=2)
+
+    assert written == 7
+    assert progress == [(done, 7) for done in range(1, 8)]
+    with zipfile.ZipFile(target) as archive:
+        infos = archive.infolist()
+        assert [info.filename for info in infos] == [f"etape_{index}_Étape_{index}.png" for index in range(7)]
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in infos)
+        assert archive.read(infos[3]) == cached
+        for index, info in enumerate(infos):
+            restored = Image.open(io.BytesIO(archive.read(info)))
+            assert np.array_equal(np.asarray(restored), np.asarray(_image(index)))
+    # Every step's export is now cached for the next archive or download
+    assert all(cached_step_export(entry) is not None for entry in history)
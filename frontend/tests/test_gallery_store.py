@@ -0,0 +1,94 @@
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from utils.gallery_store import GalleryStore
+from utils.thumbnails import thumbnail_bytes
+
+
+def _png(seed: int) -> tuple:
+    image = Image.fromarray(np.random.default_rng(seed).integers(0, 256, (60, 80, 3), dtype=np.uint8))
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue(), image
+
+
+def test_same_content_is_stored_once(tmp_path):
+    gallery = GalleryStore(directory=str(tmp_path))
+    data, image = _png(0)
+    item, added = gallery.add(data, "chat.png", image)
+    again, added_again = gallery.add(data, "copie de chat.png")
+    assert added and not added_again and again is item
+    assert len(gallery) == 1 and len(os.listdir(os.path.dirname(item.path))) == 1
+    assert item.dimensions == (80, 60) and Image.open(io.BytesIO(item.thumbnail)).size == (80, 60)
+
+
+def test_thumbnail_is_shared_with_the_other_views(tmp_path):
+    gallery = GalleryStore(directory=str(tmp_path))
+    data, image = _png(2)
+    item, _ = gallery.add(data, "vue.png", image)
+    # The history and sidebar thumbnails of the uploaded image reuse the gallery's bytes
+    assert thumbnail_bytes(image) is item.thumbnail
+
+
+def test_full_gallery_refuses_new_content(tmp_path):
+    gallery = GalleryStore(max_items=2, directory=str(tmp_path))
+    for seed in range(2):
+        assert gallery.add(_png(seed)[0], f"image_{seed}.png")[1]
+    assert gallery.add(_png(9)[0], "en_trop.png") == (None, False)
+    # Content already in the gallery is still found
+    assert gallery.add(_png(0)[0], "image_0.png")[0] is not None
+
+
+def test_load_decodes_the_original_from_disk(tmp_path):
+    gallery = GalleryStore(directory=str(tmp_path))
+    data, image = _png(1)
+    item, _ = gallery.add(data, "photo.png")
+    assert np.array_equal(np.asarray(gallery.load(item)), np.asarray(image))
+    assert gallery.load(item) is gallery.load(item)
+
+
+def test_search_by_substring_in_insertion_order(tmp_path):
+    gallery = GalleryStore(directory=str(tmp_path))
+    names = ["Vacances_plage.png", "portrait.jpg", "plage_nuit.png", "ap.png"]
+    for seed, name in enumerate(names):
+        gallery.add(_png(seed)[0], name)
+
+    def found(term):
+        return [item.name for item in gallery.search(term)]
+
+    assert found("PLAGE") == ["Vacances_plage.png", "plage_nuit.png"]
+    assert found("ap") == ["ap.png"]  # Short terms scan every name
+    assert found("") == names
+    assert found("zèbre") == []
+
+    gallery.remove(gallery.search("portrait")[0].digest)
+    assert found("portrait") == [] and len(gallery) == 3
+
+
+def test_full_gallery_shows_a_warning(tmp_path):
+    from streamlit.testing.v1 import AppTest
+
+    def app(directory):
+        import io
+
+        import numpy as np
+        import streamlit as st
+        from PIL import Image
+
+        from components.gallery import render_gallery
+        from utils.gallery_store import GalleryStore
+
+        if "gallery" not in st.session_state:
+            st.session_state.favorites = []
+            st.session_state.gallery = GalleryStore(max_items=1, directory=directory)
+            buf = io.BytesIO()
+            Image.fromarray(np.zeros((8, 8, 3), dtype=np.uint8)).save(buf, format="PNG")
+            st.session_state.gallery.add(buf.getvalue(), "noir.png")
+        render_gallery()
+
+    at = AppTest.from_function(app, kwargs={"directory": str(tmp_path)}).run()
+    assert not at.exception
+    assert any("Galerie pleine" in warning.value for warning in at.warning)
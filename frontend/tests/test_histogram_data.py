@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.histogram_data import compute_histogram_data, histogram_data
+
+
+def _image(mode: str = "RGB", seed: int = 0) -> Image.Image:
+    pixels = np.random.default_rng(seed).integers(30, 200, (40, 50, 3), dtype=np.uint8)
+    return Image.fromarray(pixels).convert(mode)
+
+
+def test_counts_and_stats_match_a_direct_computation():
+    image = _image("RGBA")
+    data = compute_histogram_data(image)
+    pixels = np.asarray(image.convert("RGB"))
+    for index, name in enumerate(("red", "green", "blue")):
+        assert np.array_equal(data.channel(name), np.bincount(pixels[:, :, index].ravel(), minlength=256))
+    assert data.pixels == 40 * 50 and not data.gray
+
+    stats = data.stats()
+    assert stats["mean"] == pytest.approx(pixels.mean())
+    assert stats["std"] == pytest.approx(pixels.std())
+    assert (stats["min"], stats["max"]) == (pixels.min(), pixels.max())
+
+
+def test_gray_images_use_one_channel():
+    image = _image("L", seed=1)
+    data = compute_histogram_data(image)
+    assert data.gray
+    assert np.array_equal(data.channel("gray"), np.bincount(np.asarray(image).ravel(), minlength=256))
+    assert data.y_max() == pytest.approx(np.percentile(data.channel("gray"), 98) * 1.1)
+
+
+def test_histograms_are_computed_once_per_image():
+    image = _image(seed=2)
+    assert histogram_data(image) is histogram_data(image)
+    assert histogram_data(image.copy()) is not histogram_data(image)
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from utils.history_store import HistoryStore
+
+
+def _image(seed: int, mode: str = "RGB") -> Image.Image:
+    pixels = np.random.default_rng(seed).integers(0, 256, (48, 64, 3), dtype=np.uint8)
+    return Image.fromarray(pixels).convert(mode)
+
+
+def _fill(store: HistoryStore, images: list) -> None:
+    for index, image in enumerate(images):
+        store.append(image, f"Étape {index}", {"step": index}, timestamp=index, preview=b"")
+
+
+def test_cold_steps_are_compressed_then_spilled_without_loss(tmp_path):
+    images = [_image(seed, mode) for seed, mode in enumerate(["RGB", "L", "RGBA", "CMYK", "RGB", "LA"])]
+    store = HistoryStore(hot_steps=2, memory_budget=20_000, spill_dir=str(tmp_path))
+    _fill(store, images)
+
+    stats = store.stats()
+    assert stats["steps"] == 6 and stats["decoded"] == 2
+    assert stats["compressed"] + stats["on_disk"] == 4
+    assert stats["on_disk"] >= 1 and stats["compressed_bytes"] <= 20_000
+
+    for entry, image in zip(store, images):
+        restored = entry["image"]
+        assert restored.mode == image.mode and restored.size == image.size
+        assert np.array_equal(np.asarray(restored), np.asarray(image))
+        assert entry["operation"].startswith("Étape")
+    assert store.stats()["decoded"] == 2  # Reading old steps kept the hot set bounded
+
+
+def test_truncate_removes_spilled_files(tmp_path):
+    store = HistoryStore(hot_steps=1, memory_budget=0, spill_dir=str(tmp_path))
+    _fill(store, [_image(seed) for seed in range(4)])
+    (spill_dir,) = [path for path in tmp_path.iterdir()]
+    assert len(os.listdir(spill_dir)) == 3
+
+    store.truncate(1)
+    assert len(store) == 1 and len(os.listdir(spill_dir)) == 1  # Only the kept step's file
+    uid = store[0].uid
+    assert store[0].uid == uid and np.array_equal(np.asarray(store[0]["image"]), np.asarray(_image(0)))
+
+
+def test_entries_behave_like_dicts(tmp_path):
+    store = HistoryStore(spill_dir=str(tmp_path))
+    _fill(store, [_image(0)])
+    entry = store[-1]
+    assert set(entry) == {"image", "operation", "params", "timestamp", "preview"}
+    assert entry["params"] == {"step": 0} and len(store[:]) == 1
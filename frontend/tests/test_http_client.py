@@ -0,0 +1,121 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from urllib3 import HTTPResponse
+
+from services.http_client import MAX_RETRY_AFTER, ApiHttpClient, default_retry
+
+
+class _Backend(BaseHTTPRequestHandler):
+    """Answers `busy_status` (503 + Retry-After by default) to the first `busy` requests, 200 afterwards"""
+
+    protocol_version = "HTTP/1.1"
+    busy = 0
+    busy_status = 503
+    busy_headers = {"Retry-After": "0"}
+    delay = 0.0
+    posts = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with _Backend.lock:
+            _Backend.posts += 1
+            saturated = _Backend.posts <= _Backend.busy
+        time.sleep(_Backend.delay)
+        if saturated:
+            self._reply(_Backend.busy_status, b"busy", _Backend.busy_headers)
+        else:
+            self._reply(200, b"ok")
+
+    do_GET = do_POST
+
+    def _reply(self, status: int, body: bytes, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def backend():
+    _Backend.busy = 0
+    _Backend.busy_status = 503
+    _Backend.busy_headers = {"Retry-After": "0"}
+    _Backend.delay = 0.0
+    _Backend.posts = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Backend)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_post_refused_with_503_is_retried(backend):
+    _Backend.busy = 2
+    client = ApiHttpClient()
+    response = client.post(f"{backend}/api/preprocess", 5, files={"file": ("image.png", b"png", "image/png")})
+    assert response.status_code == 200
+    assert _Backend.posts == 3
+    assert client.stats()["retries"] == 2
+    client.close()
+
+
+@pytest.mark.parametrize("status,headers", [(503, {}), (502, {}), (504, {"Retry-After": "0"})])
+def test_post_that_may_have_been_processed_is_not_retried(backend, status, headers):
+    _Backend.busy, _Backend.busy_status, _Backend.busy_headers = 1, status, headers
+    client = ApiHttpClient()
+    response = client.post(f"{backend}/api/preprocess", 5, files={"file": ("image.png", b"png", "image/png")})
+    assert response.status_code == status
+    assert _Backend.posts == 1
+    client.close()
+
+
+def test_post_read_timeout_is_not_retried(backend):
+    _Backend.delay = 0.3
+    client = ApiHttpClient()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.post(f"{backend}/api/pipeline", 0.1, files={"file": ("image.png", b"png", "image/png")})
+    time.sleep(0.4)
+    assert _Backend.posts == 1
+    # A GET is idempotent: it gets one more read attempt
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get(f"{backend}/api/test", 0.1)
+    time.sleep(0.4)
+    assert _Backend.posts == 3
+    client.close()
+
+
+def test_retry_after_wait_is_capped():
+    retry = default_retry()
+    response = HTTPResponse(status=503, headers={"Retry-After": "3600"})
+    assert retry.get_retry_after(response) == MAX_RETRY_AFTER
+    assert retry.get_retry_after(HTTPResponse(status=503, headers={"Retry-After": "1"})) == 1
+    assert retry.new(total=1).get_retry_after(response) == MAX_RETRY_AFTER
+
+
+def test_threads_use_their_own_session_and_share_the_pool(backend):
+    client = ApiHttpClient(pool_size=4)
+    sessions = set()
+
+    def call(_):
+        sessions.add(id(client.session))
+        return client.get(f"{backend}/api/test", 5).status_code
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        assert set(pool.map(call, range(40))) == {200}
+    stats = client.stats()
+    assert len(sessions) == 4
+    assert stats["requests"] == 40
+    assert stats["connections_opened"] <= 4
+    client.close()
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.helpers import image_to_bytes
+from utils.image_metrics import estimate_png_size, mean_difference, overview_metrics
+
+
+def _photo(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Smooth gradient plus noise: compresses like a photo, not like random bytes"""
+    y, x = np.mgrid[0:height, 0:width]
+    noise = np.random.default_rng(seed).integers(0, 24, (height, width, 3))
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1) + noise
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def test_mean_difference_is_exact_below_the_limit():
+    original = Image.new("RGB", (20, 10), (100, 100, 100))
+    current = Image.new("RGB", (20, 10), (110, 100, 90))
+    assert mean_difference(original, current) == pytest.approx(20 / 3)
+    assert mean_difference(original, original.resize((10, 5))) is None
+
+
+def test_sampled_mean_difference_is_close_to_the_full_one():
+    original = _photo(1200, 900)
+    current = Image.fromarray(np.clip(np.asarray(original, dtype=np.int16) + 12, 0, 255).astype(np.uint8))
+    full = mean_difference(original, current, max_pixels=10**9)
+    sampled = mean_difference(original, current, max_pixels=50_000)
+    assert sampled == pytest.approx(full, rel=0.05)
+
+
+def test_png_size_is_exact_for_small_images_and_estimated_for_large_ones():
+    small = _photo(100, 80)
+    assert estimate_png_size(small) == (len(image_to_bytes(small)), True)
+
+    large = _photo(800, 1600, seed=1)
+    size, exact = estimate_png_size(large, sample_pixels=100_000)
+    assert not exact
+    assert size == pytest.approx(len(image_to_bytes(large)), rel=0.15)
+
+
+def test_overview_counts_operations_and_reduction():
+    original = _photo(100, 100)
+    current = original.crop((0, 0, 50, 100))
+    metrics = overview_metrics(original, current, ["Original", "Découpe"])
+    assert metrics["reduction"] == 50
+    assert metrics["operations"] == 1
+    assert metrics["difference"] is None and metrics["size_exact"]
@@ -0,0 +1,32 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.raw_format import decode_image, encode_image
+
+
+def _payload(width: int, height: int, channels: int, order: bytes, compression: int, payload: bytes) -> bytes:
+    return struct.pack("<4sBBBB4sIIQ4x", b"IFRW", 1, 1, channels, compression, order,
+                       width, height, len(payload)) + payload
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+@pytest.mark.parametrize("mode", ["L", "RGB", "RGBA"])
+def test_round_trip_is_exact(mode, compression):
+    pixels = np.random.default_rng(0).integers(0, 256, (24, 32, len(mode)), dtype=np.uint8)
+    image = Image.fromarray(pixels[:, :, 0] if mode == "L" else pixels, mode=mode)
+    decoded = decode_image(encode_image(image, compression))
+    assert decoded.mode == mode
+    assert np.array_equal(np.asarray(decoded), np.asarray(image))
+
+
+def test_wrong_size_and_bombs_are_rejected():
+    with pytest.raises(ValueError):
+        decode_image(_payload(4, 4, 1, b"L\x00\x00\x00", 0, b"\x00" * 15))
+    with pytest.raises(ValueError):
+        decode_image(_payload(4, 4, 1, b"L\x00\x00\x00", 1, zlib.compress(b"\x00" * (8 * 1024 * 1024))))
+    with pytest.raises(ValueError, match="trop grande"):
+        decode_image(_payload(100_000, 100_000, 1, b"L\x00\x00\x00", 1, zlib.compress(b"\x00")))
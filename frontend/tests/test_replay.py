@@ -0,0 +1,50 @@
+import numpy as np
+from PIL import Image
+
+from services.api_client import decode_image_response, post_image
+from services.replay import replay_recipe
+from utils.history_store import HistoryStore
+
+STEPS = [
+    {"endpoint": "preprocess", "data": {"brightness": "20"}},
+    {"endpoint": "preprocess", "data": {"blur_type": "gaussian", "blur_kernel": "5"}},
+    {"endpoint": "crop", "data": {"x": "5", "y": "4", "width": "40", "height": "30"}},
+    {"endpoint": "preprocess", "data": {"grayscale": "true"}},
+    {"endpoint": "preprocess", "data": {"threshold": "120"}},
+    {"endpoint": "preprocess", "data": {"rotate_angle": "90"}},
+    {"endpoint": "preprocess", "data": {"flip": "horizontal"}},
+]
+
+
+def _original() -> Image.Image:
+    return Image.fromarray(np.random.default_rng(8).integers(0, 256, (48, 64, 3), dtype=np.uint8))
+
+
+def _apply(image: Image.Image, recipe: dict) -> Image.Image:
+    response = post_image(recipe["endpoint"], image, recipe["data"])
+    assert response.status_code == 200, response.text
+    return decode_image_response(response)
+
+
+def test_local_crop_replay_matches_the_backend(live_api):
+    image = _original()
+    recipe = STEPS[2]
+    assert np.array_equal(np.asarray(replay_recipe(image, recipe)), np.asarray(_apply(image, recipe)))
+
+
+def test_recipe_history_rebuilds_every_step_exactly(live_api, tmp_path):
+    store = HistoryStore(hot_steps=1, spill_dir=str(tmp_path), replay=replay_recipe, keyframe_every=3)
+    image = _original()
+    expected = [image]
+    store.append(image, "Original", {}, timestamp=0, preview=b"")
+    for index, recipe in enumerate(STEPS, start=1):
+        image = _apply(image, recipe)
+        expected.append(image)
+        store.append(image, recipe["endpoint"], recipe["data"], timestamp=index, preview=b"", recipe=recipe)
+
+    stats = store.stats()
+    assert stats["keyframes"] == 3 and stats["decoded"] == 1
+    # Oldest first, then newest first: both directions rebuild from keyframes
+    for index in list(range(len(expected))) + list(reversed(range(len(expected)))):
+        rebuilt = store[index]["image"]
+        assert np.array_equal(np.asarray(rebuilt), np.asarray(expected[index])), index
@@ -0,0 +1,97 @@
+import os
+import threading
+import weakref
+from collections import OrderedDict, deque
+
+from PIL import Image
+
+# Budget mémoire du cache d'images encodées, partagé par toutes les sessions du processus
+DEFAULT_BUDGET_MB = float(os.environ.get("IMAGE_BYTES_CACHE_MB", "128"))
+
+
+class EncodedImageCache:
+    """Cache LRU des octets encodés d'images PIL, borné en mémoire
+
+    La clé est l'identité de l'objet image (les images de l'historique ne sont
+    jamais modifiées sur place), plus le format et le profil d'encodage. Une
+    référence faible vérifie que l'objet est toujours le même, et l'entrée
+    disparaît à l'accès suivant au cache une fois l'image libérée.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (id, format, profil) -> (weakref, octets)
+        self._size = 0
+        self._lock = threading.Lock()
+        # Clés des images libérées, purgées sous le verrou au prochain accès
+        self._released = deque()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_encode(self, image: Image.Image, format: str, profile: str, encode) -> bytes:
+        key = (id(image), format, profile)
+        with self._lock:
+            self._purge()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0]() is image:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        data = encode()
+        self._store(key, image, data)
+        return data
+
+    def _store(self, key: tuple, image: Image.Image, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        try:
+            ref = weakref.ref(image, lambda _, key=key: self._discard(key))
+        except TypeError:
+            return
+        with self._lock:
+            self._purge()
+            self._pop(key)
+            self._entries[key] = (ref, data)
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _pop(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
+
+    def _discard(self, key: tuple) -> None:
+        # Appelé à la libération de l'image, dans n'importe quel thread, y compris
+        # celui qui tient déjà self._lock: la clé est seulement mise de côté
+        self._released.append(key)
+
+    def _purge(self) -> None:
+        # Verrou tenu
+        while self._released:
+            key = self._released.popleft()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0]() is None:
+                self._pop(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._purge()
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_cache = EncodedImageCache(int(DEFAULT_BUDGET_MB * 1024 * 1024))
+
+
+def get_encoded_cache() -> EncodedImageCache:
+    return _cache
@@ -0,0 +1,162 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+
+from PIL import Image
+
+from utils.thumbnails import PREVIEW_SIZE, thumbnail_bytes
+
+# Nombre maximal d'images par galerie (par session)
+MAX_ITEMS = int(os.environ.get("GALLERY_MAX_ITEMS", "50"))
+# Répertoire des originaux de la galerie (un sous-répertoire par session)
+GALLERY_DIR = os.environ.get("GALLERY_DIR", tempfile.gettempdir())
+
+_NGRAM = 3
+
+
+def _ngrams(text: str) -> set:
+    return {text[i:i + _NGRAM] for i in range(len(text) - _NGRAM + 1)}
+
+
+class GalleryItem:
+    """Entrée de galerie: métadonnées et miniature en mémoire, original sur disque"""
+
+    __slots__ = ("digest", "name", "size", "uploaded_at", "dimensions", "mode", "thumbnail", "path", "_image")
+
+    def __init__(self, digest: str, name: str, size: int, dimensions: tuple, mode: str, thumbnail: bytes, path: str):
+        self.digest = digest
+        self.name = name
+        self.size = size
+        self.uploaded_at = datetime.now()
+        self.dimensions = dimensions
+        self.mode = mode
+        self.thumbnail = thumbnail
+        self.path = path
+        self._image = None  # weakref vers la dernière image chargée
+
+
+class GalleryStore:
+    """Galerie d'une session, adressée par contenu
+
+    Les fichiers envoyés sont écrits tels quels sur disque sous leur empreinte
+    SHA-256: un même contenu n'est stocké qu'une fois, quel que soit son nom.
+    La session ne garde que métadonnées et miniatures; l'image complète est
+    décodée à la sélection (et réutilisée tant qu'elle est vivante ailleurs).
+    Les noms sont indexés par trigrammes pour la recherche.
+    """
+
+    def __init__(self, max_items: int = MAX_ITEMS, directory: str = GALLERY_DIR):
+        self.max_items = max_items
+        self.directory = directory
+        self._items = OrderedDict()  # empreinte -> GalleryItem, dans l'ordre d'ajout
+        self._index = {}  # trigramme -> empreintes dont le nom le contient
+        self._dir = None
+        self._finalizer = None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(list(self._items.values()))
+
+    def get(self, digest: str):
+        return self._items.get(digest)
+
+    def add(self, data: bytes, name: str, image: Image.Image = None) -> tuple:
+        """(entrée, ajoutée?) pour un fichier envoyé
+
+        Un contenu déjà présent renvoie l'entrée existante; une galerie pleine
+        renvoie (None, False). `image`, si fournie, est l'image déjà décodée du
+        fichier: elle sert à la miniature et évite un rechargement immédiat.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        existing = self._items.get(digest)
+        if existing is not None:
+            return existing, False
+        if len(self._items) >= self.max_items:
+            return None, False
+
+        if image is None:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        # Même cache que l'historique et la barre latérale: l'image affichée
+        # juste après l'envoi n'est pas réduite une seconde fois
+        thumbnail = thumbnail_bytes(image, PREVIEW_SIZE)
+
+        path = os.path.join(self._directory(), digest)
+        with open(path, "wb") as f:
+            f.write(data)
+        item = GalleryItem(digest, name, len(data), image.size, image.mode, thumbnail, path)
+        item._image = weakref.ref(image)
+        self._items[digest] = item
+        for gram in _ngrams(name.lower()):
+            self._index.setdefault(gram, set()).add(digest)
+        return item, True
+
+    def load(self, item: GalleryItem) -> Image.Image:
+        """Image complète d'une entrée (décodée depuis le disque si elle n'est plus en mémoire)"""
+        image = item._image() if item._image is not None else None
+        if image is None:
+            with open(item.path, "rb") as f:
+                image = Image.open(io.BytesIO(f.read()))
+                image.load()
+            item._image = weakref.ref(image)
+        return image
+
+    def remove(self, digest: str) -> None:
+        item = self._items.pop(digest, None)
+        if item is None:
+            return
+        for gram in _ngrams(item.name.lower()):
+            postings = self._index.get(gram)
+            if postings is not None:
+                postings.discard(digest)
+                if not postings:
+                    del self._index[gram]
+        try:
+            os.remove(item.path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        for digest in list(self._items):
+            self.remove(digest)
+
+    def search(self, term: str) -> list:
+        """Entrées dont le nom contient `term` (sans casse), dans l'ordre d'ajout
+
+        Les candidats sont ceux qui partagent tous les trigrammes du terme;
+        seuls ceux-là sont vérifiés. Un terme de moins de trois caractères
+        parcourt toute la galerie.
+        """
+        term = term.lower()
+        if not term:
+            return list(self._items.values())
+        grams = _ngrams(term)
+        if grams:
+            postings = [self._index.get(gram, set()) for gram in grams]
+            candidates = set.intersection(*postings)
+            items = sorted((self._items[digest] for digest in candidates), key=lambda item: item.uploaded_at)
+        else:
+            items = self._items.values()
+        return [item for item in items if term in item.name.lower()]
+
+    def _directory(self) -> str:
+        if self._dir is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._dir = tempfile.mkdtemp(prefix="imageflow-gallery-", dir=self.directory)
+            # Le répertoire disparaît avec la session (ou à l'arrêt du processus)
+            self._finalizer = weakref.finalize(self, shutil.rmtree, self._dir, True)
+        return self._dir
+
+    def stats(self) -> dict:
+        return {
+            "items": len(self._items),
+            "thumbnail_bytes": sum(len(item.thumbnail) for item in self._items.values()),
+            "disk_bytes": sum(item.size for item in self._items.values()),
+        }
@@ -1,13 +1,28 @@
 import io
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
+from utils.encoded_cache import get_encoded_cache
 
-def image_to_bytes(image: Image.Image, format: str = 'PNG') -> bytes:
-    """Convertit une image PIL en bytes avec format spécifique"""
-    buf = io.BytesIO()
-    image.save(buf, format=format, optimize=True)
-    buf.seek(0)
-    return buf.getvalue()
+# Profils d'encodage: "download" produit le fichier le plus petit (téléchargements,
+# taille estimée), "upload" encode vite pour l'envoi au backend qui redécode aussitôt
+ENCODE_PROFILES = {
+    "download": {"optimize": True},
+    "upload": {"compress_level": 1},
+}
+
+def image_to_bytes(image: Image.Image, format: str = 'PNG', profile: str = 'download') -> bytes:
+    """Convertit une image PIL en bytes avec format spécifique
+
+    Le résultat est mis en cache par image, format et profil: la même image
+    n'est jamais encodée deux fois.
+    """
+    def encode() -> bytes:
+        options = ENCODE_PROFILES[profile] if format.upper() == 'PNG' else {"optimize": True}
+        buf = io.BytesIO()
+        image.save(buf, format=format, **options)
+        return buf.getvalue()
+
+    return get_encoded_cache().get_or_encode(image, format.upper(), profile, encode)
 
 def create_split_view(original_img, processed_img, show_labels=True):
     """Crée une vue divisée pour comparer avant/après"""
@@ -46,3 +61,23 @@ def create_split_view(original_img, processed_img, show_labels=True):
         draw.text((new_width1 + 20, 10), "APRÈS", fill=(255, 255, 255), stroke_width=2, stroke_fill=(0, 0, 0), font=font)
     
     return composite
+
+def operation_name(params: dict) -> str:
+    """Nom d'historique d'une opération /preprocess, d'après ses paramètres"""
+    operation_name = "Opération"
+    
+    if 'grayscale' in params or 'equalize' in params or 'normalize' in params:
+        operation_name = "Conversions couleur"
+    elif 'threshold' in params:
+        operation_name = "Seuillage"
+    elif 'blur_type' in params:
+        operation_name = f"Filtre {params.get('blur_type', 'unknown')}"
+    elif 'resize_width' in params:
+        operation_name = "Redimensionnement"
+    elif 'rotate_angle' in params or 'flip' in params:
+        operation_name = "Transformations géométriques"
+    elif 'brightness' in params or 'contrast' in params:
+        operation_name = "Ajustements visuels"
+    elif 'edge_detection' in params:
+        operation_name = f"Détection {params.get('edge_detection', 'unknown')}"
+    return operation_name
@@ -0,0 +1,87 @@
+import threading
+import weakref
+
+import numpy as np
+from PIL import Image
+
+CHANNELS = ("red", "green", "blue")
+_GRAY_MODES = ("1", "L", "LA", "I", "I;16", "F")
+
+
+class HistogramData:
+    """Histogrammes 256 niveaux de tous les canaux d'une image, et ce qui s'en déduit
+
+    `counts` a une ligne par canal R, G, B (identiques pour une image en
+    niveaux de gris). Limites d'axe et statistiques sont calculées à partir
+    des comptes, sans repasser sur les pixels.
+    """
+
+    def __init__(self, counts: np.ndarray, gray: bool):
+        self.counts = counts
+        self.gray = gray
+        self.pixels = int(counts[0].sum())
+
+    def channel(self, name: str) -> np.ndarray:
+        """Comptes d'un canal ("red", "green", "blue" ou "gray")"""
+        return self.counts[0 if name == "gray" else CHANNELS.index(name)]
+
+    def y_max(self, name: str = None) -> float:
+        """Limite de l'axe Y: 98e percentile des fréquences (d'un canal, ou de tous) x 1.1"""
+        if name is not None:
+            values = self.channel(name)
+        else:
+            values = self.counts[0] if self.gray else self.counts.ravel()
+        return float(np.percentile(values, 98) * 1.1)
+
+    def stats(self) -> dict:
+        """Moyenne, écart-type, minimum et maximum de toutes les valeurs R, G, B"""
+        totals = self.counts.sum(axis=0).astype(np.float64)
+        levels = np.arange(256, dtype=np.float64)
+        n = totals.sum()
+        mean = (levels * totals).sum() / n
+        variance = ((levels - mean) ** 2 * totals).sum() / n
+        present = np.flatnonzero(totals)
+        return {
+            "mean": float(mean),
+            "std": float(np.sqrt(variance)),
+            "min": int(present[0]),
+            "max": int(present[-1]),
+        }
+
+
+def compute_histogram_data(image: Image.Image) -> HistogramData:
+    """Un seul passage sur les pixels pour tous les canaux
+
+    Image.histogram compte tous les canaux en C sans copier les pixels dans
+    un tableau numpy (environ 10x plus rapide qu'un np.bincount équivalent).
+    """
+    if image.mode in _GRAY_MODES:
+        gray = np.asarray(image.convert('L').histogram(), dtype=np.int64)
+        return HistogramData(np.stack([gray, gray, gray]), True)
+    rgb = image if image.mode == 'RGB' else image.convert('RGB')
+    counts = np.asarray(rgb.histogram(), dtype=np.int64)
+    return HistogramData(counts.reshape(3, 256), False)
+
+
+_cache = {}  # id(image) -> (weakref, HistogramData)
+_lock = threading.Lock()
+
+
+def _forget(key: int) -> None:
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0]() is None:
+            del _cache[key]
+
+
+def histogram_data(image: Image.Image) -> HistogramData:
+    """Histogrammes d'une image, calculés une fois par image (identité de l'objet)"""
+    key = id(image)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0]() is image:
+            return entry[1]
+    data = compute_histogram_data(image)
+    with _lock:
+        _cache[key] = (weakref.ref(image, lambda _, key=key: _forget(key)), data)
+    return data
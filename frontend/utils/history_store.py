@@ -0,0 +1,249 @@
+import io
+import itertools
+import os
+import shutil
+import tempfile
+import uuid
+import weakref
+import zlib
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from PIL import Image
+
+# Étapes gardées décodées (les plus récemment utilisées)
+HOT_STEPS = int(os.environ.get("HISTORY_HOT_STEPS", "5"))
+# Budget mémoire des étapes compressées, par session; au-delà elles passent sur disque
+MEMORY_BUDGET_MB = float(os.environ.get("HISTORY_MEMORY_MB", "64"))
+# Répertoire des étapes déchargées sur disque (un sous-répertoire par session)
+SPILL_DIR = os.environ.get("HISTORY_SPILL_DIR", tempfile.gettempdir())
+# "snapshot": chaque étape garde ses pixels. "recipe": seule une étape sur
+# HISTORY_KEYFRAME_EVERY les garde, les autres sont rejouées à la demande
+MODE = os.environ.get("HISTORY_MODE", "snapshot").lower()
+KEYFRAME_EVERY = int(os.environ.get("HISTORY_KEYFRAME_EVERY", "8"))
+
+# Modes que PNG conserve sans perte; les autres sont stockés en pixels zlib
+_PNG_MODES = {"1", "L", "LA", "P", "RGB", "RGBA", "I", "I;16"}
+
+# Identifiants d'étapes, uniques dans le processus (clés des caches d'export)
+_step_ids = itertools.count(1)
+
+
+def _pack(image: Image.Image) -> bytes:
+    """Compression sans perte d'une étape (PNG rapide, ou pixels zlib pour les autres modes)"""
+    buf = io.BytesIO()
+    if image.mode in _PNG_MODES:
+        image.save(buf, format="PNG", compress_level=1)
+        return buf.getvalue()
+    header = f"{image.mode}|{image.width}|{image.height}|".encode("ascii")
+    return b"ZRAW" + header + zlib.compress(image.tobytes(), 1)
+
+
+def _unpack(data: bytes) -> Image.Image:
+    if data.startswith(b"ZRAW"):
+        mode, width, height, pixels = data[4:].split(b"|", 3)
+        return Image.frombytes(mode.decode("ascii"), (int(width), int(height)), zlib.decompress(pixels))
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+def _decoded_size(image: Image.Image) -> int:
+    return image.width * image.height * len(image.getbands())
+
+
+class _Step:
+    __slots__ = ("uid", "image", "packed", "path", "stored_size", "meta", "recipe", "keyframe")
+
+    def __init__(self, image: Image.Image, meta: dict, recipe: dict, keyframe: bool):
+        self.uid = next(_step_ids)
+        self.image = image
+        self.packed = None
+        self.path = None
+        self.stored_size = 0
+        self.meta = meta
+        self.recipe = recipe
+        self.keyframe = keyframe
+
+    def has_pixels(self) -> bool:
+        return self.image is not None or self.packed is not None or self.path is not None
+
+
+class HistoryEntry(Mapping):
+    """Vue d'une étape: métadonnées directes, image ('image') décodée à la demande"""
+
+    def __init__(self, store: "HistoryStore", step: _Step):
+        self._store = store
+        self._step = step
+
+    @property
+    def uid(self) -> int:
+        """Identifiant stable de l'étape (ne change pas quand son image change de niveau)"""
+        return self._step.uid
+
+    def __getitem__(self, key):
+        if key == "image":
+            return self._store._load(self._step)
+        return self._step.meta[key]
+
+    def __iter__(self):
+        yield "image"
+        yield from self._step.meta
+
+    def __len__(self):
+        return len(self._step.meta) + 1
+
+
+class HistoryStore:
+    """Historique d'une session, stocké par niveaux
+
+    Les `hot_steps` étapes les plus récemment utilisées restent décodées, les
+    autres sont gardées compressées sans perte en mémoire, et au-delà de
+    `memory_budget` octets les plus anciennes sont écrites sur disque. Se
+    manipule comme une liste d'entrées (len, index, tranches, itération).
+
+    Avec `replay` et `keyframe_every` > 1 (mode "recipe"), seules les images
+    clés (une étape sur `keyframe_every`, et toute étape sans recette) gardent
+    leurs pixels en quittant le niveau décodé. Les autres ne conservent que
+    leur recette {endpoint, data} et sont reconstruites en rejouant les
+    recettes depuis l'étape précédente la plus proche qui a encore ses pixels.
+    """
+
+    def __init__(self, hot_steps: int = HOT_STEPS, memory_budget: int = int(MEMORY_BUDGET_MB * 1024 * 1024),
+                 spill_dir: str = SPILL_DIR, replay=None, keyframe_every: int = None):
+        self.hot_steps = max(1, hot_steps)
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.replay = replay
+        if keyframe_every is None:
+            keyframe_every = KEYFRAME_EVERY if MODE == "recipe" else 1
+        self.keyframe_every = keyframe_every if replay is not None else 1
+        self._steps = []
+        self._hot = OrderedDict()  # id(step) -> step, du moins au plus récemment utilisé
+        self._dir = None
+        self._finalizer = None
+
+    # --- Interface liste ---
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [HistoryEntry(self, step) for step in self._steps[index]]
+        return HistoryEntry(self, self._steps[index])
+
+    def __iter__(self):
+        return (HistoryEntry(self, step) for step in list(self._steps))
+
+    def append(self, image: Image.Image, operation: str, params: dict, timestamp, preview: bytes,
+               recipe: dict = None) -> None:
+        """Ajoute une étape; `recipe` ({endpoint, data}) permet de la rejouer depuis la précédente"""
+        keyframe = recipe is None or self.keyframe_every <= 1 or len(self._steps) % self.keyframe_every == 0
+        meta = {"operation": operation, "params": params, "timestamp": timestamp, "preview": preview}
+        step = _Step(image, meta, recipe, keyframe)
+        self._steps.append(step)
+        self._touch(step)
+
+    def truncate(self, length: int) -> None:
+        """Supprime les étapes à partir de `length` (nouvelle branche après un undo)"""
+        for step in self._steps[length:]:
+            self._drop(step)
+        del self._steps[length:]
+
+    def clear(self) -> None:
+        self.truncate(0)
+
+    # --- Niveaux ---
+
+    def _load(self, step: _Step) -> Image.Image:
+        if step.image is None:
+            if step.packed is not None:
+                step.image = _unpack(step.packed)
+            elif step.path is not None:
+                with open(step.path, "rb") as f:
+                    step.image = _unpack(f.read())
+            else:
+                step.image = self._rebuild(step)
+        self._touch(step)
+        return step.image
+
+    def _rebuild(self, step: _Step) -> Image.Image:
+        """Rejoue les recettes depuis l'étape précédente la plus proche qui a ses pixels"""
+        index = self._steps.index(step)
+        base = index - 1
+        while not self._steps[base].has_pixels():
+            base -= 1
+        image = self._load(self._steps[base])
+        for later in self._steps[base + 1:index]:
+            image = self.replay(image, later.recipe)
+            later.image = image
+            self._touch(later)
+        return self.replay(image, step.recipe)
+
+    def _touch(self, step: _Step) -> None:
+        self._hot[id(step)] = step
+        self._hot.move_to_end(id(step))
+        while len(self._hot) > self.hot_steps:
+            _, coldest = self._hot.popitem(last=False)
+            self._demote(coldest)
+        self._spill()
+
+    def _demote(self, step: _Step) -> None:
+        if not step.keyframe:
+            step.image = None
+            return
+        # La forme compressée est gardée une fois calculée: redescendre ne coûte rien
+        if step.packed is None and step.path is None:
+            step.packed = _pack(step.image)
+            step.stored_size = len(step.packed)
+        step.image = None
+
+    def _spill(self) -> None:
+        in_memory = sum(len(step.packed) for step in self._steps if step.packed is not None)
+        for step in self._steps:
+            if in_memory <= self.memory_budget:
+                break
+            if step.packed is None:
+                continue
+            path = os.path.join(self._spill_directory(), f"step-{uuid.uuid4().hex}.bin")
+            with open(path, "wb") as f:
+                f.write(step.packed)
+            in_memory -= len(step.packed)
+            step.path = path
+            step.packed = None
+
+    def _spill_directory(self) -> str:
+        if self._dir is None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._dir = tempfile.mkdtemp(prefix="imageflow-history-", dir=self.spill_dir)
+            # Le répertoire disparaît avec la session (ou à l'arrêt du processus)
+            self._finalizer = weakref.finalize(self, shutil.rmtree, self._dir, True)
+        return self._dir
+
+    def _drop(self, step: _Step) -> None:
+        self._hot.pop(id(step), None)
+        if step.path is not None:
+            try:
+                os.remove(step.path)
+            except FileNotFoundError:
+                pass
+        step.image = step.packed = step.path = None
+
+    # --- Rapport ---
+
+    def stats(self) -> dict:
+        """Occupation de l'historique de la session, par niveau"""
+        decoded = [step for step in self._steps if step.image is not None]
+        packed = [step for step in self._steps if step.packed is not None]
+        spilled = [step for step in self._steps if step.path is not None]
+        return {
+            "steps": len(self._steps),
+            "keyframes": sum(1 for step in self._steps if step.keyframe),
+            "decoded": len(decoded),
+            "decoded_bytes": sum(_decoded_size(step.image) for step in decoded),
+            "compressed": len(packed),
+            "compressed_bytes": sum(len(step.packed) for step in packed),
+            "on_disk": len(spilled),
+            "disk_bytes": sum(step.stored_size for step in spilled),
+        }
@@ -0,0 +1,77 @@
+import io
+import math
+import os
+
+import numpy as np
+from PIL import Image
+
+from utils.helpers import image_to_bytes
+
+# Au-delà de ce nombre de pixels, les métriques sont calculées sur un échantillon
+MAX_METRIC_PIXELS = int(os.environ.get("OVERVIEW_MAX_PIXELS", "1000000"))
+# Pixels (répartis en bandes de lignes) encodés pour estimer la taille PNG
+SIZE_SAMPLE_PIXELS = int(os.environ.get("OVERVIEW_SIZE_SAMPLE_PIXELS", "250000"))
+SIZE_SAMPLE_BANDS = 16
+
+_SAMPLED_MODES = ("L", "LA", "RGB", "RGBA")
+
+
+def _sampled_rgb(image: Image.Image, size: tuple) -> np.ndarray:
+    if image.size != size:
+        # Plus proche voisin: un échantillon de pixels réels, pas une moyenne
+        # (moyenner effacerait les différences fines comme le bruit ou le flou)
+        image = image.resize(size, Image.NEAREST)
+    return np.asarray(image.convert('RGB'), dtype=np.int16)
+
+
+def mean_difference(original: Image.Image, current: Image.Image, max_pixels: int = MAX_METRIC_PIXELS):
+    """Écart absolu moyen par canal (0-255), ou None si les dimensions diffèrent
+
+    Au-delà de `max_pixels`, la moyenne porte sur une grille régulière de
+    pixels, la même dans les deux images.
+    """
+    if original.size != current.size:
+        return None
+    width, height = original.size
+    factor = math.sqrt(width * height / max_pixels)
+    size = (max(1, int(width / factor)), max(1, int(height / factor))) if factor > 1 else original.size
+    return float(np.abs(_sampled_rgb(original, size) - _sampled_rgb(current, size)).mean())
+
+
+def estimate_png_size(image: Image.Image, sample_pixels: int = SIZE_SAMPLE_PIXELS) -> tuple:
+    """(taille en octets, exacte?) du PNG téléchargeable de l'image
+
+    Les images d'au plus `sample_pixels` pixels sont encodées pour de bon (le
+    résultat reste dans le cache d'encodage pour le téléchargement). Au-delà,
+    des bandes de lignes pleine résolution réparties sur la hauteur sont
+    encodées et la taille extrapolée: PNG filtre et compresse ligne par
+    ligne, donc ces bandes sont bien plus représentatives qu'une copie réduite.
+    """
+    width, height = image.size
+    rows = max(1, sample_pixels // (width * SIZE_SAMPLE_BANDS))
+    if width * height <= sample_pixels or rows * SIZE_SAMPLE_BANDS >= height or image.mode not in _SAMPLED_MODES:
+        return len(image_to_bytes(image)), True
+    step = height // SIZE_SAMPLE_BANDS
+    sample = Image.new(image.mode, (width, rows * SIZE_SAMPLE_BANDS))
+    for band in range(SIZE_SAMPLE_BANDS):
+        top = band * step + (step - rows) // 2
+        sample.paste(image.crop((0, top, width, top + rows)), (0, band * rows))
+    buf = io.BytesIO()
+    sample.save(buf, format='PNG', optimize=True)
+    return int(buf.tell() * height / sample.size[1]), False
+
+
+def overview_metrics(original: Image.Image, current: Image.Image, operations: list) -> dict:
+    """Métriques de l'onglet "Vue d'ensemble" pour une paire (originale, courante)"""
+    original_pixels = original.size[0] * original.size[1]
+    current_pixels = current.size[0] * current.size[1]
+    size_bytes, size_exact = estimate_png_size(current)
+    return {
+        "original_pixels": original_pixels,
+        "current_pixels": current_pixels,
+        "reduction": (original_pixels - current_pixels) / original_pixels * 100,
+        "difference": mean_difference(original, current),
+        "operations": sum(1 for operation in operations if operation != 'Original'),
+        "size_bytes": size_bytes,
+        "size_exact": size_exact,
+    }
@@ -0,0 +1,126 @@
+import struct
+import zlib
+from PIL import Image
+
+# Compressions optionnelles, utilisées si installées
+try:
+    import lz4.frame as _lz4
+except ImportError:
+    _lz4 = None
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+
+# Format de pixels bruts partagé avec backend/app/core/raw_format.py (à garder synchronisé).
+#
+#   magic "IFRW" | version u8 | dtype u8 | canaux u8 | compression u8 |
+#   ordre des canaux 4s | largeur u32 | hauteur u32 | taille du payload u64 | 4 octets de bourrage
+#
+# suivi des pixels entrelacés, ligne par ligne, éventuellement compressés.
+RAW_MEDIA_TYPE = "application/x-imageflow-raw"
+COMPRESSION_HEADER = "X-Raw-Compression"
+
+MAGIC = b"IFRW"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBBB4sIIQ4x")
+DTYPE_UINT8 = 1
+
+# Ordre des canaux -> (mode PIL, raw mode PIL, nombre de canaux)
+ORDERS = {
+    "L": ("L", "L", 1),
+    "RGB": ("RGB", "RGB", 3),
+    "RGBA": ("RGBA", "RGBA", 4),
+    "BGR": ("RGB", "BGR", 3),
+    "BGRA": ("RGBA", "BGRA", 4),
+}
+
+_COMPRESSION_CODES = {"none": 0, "zlib": 1, "lz4": 2, "zstd": 3}
+_COMPRESSION_NAMES = {code: name for name, code in _COMPRESSION_CODES.items()}
+
+
+def available_compressions() -> list:
+    """Compressions disponibles dans ce processus, de la plus rapide à la plus lente"""
+    names = ["none"]
+    if _lz4 is not None:
+        names.append("lz4")
+    if _zstd is not None:
+        names.append("zstd")
+    names.append("zlib")
+    return names
+
+
+def encode_image(image: Image.Image, compression: str = "none") -> bytes:
+    """Sérialise une image PIL en pixels bruts (aucun codec d'image)"""
+    header, pixels = encode_parts(image, compression)
+    return header + pixels
+
+
+def encode_parts(image: Image.Image, compression: str = "none") -> tuple:
+    """En-tête et pixels séparés, pour les écrire sans les concaténer"""
+    if image.mode not in ("L", "RGB", "RGBA"):
+        image = image.convert("RGB")
+    pixels = image.tobytes()
+    if compression == "zlib":
+        pixels = zlib.compress(pixels, 1)
+    elif compression == "lz4" and _lz4 is not None:
+        pixels = _lz4.compress(pixels)
+    elif compression == "zstd" and _zstd is not None:
+        pixels = _zstd.ZstdCompressor(level=1).compress(pixels)
+    else:
+        compression = "none"
+    header = _HEADER.pack(MAGIC, VERSION, DTYPE_UINT8, ORDERS[image.mode][2], _COMPRESSION_CODES[compression],
+                          image.mode.encode("ascii"), image.width, image.height, len(pixels))
+    return header, pixels
+
+
+def _decompress(name: str, payload, expected: int) -> bytes:
+    """Décompresse au plus `expected` octets: un payload qui en produit plus est rejeté"""
+    try:
+        if name == "zlib":
+            decompressor = zlib.decompressobj()
+            pixels = decompressor.decompress(payload, expected + 1)
+            complete = decompressor.eof
+        elif name == "lz4" and _lz4 is not None:
+            decompressor = _lz4.LZ4FrameDecompressor()
+            pixels = decompressor.decompress(payload, max_length=expected + 1)
+            complete = decompressor.eof
+        elif name == "zstd" and _zstd is not None:
+            # Une trame qui annonce sa taille est allouée d'avance: la vérifier avant
+            if _zstd.frame_content_size(payload) not in (-1, expected):
+                raise ValueError("Taille des pixels incohérente avec l'en-tête")
+            pixels = _zstd.ZstdDecompressor().decompress(payload, max_output_size=expected)
+            complete = True
+        else:
+            raise ValueError(f"Compression non supportée: {name}")
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Payload {name} corrompu: {e}")
+    if not complete or len(pixels) != expected:
+        raise ValueError("Taille des pixels incohérente avec l'en-tête")
+    return pixels
+
+
+def decode_image(data: bytes) -> Image.Image:
+    """Reconstruit une image PIL à partir d'un payload de pixels bruts"""
+    if len(data) < _HEADER.size:
+        raise ValueError("En-tête de pixels bruts tronqué")
+    magic, version, dtype, channels, compression, order, width, height, payload_len = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or dtype != DTYPE_UINT8:
+        raise ValueError("Payload de pixels bruts invalide")
+    # Même limite anti-bombe de décompression que PIL pour les images encodées
+    if Image.MAX_IMAGE_PIXELS is not None and width * height > Image.MAX_IMAGE_PIXELS:
+        raise ValueError(f"Image brute trop grande ({width}x{height} pixels)")
+    order = order.rstrip(b"\x00").decode("ascii")
+    if order not in ORDERS or ORDERS[order][2] != channels:
+        raise ValueError(f"Ordre de canaux non supporté: {order}")
+    payload = memoryview(data)[_HEADER.size:_HEADER.size + payload_len]
+    expected = width * height * channels
+    name = _COMPRESSION_NAMES.get(compression)
+    if name != "none":
+        payload = _decompress(name, payload, expected)
+    if len(payload) != expected:
+        raise ValueError("Taille des pixels incohérente avec l'en-tête")
+    mode, rawmode, _ = ORDERS[order]
+    return Image.frombuffer(mode, (width, height), payload, "raw", rawmode, 0, 1)
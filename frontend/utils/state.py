@@ -1,20 +1,27 @@
+import uuid
 import streamlit as st
 from datetime import datetime
+from utils.history_store import HistoryStore
+from utils.gallery_store import GalleryStore
+from services.replay import replay_recipe
 
 def init_session_state():
     """Initialise l'état de la session"""
     DEFAULT_STATES = {
-        'history': [],
+        'history': HistoryStore(replay=replay_recipe),
         'history_index': -1,
         'current_image': None,
         'original_image': None,
-        'gallery': [],
+        'gallery': GalleryStore(),
         'processed_image': None,
         'operations_count': 0,
         'session_start': datetime.now(),
         'favorites': [],
-        'presets': {},
-        #'batch_queue': []
+        'presets': None,  # Presets du backend (nom -> définition), chargés à la première ouverture
+        'operation_queue': [],  # Opérations /preprocess en attente d'une requête /pipeline
+        'queue_mode': False,
+        'client_id': uuid.uuid4().hex,  # Identifie la session auprès du backend (partage équitable)
+        'batch_result': None,  # Dernier lot traité (services.batch.BatchRun)
     }
     
     for key, default_value in DEFAULT_STATES.items():
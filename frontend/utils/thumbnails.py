@@ -0,0 +1,43 @@
+import io
+
+from PIL import Image
+
+from utils.encoded_cache import get_encoded_cache
+
+# Tailles utilisées par l'interface (côté le plus long, en pixels)
+PREVIEW_SIZE = 150
+SIDEBAR_SIZE = 400
+
+
+def shrink_to_fit(image: Image.Image, size: int) -> Image.Image:
+    """Réduit une image pour tenir dans un carré size x size (proportions conservées)
+
+    Image.reduce moyenne des blocs entiers de pixels (peu coûteux), puis un
+    seul passage LANCZOS sur une image au plus deux fois plus grande que la
+    cible. Même algorithme que le backend (shrink_to_fit, POST /thumbnail),
+    que le frontend n'appelle pas: il a déjà l'image décodée, et l'envoyer
+    pour la réduire coûterait plus que la réduire ici.
+    """
+    width, height = image.size
+    scale = min(size / width, size / height, 1.0)
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+    factor = min(width // (target[0] * 2), height // (target[1] * 2))
+    if factor > 1:
+        image = image.reduce(factor)
+    if image.size != target:
+        image = image.resize(target, Image.LANCZOS)
+    return image
+
+
+def thumbnail_bytes(image: Image.Image, size: int = PREVIEW_SIZE) -> bytes:
+    """Miniature PNG d'une image, mise en cache par image et par taille
+
+    Toutes les miniatures (galerie, historique, export, barre latérale) passent par
+    le cache d'octets encodés: une image n'est réduite qu'une fois par taille.
+    """
+    def render() -> bytes:
+        buf = io.BytesIO()
+        shrink_to_fit(image, size).save(buf, format="PNG", compress_level=1)
+        return buf.getvalue()
+
+    return get_encoded_cache().get_or_encode(image, "THUMBNAIL", str(size), render)
@@ -3,21 +3,24 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import streamlit as st
+from utils.histogram_data import histogram_data
 
 def display_histogram(image, mode: str = "interactive"):
     """Affiche l'histogramme d'une image avec Plotly avec échelle logarithmique optionnelle"""
-    img_array = np.array(image)
+    # Comptes de tous les canaux, calculés une fois par image
+    data = histogram_data(image)
+    edges = np.arange(257)
     
     if mode == "simple":
         sns.set_style("whitegrid")
         fig, ax = plt.subplots(figsize=(12, 5))
-        if len(img_array.shape) == 2:
-            ax.hist(img_array.ravel(), bins=256, color='gray', alpha=0.7, edgecolor='black', linewidth=0.5)
+        if data.gray:
+            ax.stairs(data.channel("gray"), edges, fill=True, color='gray', alpha=0.7)
             ax.set_title("Histogramme (Niveaux de gris)", fontsize=14, fontweight='bold')
         else:
             colors = ['red', 'green', 'blue']
             for i, color in enumerate(colors):
-                ax.hist(img_array[:,:,i].ravel(), bins=256, color=color, alpha=0.4, label=color.capitalize(), edgecolor=color, linewidth=0.3)
+                ax.stairs(data.counts[i], edges, fill=True, color=color, alpha=0.4, label=color.capitalize())
             ax.set_title("Histogramme RGB", fontsize=14, fontweight='bold')
             ax.legend(loc='upper right')
         ax.set_xlabel("Valeur de pixel (0-255)", fontsize=11)
@@ -29,10 +32,8 @@ def display_histogram(image, mode: str = "interactive"):
         # Mode interactif avec Plotly
         fig = go.Figure()
         
-        if len(img_array.shape) == 2:
-            hist, bins = np.histogram(img_array.flatten(), bins=256, range=[0, 256])
-            # Normaliser pour éviter les pics extrêmes
-            max_freq = np.max(hist)
+        if data.gray:
+            hist = data.channel("gray")
             
             fig.add_trace(go.Bar(
                 x=list(range(256)),
@@ -46,11 +47,9 @@ def display_histogram(image, mode: str = "interactive"):
         else:
             colors = ['red', 'green', 'blue']
             color_names = ['Rouge', 'Vert', 'Bleu']
-            max_freq = 0
             
             for i, (color, name) in enumerate(zip(colors, color_names)):
-                hist, bins = np.histogram(img_array[:,:,i].flatten(), bins=256, range=[0, 256])
-                max_freq = max(max_freq, np.max(hist))
+                hist = data.counts[i]
                 
                 fig.add_trace(go.Scatter(
                     x=list(range(256)),
@@ -64,19 +63,9 @@ def display_histogram(image, mode: str = "interactive"):
                 ))
             title = "Histogramme RGB"
         
-        # Améliorer l'échelle Y pour éviter les pics excessifs
-        # Utiliser le 95ème percentile pour fixer la limite Y
-        all_values = []
-        if len(img_array.shape) == 2:
-            hist, _ = np.histogram(img_array.flatten(), bins=256, range=[0, 256])
-            all_values = hist
-        else:
-            for i in range(3):
-                hist, _ = np.histogram(img_array[:,:,i].flatten(), bins=256, range=[0, 256])
-                all_values.extend(hist)
-        
-        # Calculer le 98ème percentile pour limiter l'axe Y
-        y_max = np.percentile(all_values, 98) * 1.1
+        # Améliorer l'échelle Y pour éviter les pics excessifs:
+        # 98ème percentile des fréquences de tous les canaux
+        y_max = data.y_max()
         
         fig.update_layout(
             title=dict(